@@ -5,7 +5,8 @@ from dcim.models import Site, Device, Interface, Rack, IFACE_FF_VIRTUAL
 from tenancy.forms import bulkedit_tenant_choices
 from tenancy.models import Tenant
 from utilities.forms import (
-    APISelect, BootstrapMixin, BulkImportForm, CommentField, CSVDataField, Livesearch, SmallTextarea, SlugField,
+    APISelect, BootstrapMixin, BulkImportForm, CommentField, CSVDataField, FlexibleModelChoiceField, Livesearch,
+    SmallTextarea, SlugField,
 )
 
 from .models import Circuit, CircuitType, Provider
@@ -158,14 +159,14 @@ class CircuitForm(forms.ModelForm, BootstrapMixin):
 
 
 class CircuitFromCSVForm(forms.ModelForm):
-    provider = forms.ModelChoiceField(Provider.objects.all(), to_field_name='name',
-                                      error_messages={'invalid_choice': 'Provider not found.'})
-    type = forms.ModelChoiceField(CircuitType.objects.all(), to_field_name='name',
-                                  error_messages={'invalid_choice': 'Invalid circuit type.'})
-    tenant = forms.ModelChoiceField(Tenant.objects.all(), to_field_name='name', required=False,
-                                    error_messages={'invalid_choice': 'Tenant not found.'})
-    site = forms.ModelChoiceField(Site.objects.all(), to_field_name='name',
-                                  error_messages={'invalid_choice': 'Site not found.'})
+    provider = FlexibleModelChoiceField(Provider.objects.all(), to_field_name='name',
+                                        error_messages={'invalid_choice': 'Provider not found.'})
+    type = FlexibleModelChoiceField(CircuitType.objects.all(), to_field_name='name',
+                                    error_messages={'invalid_choice': 'Invalid circuit type.'})
+    tenant = FlexibleModelChoiceField(Tenant.objects.all(), to_field_name='name', required=False,
+                                      error_messages={'invalid_choice': 'Tenant not found.'})
+    site = FlexibleModelChoiceField(Site.objects.all(), to_field_name='name',
+                                    error_messages={'invalid_choice': 'Site not found.'})
 
     class Meta:
         model = Circuit
@@ -89,6 +89,8 @@ class Circuit(CreatedUpdatedModel):
     def get_absolute_url(self):
         return reverse('circuits:circuit', args=[self.pk])
 
+    csv_related = ['provider', 'type', 'tenant', 'site']
+
     def to_csv(self):
         return ','.join([
             self.cid,
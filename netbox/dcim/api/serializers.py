@@ -94,17 +94,25 @@ class RackDetailSerializer(RackSerializer):
         fields = ['id', 'name', 'facility_id', 'display_name', 'site', 'group', 'tenant', 'role', 'type', 'width',
                   'u_height', 'comments', 'front_units', 'rear_units']
 
-    def get_front_units(self, obj):
-        units = obj.get_rack_units(face=RACK_FACE_FRONT)
+    def get_units(self, obj, face):
+        # Elevations may be computed for a batch of racks (see get_rack_elevations())
+        elevations = self.context.get('elevations')
+        units = elevations[obj.pk][face] if elevations else obj.get_rack_units(face=face)
         for u in units:
             u['device'] = DeviceNestedSerializer(u['device']).data if u['device'] else None
         return units
 
+    def get_front_units(self, obj):
+        return self.get_units(obj, RACK_FACE_FRONT)
+
     def get_rear_units(self, obj):
-        units = obj.get_rack_units(face=RACK_FACE_REAR)
-        for u in units:
-            u['device'] = DeviceNestedSerializer(u['device']).data if u['device'] else None
-        return units
+        return self.get_units(obj, RACK_FACE_REAR)
+
+
+class RackElevationSerializer(RackDetailSerializer):
+
+    class Meta(RackDetailSerializer.Meta):
+        fields = ['id', 'name', 'facility_id', 'display_name', 'u_height', 'front_units', 'rear_units']
 
 
 #
@@ -24,8 +24,11 @@ urlpatterns = [
 
     # Racks
     url(r'^racks/$', RackListView.as_view(), name='rack_list'),
+    url(r'^racks/available-units/$', RackAvailableUnitsView.as_view(), name='rack_available_units'),
+    url(r'^racks/elevations/$', RackElevationListView.as_view(), name='rack_elevations'),
     url(r'^racks/(?P<pk>\d+)/$', RackDetailView.as_view(), name='rack_detail'),
     url(r'^racks/(?P<pk>\d+)/rack-units/$', RackUnitListView.as_view(), name='rack_units'),
+    url(r'^racks/(?P<pk>\d+)/elevation/$', RackElevationSVGView.as_view(), name='rack_elevation'),
 
     # Manufacturers
     url(r'^manufacturers/$', ManufacturerListView.as_view(), name='manufacturer_list'),
@@ -68,6 +71,8 @@ urlpatterns = [
         name='interface_graphs'),
     url(r'^interface-connections/$', InterfaceConnectionListView.as_view(), name='interfaceconnection_list'),
     url(r'^interface-connections/(?P<pk>\d+)/$', InterfaceConnectionView.as_view(), name='interfaceconnection_detail'),
+    url(r'^interface-connections/lldp-sync/$', LLDPConnectionSyncView.as_view(),
+        name='interfaceconnection_lldp_sync'),
 
     # Miscellaneous
     url(r'^related-connections/$', RelatedConnectionsView.as_view(), name='related_connections'),
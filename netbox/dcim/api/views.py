@@ -1,21 +1,30 @@
+import time
+
 from rest_framework import generics
-from rest_framework.permissions import DjangoModelPermissionsOrAnonReadOnly
+from rest_framework.exceptions import ParseError, PermissionDenied
+from rest_framework.permissions import DjangoModelPermissionsOrAnonReadOnly, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
-from django.conf import settings
-from django.http import Http404
+from django.contrib.contenttypes.models import ContentType
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
 
 from dcim.models import (
     ConsolePort, ConsoleServerPort, Device, DeviceBay, DeviceRole, DeviceType, IFACE_FF_VIRTUAL, Interface,
-    InterfaceConnection, Manufacturer, Module, Platform, PowerOutlet, PowerPort, Rack, RackGroup, RackRole, Site,
+    InterfaceConnection, Manufacturer, Module, Platform, PowerOutlet, PowerPort, Rack, RACK_FACE_FRONT, RACK_FACE_REAR,
+    RackGroup, RackRole, Site, get_rack_elevations, get_rack_spaces,
 )
 from dcim import filters
+from dcim.utils import (
+    apply_connection_changes, collect_lldp_neighbors, get_connection_changes, get_lldp_neighbors,
+    get_rack_elevation_svgs,
+)
 from .exceptions import MissingFilterException
 from . import serializers
 from extras.api.renderers import BINDZoneRenderer, FlatJSONRenderer
+from extras.models import UserAction
 from utilities.api import ServiceUnavailable
 
 
@@ -101,6 +110,91 @@ class RackDetailView(generics.RetrieveAPIView):
     serializer_class = serializers.RackDetailSerializer
 
 
+class RackAvailableUnitsView(generics.GenericAPIView):
+    """
+    List the positions available within racks (filterable) for a device of a given height in units (`device_height`,
+    default 1) on a given `face` (front or rear; omit for a full depth device)
+    """
+    queryset = Rack.objects.all()
+    filter_class = filters.RackFilter
+
+    def get(self, request):
+
+        try:
+            u_height = int(request.GET.get('device_height', 1))
+        except ValueError:
+            raise ParseError("Invalid device_height.")
+        face = request.GET.get('face')
+        if face:
+            try:
+                face = {'front': RACK_FACE_FRONT, 'rear': RACK_FACE_REAR}[face.lower()]
+            except KeyError:
+                raise ParseError("Invalid face: must be front or rear.")
+        else:
+            face = None
+
+        racks = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(racks)
+        racks = page if page is not None else list(racks)
+        rack_spaces = get_rack_spaces(racks)
+        data = [{
+            'id': rack.pk,
+            'name': rack.name,
+            'first_fit': rack_spaces[rack.pk].first_fit(u_height, face),
+            'available_units': rack_spaces[rack.pk].all_fits(u_height, face),
+        } for rack in racks]
+
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class RackElevationListView(generics.GenericAPIView):
+    """
+    List the front and rear elevations of racks (filterable, e.g. by site or group). Pass `render=svg` to get the
+    elevations rendered as SVG images instead of lists of units.
+    """
+    queryset = Rack.objects.all()
+    serializer_class = serializers.RackElevationSerializer
+    filter_class = filters.RackFilter
+
+    def get(self, request):
+
+        racks = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(racks)
+        racks = page if page is not None else list(racks)
+
+        if request.GET.get('render') == 'svg':
+            svgs = {face: get_rack_elevation_svgs(racks, face) for face in (RACK_FACE_FRONT, RACK_FACE_REAR)}
+            data = [dict(
+                serializers.RackNestedSerializer(rack).data,
+                u_height=rack.u_height,
+                front_svg=svgs[RACK_FACE_FRONT][rack.pk],
+                rear_svg=svgs[RACK_FACE_REAR][rack.pk],
+            ) for rack in racks]
+        else:
+            context = dict(self.get_serializer_context(), elevations=get_rack_elevations(racks))
+            data = serializers.RackElevationSerializer(racks, many=True, context=context).data
+
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class RackElevationSVGView(APIView):
+    """
+    Render one face of a rack (`face`: front or rear, default front) as an SVG image
+    """
+
+    def get(self, request, pk):
+
+        rack = get_object_or_404(Rack, pk=pk)
+        face = RACK_FACE_REAR if request.GET.get('face') == 'rear' else RACK_FACE_FRONT
+        svg = get_rack_elevation_svgs([rack], face)[rack.pk]
+
+        return HttpResponse(svg, content_type='image/svg+xml')
+
+
 #
 # Rack units
 #
@@ -399,7 +493,7 @@ class LLDPNeighborsView(APIView):
 
     def get(self, request, pk):
 
-        device = get_object_or_404(Device, pk=pk)
+        device = get_object_or_404(Device.objects.select_related('platform', 'primary_ip4', 'primary_ip6'), pk=pk)
         if not device.primary_ip:
             raise ServiceUnavailable(detail="No IP configured for this device.")
 
@@ -407,14 +501,83 @@ class LLDPNeighborsView(APIView):
         if not RPC:
             raise ServiceUnavailable(detail="No RPC client available for this platform ({}).".format(device.platform))
 
-        # Connect to device and retrieve inventory info
+        # Retrieve LLDP neighbors from the device, or from cache if it has recently been queried
         try:
-            with RPC(device, username=settings.NETBOX_USERNAME, password=settings.NETBOX_PASSWORD) as rpc_client:
-                lldp_neighbors = rpc_client.get_lldp_neighbors()
-        except:
+            timestamp, lldp_neighbors = get_lldp_neighbors(device, RPC)
+        except Exception:
             raise ServiceUnavailable(detail="Error connecting to the remote device.")
 
-        return Response(lldp_neighbors)
+        response = Response(lldp_neighbors)
+        response['Age'] = int(time.time() - timestamp)
+        return response
+
+
+# Number of devices queried concurrently by LLDPConnectionSyncView
+LLDP_SYNC_WORKERS = 10
+
+
+class LLDPConnectionSyncView(APIView):
+    """
+    Compare interface connections with the live LLDP neighbors of devices (GET), or update the connections to match
+    them (POST). Devices are selected by `site` (slug) and/or `device` (ID); both parameters may be repeated.
+
+    Both methods log into the devices with the credentials of the server, so even a dry run requires permission to
+    change interface connections.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if not request.user.has_perm('dcim.change_interfaceconnection'):
+            raise PermissionDenied()
+        return self.sync(request, dry_run=True)
+
+    def post(self, request):
+        if not request.user.has_perms(['dcim.add_interfaceconnection', 'dcim.delete_interfaceconnection']):
+            raise PermissionDenied()
+        return self.sync(request, dry_run=False)
+
+    def sync(self, request, dry_run):
+
+        sites = request.query_params.getlist('site')
+        device_ids = request.query_params.getlist('device')
+        if not sites and not device_ids:
+            raise ParseError("At least one site or device must be specified.")
+        devices = Device.objects.filter(status=True).select_related('platform', 'primary_ip4', 'primary_ip6')
+        if sites:
+            devices = devices.filter(rack__site__slug__in=sites)
+        if device_ids:
+            try:
+                devices = devices.filter(pk__in=[int(pk) for pk in device_ids])
+            except ValueError:
+                raise ParseError("Invalid device ID.")
+
+        neighbors, errors = collect_lldp_neighbors(devices, workers=LLDP_SYNC_WORKERS)
+        to_delete, to_create, warnings = get_connection_changes(neighbors)
+
+        if not dry_run and (to_delete or to_create):
+            apply_connection_changes(to_delete, to_create)
+            UserAction.objects.log_bulk_edit(
+                request.user, ContentType.objects.get_for_model(InterfaceConnection),
+                "Updated interface connections from LLDP ({} deleted, {} created)".format(len(to_delete),
+                                                                                          len(to_create))
+            )
+
+        def serialize(connection):
+            return {
+                'id': connection.pk,
+                'device_a': connection.interface_a.device.name,
+                'interface_a': connection.interface_a.name,
+                'device_b': connection.interface_b.device.name,
+                'interface_b': connection.interface_b.name,
+            }
+
+        return Response({
+            'dry_run': dry_run,
+            'delete': [serialize(c) for c in to_delete],
+            'create': [serialize(c) for c in to_create],
+            'warnings': warnings,
+            'errors': {device.name: error for device, error in errors.items()},
+        })
 
 
 #
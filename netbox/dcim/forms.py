@@ -8,7 +8,7 @@ from tenancy.forms import bulkedit_tenant_choices
 from tenancy.models import Tenant
 from utilities.forms import (
     APISelect, add_blank_choice, BootstrapMixin, BulkImportForm, CommentField, CSVDataField, ExpandableNameField,
-    FlexibleModelChoiceField, Livesearch, SelectWithDisabled, SmallTextarea, SlugField,
+    FlexibleModelChoiceField, get_cached_object, Livesearch, LookupCache, SelectWithDisabled, SmallTextarea, SlugField,
 )
 
 from .models import (
@@ -99,8 +99,8 @@ class SiteForm(forms.ModelForm, BootstrapMixin):
 
 
 class SiteFromCSVForm(forms.ModelForm):
-    tenant = forms.ModelChoiceField(Tenant.objects.all(), to_field_name='name', required=False,
-                                    error_messages={'invalid_choice': 'Tenant not found.'})
+    tenant = FlexibleModelChoiceField(Tenant.objects.all(), to_field_name='name', required=False,
+                                      error_messages={'invalid_choice': 'Tenant not found.'})
 
     class Meta:
         model = Site
@@ -197,13 +197,13 @@ class RackForm(forms.ModelForm, BootstrapMixin):
 
 
 class RackFromCSVForm(forms.ModelForm):
-    site = forms.ModelChoiceField(queryset=Site.objects.all(), to_field_name='name',
-                                  error_messages={'invalid_choice': 'Site not found.'})
+    site = FlexibleModelChoiceField(queryset=Site.objects.all(), to_field_name='name',
+                                    error_messages={'invalid_choice': 'Site not found.'})
     group_name = forms.CharField(required=False)
-    tenant = forms.ModelChoiceField(Tenant.objects.all(), to_field_name='name', required=False,
-                                    error_messages={'invalid_choice': 'Tenant not found.'})
-    role = forms.ModelChoiceField(RackRole.objects.all(), to_field_name='name', required=False,
-                                  error_messages={'invalid_choice': 'Role not found.'})
+    tenant = FlexibleModelChoiceField(Tenant.objects.all(), to_field_name='name', required=False,
+                                      error_messages={'invalid_choice': 'Tenant not found.'})
+    role = FlexibleModelChoiceField(RackRole.objects.all(), to_field_name='name', required=False,
+                                    error_messages={'invalid_choice': 'Role not found.'})
     type = forms.CharField(required=False)
 
     class Meta:
@@ -511,15 +511,15 @@ class DeviceForm(forms.ModelForm, BootstrapMixin):
 
 
 class BaseDeviceFromCSVForm(forms.ModelForm):
-    device_role = forms.ModelChoiceField(queryset=DeviceRole.objects.all(), to_field_name='name',
-                                         error_messages={'invalid_choice': 'Invalid device role.'})
-    tenant = forms.ModelChoiceField(Tenant.objects.all(), to_field_name='name', required=False,
-                                    error_messages={'invalid_choice': 'Tenant not found.'})
-    manufacturer = forms.ModelChoiceField(queryset=Manufacturer.objects.all(), to_field_name='name',
-                                          error_messages={'invalid_choice': 'Invalid manufacturer.'})
+    device_role = FlexibleModelChoiceField(queryset=DeviceRole.objects.all(), to_field_name='name',
+                                           error_messages={'invalid_choice': 'Invalid device role.'})
+    tenant = FlexibleModelChoiceField(Tenant.objects.all(), to_field_name='name', required=False,
+                                      error_messages={'invalid_choice': 'Tenant not found.'})
+    manufacturer = FlexibleModelChoiceField(queryset=Manufacturer.objects.all(), to_field_name='name',
+                                            error_messages={'invalid_choice': 'Invalid manufacturer.'})
     model_name = forms.CharField()
-    platform = forms.ModelChoiceField(queryset=Platform.objects.all(), required=False, to_field_name='name',
-                                      error_messages={'invalid_choice': 'Invalid platform.'})
+    platform = FlexibleModelChoiceField(queryset=Platform.objects.all(), required=False, to_field_name='name',
+                                        error_messages={'invalid_choice': 'Invalid platform.'})
 
     class Meta:
         fields = []
@@ -527,19 +527,22 @@ class BaseDeviceFromCSVForm(forms.ModelForm):
 
     def clean(self):
 
+        super(BaseDeviceFromCSVForm, self).clean()
+
         manufacturer = self.cleaned_data.get('manufacturer')
         model_name = self.cleaned_data.get('model_name')
 
         # Validate device type
         if manufacturer and model_name:
             try:
-                self.instance.device_type = DeviceType.objects.get(manufacturer=manufacturer, model=model_name)
+                self.instance.device_type = get_cached_object(self, DeviceType.objects.all(), manufacturer=manufacturer,
+                                                              model=model_name)
             except DeviceType.DoesNotExist:
                 self.add_error('model_name', "Invalid device type ({} {})".format(manufacturer, model_name))
 
 
 class DeviceFromCSVForm(BaseDeviceFromCSVForm):
-    site = forms.ModelChoiceField(queryset=Site.objects.all(), to_field_name='name', error_messages={
+    site = FlexibleModelChoiceField(queryset=Site.objects.all(), to_field_name='name', error_messages={
         'invalid_choice': 'Invalid site name.',
     })
     rack_name = forms.CharField()
@@ -559,9 +562,26 @@ class DeviceFromCSVForm(BaseDeviceFromCSVForm):
         # Validate rack
         if site and rack_name:
             try:
-                self.instance.rack = Rack.objects.get(site=site, name=rack_name)
+                self.instance.rack = get_cached_object(self, Rack.objects.all(), site=site, name=rack_name)
             except Rack.DoesNotExist:
                 self.add_error('rack_name', "Invalid rack ({})".format(rack_name))
+            else:
+                # Validate the positions of all the devices of an import against a single RackSpace per rack
+                lookup_cache = getattr(self, 'lookup_cache', None)
+                if lookup_cache is not None:
+                    rack = self.instance.rack
+                    self.instance.rack_space = lookup_cache.get_or_compute(('rack_space', rack.pk),
+                                                                           rack.get_rack_space)
+
+    def is_valid(self):
+        is_valid = super(DeviceFromCSVForm, self).is_valid()
+        # Reserve the units of the device in the RackSpace shared by the batch once the whole record is known to be
+        # valid, so that the following devices cannot overlap it while invalid records do not hold any units.
+        device = self.instance
+        if is_valid and device.rack_space is not None and device.position:
+            rack_face = device.face if not device.device_type.is_full_depth else None
+            device.rack_space.occupy(device.position, device.device_type.u_height, rack_face)
+        return is_valid
 
     def clean_face(self):
         face = self.cleaned_data['face']
@@ -733,9 +753,12 @@ class ConsoleConnectionImportForm(BulkImportForm, BootstrapMixin):
             return
 
         connection_list = []
+        lookup_cache = LookupCache(self.fields['csv'].csv_form)
+        lookup_cache.prefetch(records)
 
         for i, record in enumerate(records, start=1):
             form = self.fields['csv'].csv_form(data=record)
+            lookup_cache.bind(form)
             if form.is_valid():
                 console_port = ConsolePort.objects.get(device=form.cleaned_data['device'],
                                                        name=form.cleaned_data['console_port'])
@@ -929,9 +952,12 @@ class PowerConnectionImportForm(BulkImportForm, BootstrapMixin):
             return
 
         connection_list = []
+        lookup_cache = LookupCache(self.fields['csv'].csv_form)
+        lookup_cache.prefetch(records)
 
         for i, record in enumerate(records, start=1):
             form = self.fields['csv'].csv_form(data=record)
+            lookup_cache.bind(form)
             if form.is_valid():
                 power_port = PowerPort.objects.get(device=form.cleaned_data['device'],
                                                    name=form.cleaned_data['power_port'])
@@ -1196,9 +1222,12 @@ class InterfaceConnectionImportForm(BulkImportForm, BootstrapMixin):
 
         connection_list = []
         occupied_interfaces = []
+        lookup_cache = LookupCache(self.fields['csv'].csv_form)
+        lookup_cache.prefetch(records)
 
         for i, record in enumerate(records, start=1):
             form = self.fields['csv'].csv_form(data=record)
+            lookup_cache.bind(form)
             if form.is_valid():
                 interface_a = Interface.objects.get(device=form.cleaned_data['device_a'],
                                                     name=form.cleaned_data['interface_a'])
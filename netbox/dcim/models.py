@@ -1,11 +1,16 @@
 from collections import OrderedDict
+import hashlib
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import MultipleObjectsReturned, ValidationError
 from django.core.urlresolvers import reverse
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
-from django.db.models import Count, Q, ObjectDoesNotExist
+from django.db.models import Count, Max, Q, ObjectDoesNotExist
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
 
 from extras.rpc import RPC_CLIENTS
 from tenancy.models import Tenant
@@ -14,6 +19,7 @@ from utilities.managers import NaturalOrderByManager
 from utilities.models import CreatedUpdatedModel
 
 from .fields import ASNField, MACAddressField
+from .rackspace import RackSpace
 
 
 RACK_TYPE_2POST = 100
@@ -160,6 +166,9 @@ RPC_CLIENT_CHOICES = [
     [RPC_CLIENT_OPENGEAR, 'Opengear (SSH)'],
 ]
 
+# Number of seconds for which rack elevations are cached (entries are keyed by the version of the rack)
+RACK_ELEVATION_CACHE_TIMEOUT = 86400
+
 
 def order_interfaces(queryset, sql_col, primary_ordering=tuple()):
     """
@@ -238,6 +247,8 @@ class Site(CreatedUpdatedModel):
     def get_absolute_url(self):
         return reverse('dcim:site', args=[self.slug])
 
+    csv_related = ['tenant']
+
     def to_csv(self):
         return ','.join([
             self.name,
@@ -364,6 +375,8 @@ class Rack(CreatedUpdatedModel):
                     raise ValidationError("Rack must be at least {}U tall with currently installed devices."
                                           .format(min_height))
 
+    csv_related = ['site', 'group', 'tenant', 'role']
+
     def to_csv(self):
         return ','.join([
             self.site.name,
@@ -397,24 +410,34 @@ class Rack(CreatedUpdatedModel):
         :param remove_redundant: If True, rack units occupied by a device already listed will be omitted
         """
 
+        devices = []
+        if self.pk:
+            devices = Device.objects.select_related('device_type__manufacturer', 'device_role')\
+                .annotate(devicebay_count=Count('device_bays'))\
+                .exclude(pk=exclude)\
+                .filter(rack=self, position__gt=0)\
+                .filter(Q(face=face) | Q(device_type__is_full_depth=True))
+
+        return self.build_elevation(devices, face, remove_redundant)
+
+    def build_elevation(self, devices, face=RACK_FACE_FRONT, remove_redundant=False):
+        """
+        Return the list of rack units (see get_rack_units()) of one face of the rack, given the devices visible from
+        that face (the devices mounted on it and full depth devices).
+        """
         elevation = OrderedDict()
         for u in reversed(range(1, self.u_height + 1)):
             elevation[u] = {'id': u, 'name': 'U{}'.format(u), 'face': face, 'device': None}
 
         # Add devices to rack units list
-        if self.pk:
-            for device in Device.objects.select_related('device_type__manufacturer', 'device_role')\
-                    .annotate(devicebay_count=Count('device_bays'))\
-                    .exclude(pk=exclude)\
-                    .filter(rack=self, position__gt=0)\
-                    .filter(Q(face=face) | Q(device_type__is_full_depth=True)):
-                if remove_redundant:
-                    elevation[device.position]['device'] = device
-                    for u in range(device.position + 1, device.position + device.device_type.u_height):
-                        elevation.pop(u, None)
-                else:
-                    for u in range(device.position, device.position + device.device_type.u_height):
-                        elevation[u]['device'] = device
+        for device in devices:
+            if remove_redundant:
+                elevation[device.position]['device'] = device
+                for u in range(device.position + 1, device.position + device.device_type.u_height):
+                    elevation.pop(u, None)
+            else:
+                for u in range(device.position, device.position + device.device_type.u_height):
+                    elevation[u]['device'] = device
 
         return [u for u in elevation.values()]
 
@@ -424,6 +447,14 @@ class Rack(CreatedUpdatedModel):
     def get_rear_elevation(self):
         return self.get_rack_units(face=RACK_FACE_REAR, remove_redundant=True)
 
+    def get_rack_space(self, exclude=list()):
+        """
+        Return the RackSpace describing the units occupied by the devices installed within the rack.
+
+        :param exclude: List of devices IDs to exclude (useful when moving a device within a rack)
+        """
+        return get_rack_spaces([self], exclude)[self.pk]
+
     def get_available_units(self, u_height=1, rack_face=None, exclude=list()):
         """
         Return a list of units within the rack available to accommodate a device of a given U height (default 1).
@@ -434,30 +465,7 @@ class Rack(CreatedUpdatedModel):
         :param rack_face: The face of the rack (front or rear) required; 'None' if device is full depth
         :param exclude: List of devices IDs to exclude (useful when moving a device within a rack)
         """
-
-        # Gather all devices which consume U space within the rack
-        devices = self.devices.select_related().filter(position__gte=1).exclude(pk__in=exclude)
-
-        # Initialize the rack unit skeleton
-        units = range(1, self.u_height + 1)
-
-        # Remove units consumed by installed devices
-        for d in devices:
-            if rack_face is None or d.face == rack_face or d.device_type.is_full_depth:
-                for u in range(d.position, d.position + d.device_type.u_height):
-                    try:
-                        units.remove(u)
-                    except ValueError:
-                        # Found overlapping devices in the rack!
-                        pass
-
-        # Remove units without enough space above them to accommodate a device of the specified height
-        available_units = []
-        for u in units:
-            if set(range(u, u + u_height)).issubset(units):
-                available_units.append(u)
-
-        return list(reversed(available_units))
+        return self.get_rack_space(exclude).all_fits(u_height, rack_face)
 
     def get_0u_devices(self):
         return self.devices.filter(position=0)
@@ -472,6 +480,78 @@ class Rack(CreatedUpdatedModel):
         return int(float(self.u_height - u_available) / self.u_height * 100)
 
 
+def get_rack_versions(racks):
+    """
+    Return a dictionary mapping the PKs of Racks to a version key which changes whenever a device is added to, removed
+    from or updated within the rack, computed with a single aggregate query over the devices of all the racks. Changes
+    made with QuerySet.update() must set last_updated on the devices they affect (see touch_devices()).
+
+    :param racks: Racks (or a QuerySet of Racks)
+    """
+    racks = list(racks)
+    aggregates = {
+        row['rack']: (row['count'], row['last_updated']) for row in
+        Device.objects.filter(rack__in=[rack.pk for rack in racks], position__gt=0).order_by().values('rack')
+        .annotate(count=Count('pk'), last_updated=Max('last_updated'))
+    }
+    return {
+        rack.pk: hashlib.md5(repr((rack.name, rack.u_height, aggregates.get(rack.pk)))).hexdigest() for rack in racks
+    }
+
+
+def get_rack_elevations(racks, remove_redundant=False):
+    """
+    Return a dictionary mapping the PKs of Racks to the elevations of their front and rear faces (see
+    Rack.get_rack_units()), keyed by face. Elevations are cached under the version of each rack (see
+    get_rack_versions()); the devices of the racks which are not cached are fetched with a single query.
+
+    :param racks: Racks (or a QuerySet of Racks)
+    :param remove_redundant: If True, rack units occupied by a device already listed will be omitted
+    """
+    racks = {rack.pk: rack for rack in racks}
+    keys = {
+        pk: 'rack_units_{}_{}_{}'.format(pk, int(remove_redundant), version)
+        for pk, version in get_rack_versions(racks.values()).items()
+    }
+    elevations = cache.get_many(keys.values())
+
+    missing = [pk for pk, key in keys.items() if key not in elevations]
+    devices = {pk: [] for pk in missing}
+    if missing:
+        for device in Device.objects.select_related('device_type__manufacturer', 'device_role')\
+                .annotate(devicebay_count=Count('device_bays'))\
+                .filter(rack__in=missing, position__gt=0):
+            device.rack = racks[device.rack_id]
+            devices[device.rack_id].append(device)
+
+    built = {}
+    for pk in missing:
+        built[keys[pk]] = elevations[keys[pk]] = {
+            face: racks[pk].build_elevation(
+                [d for d in devices[pk] if d.face == face or d.device_type.is_full_depth], face, remove_redundant
+            ) for face in (RACK_FACE_FRONT, RACK_FACE_REAR)
+        }
+    if built:
+        cache.set_many(built, RACK_ELEVATION_CACHE_TIMEOUT)
+
+    return {pk: elevations[key] for pk, key in keys.items()}
+
+
+def get_rack_spaces(racks, exclude=list()):
+    """
+    Return a dictionary mapping the PKs of Racks to the RackSpace of each, computed with a single query.
+
+    :param racks: Racks (or a QuerySet of Racks)
+    :param exclude: List of devices IDs to exclude
+    """
+    rack_spaces = {rack.pk: RackSpace(rack.u_height) for rack in racks}
+    devices = Device.objects.filter(rack__in=rack_spaces.keys(), position__gte=1).exclude(pk__in=exclude)\
+        .values_list('rack_id', 'position', 'face', 'device_type__u_height', 'device_type__is_full_depth')
+    for rack_id, position, face, u_height, is_full_depth in devices:
+        rack_spaces[rack_id].occupy(position, u_height, None if is_full_depth else face)
+    return rack_spaces
+
+
 #
 # Device Types
 #
@@ -751,6 +831,9 @@ class Device(CreatedUpdatedModel):
                                        blank=True, null=True, verbose_name='Primary IPv6')
     comments = models.TextField(blank=True)
 
+    # RackSpace of the rack to validate the position against, if shared by a batch of devices (see DeviceFromCSVForm)
+    rack_space = None
+
     objects = DeviceManager()
 
     class Meta:
@@ -781,11 +864,12 @@ class Device(CreatedUpdatedModel):
         rack_face = self.face if not self.device_type.is_full_depth else None
         exclude_list = [self.pk] if self.pk else []
         try:
-            available_units = self.rack.get_available_units(u_height=self.device_type.u_height, rack_face=rack_face,
-                                                            exclude=exclude_list)
-            if self.position and self.position not in available_units:
-                raise ValidationError("U{} is already occupied or does not have sufficient space to accommodate a(n) "
-                                      "{} ({}U).".format(self.position, self.device_type, self.device_type.u_height))
+            if self.position:
+                rack_space = self.rack_space or self.rack.get_rack_space(exclude=exclude_list)
+                if not rack_space.is_available(self.position, self.device_type.u_height, rack_face):
+                    raise ValidationError("U{} is already occupied or does not have sufficient space to accommodate "
+                                          "a(n) {} ({}U).".format(self.position, self.device_type,
+                                                                  self.device_type.u_height))
         except Rack.DoesNotExist:
             pass
 
@@ -825,6 +909,8 @@ class Device(CreatedUpdatedModel):
         # Update Rack assignment for any child Devices
         Device.objects.filter(parent_bay__device=self).update(rack=self.rack)
 
+    csv_related = ['device_role', 'tenant', 'device_type__manufacturer', 'platform', 'rack__site']
+
     def to_csv(self):
         return ','.join([
             self.name or '',
@@ -885,6 +971,28 @@ class Device(CreatedUpdatedModel):
         return RPC_CLIENTS.get(self.platform.rpc_client)
 
 
+def touch_devices(queryset):
+    """
+    Set last_updated on the racked Devices of a QuerySet, for changes which are shown in rack elevations but do not go
+    through Device.save() (e.g. bulk edits, or changes to their device type).
+    """
+    return queryset.filter(rack__isnull=False).update(last_updated=timezone.now())
+
+
+@receiver(post_save, sender=Manufacturer)
+@receiver(post_save, sender=DeviceType)
+@receiver(post_save, sender=DeviceRole)
+def touch_rack_elevation_devices(sender, instance, created, **kwargs):
+    # The attributes of these are displayed in rack elevations
+    if not created:
+        lookup = {
+            Manufacturer: 'device_type__manufacturer',
+            DeviceType: 'device_type',
+            DeviceRole: 'device_role',
+        }[sender]
+        touch_devices(Device.objects.filter(**{lookup: instance}))
+
+
 class ConsolePort(models.Model):
     """
     A physical console port within a Device. ConsolePorts connect to ConsoleServerPorts.
@@ -903,6 +1011,8 @@ class ConsolePort(models.Model):
         return self.name
 
     # Used for connections export
+    csv_related = ['cs_port__device', 'device']
+
     def to_csv(self):
         return ','.join([
             self.cs_port.device.identifier if self.cs_port else '',
@@ -962,6 +1072,8 @@ class PowerPort(models.Model):
         return self.name
 
     # Used for connections export
+    csv_related = ['power_outlet__device', 'device']
+
     def to_csv(self):
         return ','.join([
             self.power_outlet.device.identifier if self.power_outlet else '',
@@ -1091,6 +1203,8 @@ class InterfaceConnection(models.Model):
             raise ValidationError("Cannot connect an interface to itself")
 
     # Used for connections export
+    csv_related = ['interface_a__device', 'interface_b__device']
+
     def to_csv(self):
         return ','.join([
             self.interface_a.device.identifier,
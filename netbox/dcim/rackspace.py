@@ -0,0 +1,66 @@
+class RackSpace(object):
+    """
+    The occupancy of the units of a rack, stored as one bitmap per rack face: bit u-1 of a bitmap is set when unit u is
+    occupied on that face. Full depth devices occupy both faces.
+    """
+
+    def __init__(self, u_height, faces=(0, 1)):
+        self.u_height = u_height
+        self.bitmaps = {face: 0 for face in faces}
+
+    def occupy(self, position, u_height, face=None):
+        """
+        Mark the units occupied by a device of the given height at the given position, on one face or (if face is
+        None) on all faces.
+        """
+        mask = ((1 << u_height) - 1) << (position - 1)
+        for f in (self.bitmaps.keys() if face is None else [face]):
+            self.bitmaps[f] |= mask
+
+    def get_free_bitmap(self, face=None):
+        """
+        Return the bitmap of the units free on the given face, or on all faces if face is None.
+        """
+        occupied = 0
+        for f, bitmap in self.bitmaps.items():
+            if face is None or f == face:
+                occupied |= bitmap
+        return ((1 << self.u_height) - 1) & ~occupied
+
+    def get_fits_bitmap(self, u_height=1, face=None):
+        """
+        Return the bitmap of the positions at which a device of the given height fits: bit p-1 is set when units p to
+        p+u_height-1 are all free. Runs of free units are narrowed by doubling shifts, in O(log(u_height)) operations.
+        """
+        fits = self.get_free_bitmap(face)
+        span = 1
+        while span < u_height and fits:
+            step = min(span, u_height - span)
+            fits &= fits >> step
+            span += step
+        return fits
+
+    def is_available(self, position, u_height=1, face=None):
+        """
+        Return True if a device of the given height fits at the given position.
+        """
+        return position >= 1 and bool(self.get_fits_bitmap(u_height, face) >> (position - 1) & 1)
+
+    def first_fit(self, u_height=1, face=None):
+        """
+        Return the lowest position at which a device of the given height fits, or None.
+        """
+        fits = self.get_fits_bitmap(u_height, face)
+        return (fits & -fits).bit_length() or None
+
+    def all_fits(self, u_height=1, face=None):
+        """
+        Return the list of positions at which a device of the given height fits, from the top of the rack down.
+        """
+        fits = self.get_fits_bitmap(u_height, face)
+        positions = []
+        while fits:
+            position = fits.bit_length()
+            positions.append(position)
+            fits ^= 1 << (position - 1)
+        return positions
@@ -2,6 +2,8 @@ import json
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from dcim.models import Rack
+
 
 class SiteTest(APITestCase):
 
@@ -172,6 +174,36 @@ class RackTest(APITestCase):
             sorted(SiteTest.nested_fields),
         )
 
+    def test_get_available_units(self, endpoint='/api/dcim/racks/available-units/?site=test1&device_height=2&face=rear'):
+        response = self.client.get(endpoint)
+        content = json.loads(response.content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(content), 2)
+        for rack in content:
+            available_units = Rack.objects.get(pk=rack['id']).get_available_units(u_height=2, rack_face=1)
+            self.assertEqual(rack['available_units'], available_units)
+            self.assertEqual(rack['first_fit'], min(available_units) if available_units else None)
+        self.assertEqual(self.client.get(endpoint + 'x').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_elevations(self, endpoint='/api/dcim/racks/elevations/?site=test1'):
+        response = self.client.get(endpoint)
+        content = json.loads(response.content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(content), 2)
+        for rack in content:
+            detail = json.loads(self.client.get('/api/dcim/racks/{}/'.format(rack['id'])).content)
+            self.assertEqual(rack['front_units'], detail['front_units'])
+            self.assertEqual(rack['rear_units'], detail['rear_units'])
+
+        response = self.client.get(endpoint + '&render=svg')
+        content = json.loads(response.content)
+        self.assertTrue(content[0]['front_svg'].startswith('<svg'))
+
+    def test_get_elevation_svg(self, endpoint='/api/dcim/racks/1/elevation/?face=rear'):
+        response = self.client.get(endpoint)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+
 
 class ManufacturersTest(APITestCase):
 
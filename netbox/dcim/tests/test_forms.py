@@ -1,4 +1,7 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
 from dcim.forms import *
 from dcim.models import *
 
@@ -77,3 +80,82 @@ class DeviceTestCase(TestCase):
         })
         self.assertTrue(test.is_valid())
         self.assertTrue(test.save())
+
+
+class DeviceImportTestCase(TestCase):
+
+    fixtures = ['dcim', 'ipam']
+
+    def get_csv(self, count, role='Leaf Switch', site='TEST1', rack='A1R1'):
+        return '\n'.join(
+            'device{},{},,Juniper,QFX5100-48S,,,,{},{},,'.format(i, role, site, rack) for i in range(count)
+        )
+
+    def test_lookups_are_batched(self):
+
+        form = DeviceImportForm(data={'csv': self.get_csv(50)})
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(len(form.cleaned_data['csv']), 50)
+
+        # Each referenced table is queried once for the whole batch
+        for table in ['dcim_site', 'dcim_rack', 'dcim_manufacturer', 'dcim_devicetype']:
+            lookups = [q for q in queries.captured_queries if 'FROM "{}"'.format(table) in q['sql']]
+            self.assertEqual(len(lookups), 1, table)
+
+        device = form.cleaned_data['csv'][-1]
+        self.assertEqual(device.device_role.name, 'Leaf Switch')
+        self.assertEqual(device.rack.name, 'A1R1')
+        self.assertEqual(device.device_type.model, 'QFX5100-48S')
+
+    def test_lookup_by_id(self):
+
+        role = DeviceRole.objects.get(name='PDU')
+        form = DeviceImportForm(data={'csv': self.get_csv(2, role='{{{}}}'.format(role.pk))})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['csv'][0].device_role, role)
+
+    def test_invalid_lookups(self):
+
+        form = DeviceImportForm(data={'csv': self.get_csv(2, role='Nonexistent', rack='Nonexistent')})
+        self.assertFalse(form.is_valid())
+        errors = form.errors['csv']
+        self.assertIn('Record 1 (device_role): Invalid device role.', errors)
+        self.assertIn('Record 2 (device_role): Invalid device role.', errors)
+        self.assertIn('Record 2 (rack_name): Invalid rack (Nonexistent)', errors)
+
+    def test_positions_are_validated_against_batch(self):
+
+        position = Rack.objects.get(name='A1R1').get_rack_space().first_fit()
+        csv = '\n'.join(
+            'device{},Leaf Switch,,Juniper,QFX5100-48S,,,,TEST1,A1R1,{},{}'.format(i, position, face)
+            for i, face in enumerate(['front', 'rear'])
+        )
+        form = DeviceImportForm(data={'csv': csv})
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(form.is_valid())
+
+        # Full depth devices cannot be mounted on both faces of the same unit
+        self.assertEqual(len(form.errors['csv']), 1)
+        self.assertTrue(form.errors['csv'][0].startswith('Record 2: U{} is already occupied'.format(position)))
+        # Rack space is computed once for the batch
+        lookups = [q for q in queries.captured_queries if q['sql'].startswith('SELECT "dcim_device"."rack_id"')]
+        self.assertEqual(len(lookups), 1)
+
+    def test_invalid_records_do_not_reserve_units(self):
+
+        position = Rack.objects.get(name='A1R1').get_rack_space().first_fit()
+        Device.objects.filter(pk=Device.objects.first().pk).update(name='device0')
+        csv = '\n'.join(
+            'device{},Leaf Switch,,Juniper,QFX5100-48S,{},,,TEST1,A1R1,{},front'.format(i, platform, position)
+            for i, platform in [(0, ''), (1, 'Nonexistent'), (2, '')]
+        )
+        form = DeviceImportForm(data={'csv': csv})
+        self.assertFalse(form.is_valid())
+
+        # The first two records fail validation after their position was checked, and must not prevent the third
+        # from using their units
+        self.assertEqual(sorted(form.errors['csv']), [
+            'Record 1 (name): Device with this Name already exists.',
+            'Record 2 (platform): Invalid platform.',
+        ])
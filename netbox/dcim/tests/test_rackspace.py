@@ -0,0 +1,53 @@
+import random
+
+from django.test import SimpleTestCase
+
+from dcim.rackspace import RackSpace
+
+
+def get_available_units(devices, rack_height, u_height, face):
+    """
+    Reference implementation: check each unit of each candidate position.
+    """
+    occupied = set()
+    for position, height, device_face in devices:
+        if face is None or device_face is None or device_face == face:
+            occupied.update(range(position, position + height))
+    return [
+        u for u in reversed(range(1, rack_height + 1))
+        if all(v <= rack_height and v not in occupied for v in range(u, u + u_height))
+    ]
+
+
+class RackSpaceTestCase(SimpleTestCase):
+
+    def test_fits(self):
+
+        rack_space = RackSpace(10)
+        rack_space.occupy(3, 2, face=0)
+        rack_space.occupy(8, 1)
+
+        self.assertEqual(rack_space.all_fits(2, face=0), [9, 6, 5, 1])
+        self.assertEqual(rack_space.all_fits(2, face=1), [9, 6, 5, 4, 3, 2, 1])
+        self.assertEqual(rack_space.all_fits(3), [5])
+        self.assertEqual(rack_space.first_fit(2, face=0), 1)
+        self.assertIsNone(rack_space.first_fit(5))
+        self.assertTrue(rack_space.is_available(9, 2))
+        self.assertFalse(rack_space.is_available(10, 2))
+        self.assertFalse(rack_space.is_available(0))
+
+    def test_against_reference(self):
+
+        rng = random.Random(42)
+        for i in range(200):
+            rack_height = rng.randint(1, 48)
+            rack_space = RackSpace(rack_height)
+            devices = []
+            for j in range(rng.randint(0, 10)):
+                device = (rng.randint(1, rack_height), rng.randint(1, 8), rng.choice([0, 1, None]))
+                rack_space.occupy(*device)
+                devices.append(device)
+            for u_height in range(1, 10):
+                for face in [0, 1, None]:
+                    self.assertEqual(rack_space.all_fits(u_height, face),
+                                     get_available_units(devices, rack_height, u_height, face))
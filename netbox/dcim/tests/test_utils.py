@@ -0,0 +1,332 @@
+from netaddr import IPNetwork
+import threading
+import time
+
+from StringIO import StringIO
+
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+
+from dcim.models import (
+    CONNECTION_STATUS_PLANNED, Device, DeviceRole, Interface, InterfaceConnection, Platform, Rack, RACK_FACE_FRONT,
+    RACK_FACE_REAR, get_rack_elevations,
+)
+from dcim import utils
+from dcim.utils import (
+    apply_connection_changes, get_lldp_neighbors, get_rack_elevation_svgs, group_connection_changes,
+)
+from extras.rpc import RPC_CLIENTS, session_pool
+from ipam.models import IPAddress
+
+
+class FakeRPCClient(object):
+    """
+    Stand-in for an RPC client which answers after a delay, counting the queries made.
+    """
+    delay = 0.2
+    queries = 0
+    lock = threading.Lock()
+
+    def __init__(self, device, username='', password=''):
+        self.host = str(device.primary_ip.address.ip)
+        self.username = username
+        self.password = password
+
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+    def is_alive(self):
+        return True
+
+    def get_lldp_neighbors(self):
+        with self.lock:
+            FakeRPCClient.queries += 1
+            query = FakeRPCClient.queries
+        time.sleep(self.delay)
+        return [{
+            'local-interface': 'xe-0/0/0',
+            'name': 'switch{}'.format(query),
+            'remote-interface': 'xe-0/0/1',
+            'chassis-id': '00:00:00:00:00:01',
+        }]
+
+
+@override_settings(LLDP_CACHE_TIMEOUT=60)
+class LLDPNeighborsTestCase(TestCase):
+
+    fixtures = ['dcim', 'ipam']
+
+    def setUp(self):
+
+        cache.clear()
+        RPC_CLIENTS['fake'] = FakeRPCClient
+        FakeRPCClient.queries = 0
+        self.device = Device.objects.get(pk=1)
+        self.device.platform = Platform.objects.create(name='Fake', slug='fake', rpc_client='fake')
+        self.device.primary_ip4 = IPAddress.objects.create(address=IPNetwork('192.0.2.1/24'))
+        self.device.save()
+
+    def tearDown(self):
+        del RPC_CLIENTS['fake']
+        session_pool.close()
+
+    def test_neighbors_are_cached(self):
+
+        url = reverse('dcim-api:device_lldp-neighbors', kwargs={'pk': self.device.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.data[0]['name'], 'switch1')
+        self.assertEqual(response['Age'], '0')
+
+        response = self.client.get(url)
+        self.assertEqual(response.data[0]['name'], 'switch1')
+        self.assertEqual(FakeRPCClient.queries, 1)
+
+    @override_settings(LLDP_CACHE_TIMEOUT=0)
+    def test_cache_disabled(self):
+
+        get_lldp_neighbors(self.device, FakeRPCClient)
+        get_lldp_neighbors(self.device, FakeRPCClient)
+        self.assertEqual(FakeRPCClient.queries, 2)
+
+    def test_concurrent_requests_are_coalesced(self):
+
+        results = []
+
+        def request():
+            results.append(get_lldp_neighbors(self.device, FakeRPCClient)[1])
+
+        threads = [threading.Thread(target=request) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(FakeRPCClient.queries, 1)
+        self.assertEqual([r[0]['name'] for r in results], ['switch1'] * 5)
+
+    def test_stale_neighbors_are_refreshed(self):
+
+        get_lldp_neighbors(self.device, FakeRPCClient)
+        key = 'lldp_neighbors_{}'.format(self.device.pk)
+        timestamp, neighbors = cache.get(key)
+        cache.set(key, (timestamp - 60, neighbors))
+
+        # Stale neighbors are returned without waiting for the device
+        start = time.time()
+        self.assertEqual(get_lldp_neighbors(self.device, FakeRPCClient)[1][0]['name'], 'switch1')
+        self.assertLess(time.time() - start, FakeRPCClient.delay)
+        # A single refresh runs in the background
+        get_lldp_neighbors(self.device, FakeRPCClient)
+
+        time.sleep(FakeRPCClient.delay * 2)
+        self.assertEqual(get_lldp_neighbors(self.device, FakeRPCClient)[1][0]['name'], 'switch2')
+        self.assertEqual(FakeRPCClient.queries, 2)
+
+
+class FakeLLDPClient(FakeRPCClient):
+    """
+    Stand-in for an RPC client returning the LLDP neighbors set for the address of the device.
+    """
+    neighbors = {}
+
+    def get_lldp_neighbors(self):
+        return [{
+            'local-interface': local_interface,
+            'name': name,
+            'remote-interface': remote_interface,
+            'chassis-id': '00:00:00:00:00:01',
+        } for local_interface, name, remote_interface in self.neighbors[self.host]]
+
+
+class LLDPConnectionSyncTestCase(TestCase):
+
+    fixtures = ['dcim', 'ipam']
+
+    def setUp(self):
+
+        RPC_CLIENTS['fake'] = FakeLLDPClient
+        platform = Platform.objects.create(name='Fake', slug='fake', rpc_client='fake')
+        for pk, address in [(4, '192.0.2.4/24'), (5, '192.0.2.5/24')]:
+            device = Device.objects.get(pk=pk)
+            device.platform = platform
+            device.primary_ip4 = IPAddress.objects.create(address=IPNetwork(address))
+            device.save()
+
+        # Connections 5 and 6 link test1-leaf1 to the spines; 7 and 8 link test1-leaf1 to test1-leaf2
+        InterfaceConnection.objects.filter(pk=8).update(connection_status=CONNECTION_STATUS_PLANNED)
+        FakeLLDPClient.neighbors = {
+            '192.0.2.4': [
+                ('et-0/0/48', 'test1-spine1', 'et-0/0/0'),
+                ('et-0/0/49', 'test1-spine2', 'et-0/0/5'),
+            ],
+            '192.0.2.5': [
+                ('et-0/0/48', 'unknown-switch', 'ge-0/0/0'),
+            ],
+        }
+        self.url = '{}?site=test1'.format(reverse('dcim-api:interfaceconnection_lldp_sync'))
+
+    def tearDown(self):
+        del RPC_CLIENTS['fake']
+        session_pool.close()
+
+    def test_dry_run(self):
+
+        # Devices are only queried on behalf of users allowed to change interface connections
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        user = User.objects.create_user('operator', 'operator@example.com', 'operator')
+        self.client.login(username='operator', password='operator')
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        user.user_permissions.add(Permission.objects.get(codename='change_interfaceconnection'))
+
+        response = self.client.get(self.url)
+
+        self.assertEqual([c['id'] for c in response.data['delete']], [6, 7])
+        self.assertEqual(response.data['create'], [{
+            'id': None,
+            'device_a': 'test1-leaf1',
+            'interface_a': 'et-0/0/49',
+            'device_b': 'test1-spine2',
+            'interface_b': 'et-0/0/5',
+        }])
+        self.assertEqual(len(response.data['warnings']), 1)
+        self.assertEqual(InterfaceConnection.objects.count(), 17)
+
+    def test_apply(self):
+
+        self.assertEqual(self.client.post(self.url).status_code, 403)
+
+        User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.login(username='admin', password='admin')
+        response = self.client.post(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(InterfaceConnection.objects.filter(pk__in=[6, 7]).exists())
+        # Planned connections and connections to devices which were not queried are left alone
+        self.assertEqual(InterfaceConnection.objects.filter(pk__in=[3, 4, 5, 8]).count(), 4)
+        interface = Interface.objects.get(device__name='test1-spine2', name='et-0/0/5')
+        self.assertEqual(interface.get_connected_interface().name, 'et-0/0/49')
+
+    def test_apply_requires_add_and_delete_permissions(self):
+
+        user = User.objects.create_user('operator', 'operator@example.com', 'operator')
+        user.user_permissions.add(Permission.objects.get(codename='delete_interfaceconnection'))
+        self.client.login(username='operator', password='operator')
+        self.assertEqual(self.client.post(self.url).status_code, 403)
+        self.assertEqual(InterfaceConnection.objects.count(), 17)
+
+    def test_replacements_are_atomic(self):
+
+        replaced = InterfaceConnection.objects.get(pk=6)
+        # The new connection conflicts with connection 5, which is not deleted
+        conflicting = InterfaceConnection(interface_a=replaced.interface_a,
+                                          interface_b=InterfaceConnection.objects.get(pk=5).interface_b)
+        self.assertEqual(list(group_connection_changes([replaced], [conflicting])), [([replaced], [conflicting])])
+        with self.assertRaises(IntegrityError):
+            apply_connection_changes([replaced], [conflicting])
+        self.assertTrue(InterfaceConnection.objects.filter(pk=6).exists())
+
+        # New connections replacing the same connection are applied together
+        replaced, other = InterfaceConnection.objects.filter(pk__in=[7, 5]).order_by('-pk')
+        created = [
+            InterfaceConnection(interface_a=replaced.interface_a, interface_b=other.interface_a),
+            InterfaceConnection(interface_a=replaced.interface_b, interface_b=other.interface_b),
+        ]
+        self.assertEqual(list(group_connection_changes([replaced, other], created)), [([replaced, other], created)])
+
+    def test_command(self):
+
+        stdout = StringIO()
+        call_command('sync_lldp_connections', site=['test1'], dry_run=True, stdout=stdout)
+        self.assertIn('+ test1-leaf1 et-0/0/49 -- test1-spine2 et-0/0/5', stdout.getvalue())
+        self.assertEqual(InterfaceConnection.objects.count(), 17)
+
+        call_command('sync_lldp_connections', site=['test1'], stdout=StringIO())
+        self.assertEqual(InterfaceConnection.objects.count(), 16)
+
+
+class RackElevationTestCase(TestCase):
+
+    fixtures = ['dcim', 'ipam']
+
+    def setUp(self):
+
+        cache.clear()
+        self.racks = list(Rack.objects.all())
+
+    def render_svgs(self):
+        """
+        Return the front SVGs of all racks, and the PKs of the racks which were rendered.
+        """
+        rendered = []
+        render = utils.render_rack_elevation_svg
+        utils.render_rack_elevation_svg = lambda rack, *args: rendered.append(rack.pk) or render(rack, *args)
+        try:
+            svgs = get_rack_elevation_svgs(self.racks, RACK_FACE_FRONT)
+        finally:
+            utils.render_rack_elevation_svg = render
+        return svgs, rendered
+
+    def test_elevations_are_cached_by_version(self):
+
+        with self.assertNumQueries(2):
+            svgs, rendered = self.render_svgs()
+        self.assertEqual(sorted(rendered), sorted(rack.pk for rack in self.racks))
+        device = Device.objects.filter(rack=self.racks[0], position__isnull=False, face=RACK_FACE_FRONT).first()
+        self.assertIn('>{}</text>'.format(device.name), svgs[self.racks[0].pk])
+
+        # Unchanged racks are served from cache with a single aggregate query
+        with self.assertNumQueries(1):
+            self.assertEqual(self.render_svgs(), (svgs, []))
+
+        # Only racks whose content changed are rendered again
+        device.name = 'renamed'
+        device.save()
+        svgs, rendered = self.render_svgs()
+        self.assertEqual(rendered, [self.racks[0].pk])
+        self.assertIn('>renamed</text>', svgs[self.racks[0].pk])
+
+    def test_bulk_changes_refresh_elevations(self):
+
+        self.render_svgs()
+        device = Device.objects.filter(rack=self.racks[0], position__isnull=False, face=RACK_FACE_FRONT).first()
+        User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.login(username='admin', password='admin')
+
+        # Bulk edits do not go through Device.save()
+        role = DeviceRole.objects.exclude(pk=device.device_role_id).first()
+        self.client.post(reverse('dcim:device_bulk_edit'), {'pk': [device.pk], 'device_role': role.pk, '_apply': 1})
+        svgs, rendered = self.render_svgs()
+        self.assertEqual(rendered, [self.racks[0].pk])
+        self.assertIn(u'<title>{}&#10;'.format(role.name), svgs[self.racks[0].pk])
+
+        # Changing a device role refreshes the racks showing it
+        role.name = 'Renamed Role'
+        role.save()
+        svgs, rendered = self.render_svgs()
+        racks = set(role.devices.filter(position__gt=0).values_list('rack', flat=True))
+        self.assertEqual(sorted(rendered), sorted(racks))
+        self.assertIn('<title>Renamed Role&#10;', svgs[self.racks[0].pk])
+
+    def test_unit_lists_are_cached(self):
+
+        with self.assertNumQueries(2):
+            elevations = get_rack_elevations(self.racks)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_rack_elevations(self.racks), elevations)
+        self.assertEqual([u['device'] for u in elevations[self.racks[0].pk][RACK_FACE_FRONT]],
+                         [u['device'] for u in self.racks[0].get_rack_units(RACK_FACE_FRONT)])
+
+    def test_full_depth_devices_on_far_face(self):
+
+        device = Device.objects.filter(rack=self.racks[0], position__isnull=False, face=RACK_FACE_FRONT,
+                                       device_type__is_full_depth=True).first()
+        svg = get_rack_elevation_svgs(self.racks, RACK_FACE_REAR)[self.racks[0].pk]
+        self.assertIn('fill="#7f8c8d">{}</text>'.format(device.name), svg)
+        self.assertNotIn(reverse('dcim:device', args=[device.pk]), svg)
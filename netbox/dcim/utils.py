@@ -0,0 +1,378 @@
+from collections import Counter, OrderedDict
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.core.urlresolvers import reverse
+from django.db.models import Q
+from django.utils.html import escape
+
+from extras.rpc import query_devices, session_pool
+
+from .models import (
+    COLOR_BLUE, COLOR_GRAY1, COLOR_GRAY2, COLOR_GRAY3, COLOR_GREEN, COLOR_ORANGE, COLOR_PURPLE, COLOR_RED, COLOR_TEAL,
+    COLOR_YELLOW, CONNECTION_STATUS_CONNECTED, RACK_ELEVATION_CACHE_TIMEOUT, Device, Interface, InterfaceConnection,
+    get_rack_versions,
+)
+
+
+# Number of seconds for which expired LLDP neighbors are still returned while they are refreshed
+LLDP_STALE_TIMEOUT = 600
+# Maximum number of seconds to wait for another request to query the same device
+LLDP_QUERY_TIMEOUT = 60
+# Number of interface connections created or deleted per transaction by apply_connection_changes()
+CONNECTION_CHANGES_CHUNK_SIZE = 500
+# Dimensions of rendered rack elevations, in pixels
+RACK_ELEVATION_UNIT_HEIGHT = 22
+RACK_ELEVATION_WIDTH = 230
+RACK_ELEVATION_LEGEND_WIDTH = 30
+# Device fields displayed in rack elevations
+RACK_ELEVATION_FIELDS = [
+    'rack_id', 'pk', 'name', 'position', 'face', 'device_type__u_height', 'device_type__is_full_depth',
+    'device_type__manufacturer__name', 'device_type__model', 'device_role__name', 'device_role__color',
+]
+# Fill colors of device roles (see base.css)
+ROLE_COLORS = {
+    COLOR_TEAL: '#1abc9c',
+    COLOR_GREEN: '#2ecc71',
+    COLOR_BLUE: '#3498db',
+    COLOR_PURPLE: '#9b59b6',
+    COLOR_YELLOW: '#f1c40f',
+    COLOR_ORANGE: '#e67e22',
+    COLOR_RED: '#e74c3c',
+    COLOR_GRAY1: '#dce2e3',
+    COLOR_GRAY2: '#95a5a6',
+    COLOR_GRAY3: '#34495e',
+}
+
+
+def query_lldp_neighbors(device, RPC):
+    """
+    Connect to a device and return its LLDP neighbors.
+    """
+    with session_pool.session(RPC, device, settings.NETBOX_USERNAME, settings.NETBOX_PASSWORD) as rpc_client:
+        return rpc_client.get_lldp_neighbors()
+
+
+def refresh_lldp_neighbors(device, RPC):
+    """
+    Query the LLDP neighbors of a device and cache them along with the time of the query. The query lock of the device
+    must have been acquired; it is released once done.
+    """
+    key = 'lldp_neighbors_{}'.format(device.pk)
+    try:
+        result = (time.time(), query_lldp_neighbors(device, RPC))
+        cache.set(key, result, settings.LLDP_CACHE_TIMEOUT + LLDP_STALE_TIMEOUT)
+        return result
+    finally:
+        cache.delete('{}_lock'.format(key))
+
+
+def get_lldp_neighbors(device, RPC):
+    """
+    Return the LLDP neighbors of a device and the time at which they were queried. Neighbors are cached for
+    LLDP_CACHE_TIMEOUT seconds. Expired neighbors are returned for up to LLDP_STALE_TIMEOUT more seconds while being
+    refreshed in the background. Only one request queries a device at a time; concurrent requests wait for its result.
+
+    The device's platform and primary IP must have been fetched, as background queries don't access the database.
+    """
+    if not settings.LLDP_CACHE_TIMEOUT:
+        return time.time(), query_lldp_neighbors(device, RPC)
+
+    key = 'lldp_neighbors_{}'.format(device.pk)
+    lock_key = '{}_lock'.format(key)
+
+    result = cache.get(key)
+    if result is not None:
+        if time.time() - result[0] >= settings.LLDP_CACHE_TIMEOUT and cache.add(lock_key, True, LLDP_QUERY_TIMEOUT):
+
+            def refresh():
+                try:
+                    refresh_lldp_neighbors(device, RPC)
+                except Exception:
+                    # Keep returning the stale neighbors until they can be refreshed or they expire
+                    pass
+
+            thread = threading.Thread(target=refresh)
+            thread.daemon = True
+            thread.start()
+        return result
+
+    if cache.add(lock_key, True, LLDP_QUERY_TIMEOUT):
+        return refresh_lldp_neighbors(device, RPC)
+
+    # Another request is querying the device: wait for its result
+    deadline = time.time() + LLDP_QUERY_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(0.1)
+        result = cache.get(key)
+        if result is not None:
+            return result
+        if cache.get(lock_key) is None:
+            break
+    raise RuntimeError("LLDP neighbors of {} could not be retrieved.".format(device))
+
+
+def collect_lldp_neighbors(devices, username=None, password=None, workers=1, **kwargs):
+    """
+    Query the LLDP neighbors of devices concurrently (see extras.rpc.query_devices()), using the NETBOX_USERNAME and
+    NETBOX_PASSWORD credentials by default. Return a dictionary mapping devices to their neighbors, and a dictionary
+    mapping devices which could not be queried to an error message.
+    """
+    if username is None:
+        username = settings.NETBOX_USERNAME
+    if password is None:
+        password = settings.NETBOX_PASSWORD
+    neighbors = {}
+    errors = {}
+
+    queries = []
+    for device in devices:
+        RPC = device.get_rpc_client()
+        if not device.primary_ip:
+            errors[device] = "No primary IP set"
+        elif not RPC:
+            errors[device] = "No RPC client available for platform {}".format(device.platform)
+        else:
+            queries.append((device, RPC))
+
+    results = query_devices(queries, lambda rpc_client: rpc_client.get_lldp_neighbors(), username, password, workers,
+                            **kwargs)
+    for device, result, error, elapsed in results:
+        if error:
+            errors[device] = error
+        else:
+            neighbors[device] = result
+
+    return neighbors, errors
+
+
+def get_connection_changes(neighbors):
+    """
+    Compare the LLDP neighbors of devices (as returned by collect_lldp_neighbors()) with their interface connections.
+    Return the list of InterfaceConnections to delete, the list of unsaved InterfaceConnections to create and a list of
+    warnings about the neighbors which could not be matched. Connections are deleted when:
+
+      * One of their interfaces is seen connected to another interface, or
+      * Both of their devices have been queried and neither reports the other as a neighbor on these interfaces (nor
+        an unknown neighbor, which may be a naming mismatch).
+
+    Planned connections are never changed. Devices, interfaces and connections are each fetched with a single query.
+    """
+    remote_devices = {
+        d.name: d for d in Device.objects.filter(name__in={n['name'] for n_list in neighbors.values() for n in n_list})
+    }
+    device_ids = {d.pk for d in neighbors} | {d.pk for d in remote_devices.values()}
+    interfaces = {
+        (i.device_id, i.name): i for i in Interface.objects.filter(device__in=device_ids).select_related('device')
+    }
+    connections = InterfaceConnection.objects.filter(
+        Q(interface_a__device__in=device_ids) | Q(interface_b__device__in=device_ids)
+    ).select_related('interface_a__device', 'interface_b__device')
+    connected = {}
+    for connection in connections:
+        connected[connection.interface_a_id] = connection
+        connected[connection.interface_b_id] = connection
+
+    # LLDP adjacencies, keyed by the pair of interface IDs (an adjacency is usually reported by both ends)
+    warnings = []
+    adjacencies = {}
+    unmatched = set()
+    for device, device_neighbors in neighbors.items():
+        for neighbor in device_neighbors:
+            interface = interfaces.get((device.pk, neighbor['local-interface']))
+            remote_device = remote_devices.get(neighbor['name'])
+            remote_interface = interfaces.get((remote_device.pk, neighbor['remote-interface'])) if remote_device \
+                else None
+            if interface is None or remote_interface is None:
+                if interface is not None:
+                    unmatched.add(interface.pk)
+                warnings.append("{} {}: unknown neighbor {} {}".format(
+                    device, neighbor['local-interface'], neighbor['name'], neighbor['remote-interface']
+                ))
+                continue
+            adjacencies[frozenset([interface.pk, remote_interface.pk])] = (interface, remote_interface)
+
+    # Interfaces seen with several neighbors (e.g. through an unmanaged switch) are left alone
+    neighbor_count = Counter(pk for pair in adjacencies for pk in pair)
+
+    to_delete = {}
+    to_create = []
+    for pair, (interface_a, interface_b) in sorted(adjacencies.items(), key=lambda item: sorted(item[0])):
+        if any(neighbor_count[pk] > 1 for pk in pair):
+            warnings.append("{} {}: multiple neighbors".format(interface_a.device, interface_a.name))
+            continue
+        existing = [connected[pk] for pk in pair if pk in connected]
+        if any({c.interface_a_id, c.interface_b_id} == pair for c in existing):
+            continue
+        planned = [c for c in existing if c.connection_status != CONNECTION_STATUS_CONNECTED]
+        if planned:
+            warnings.append("{} {}: planned connection differs from neighbor {} {}".format(
+                interface_a.device, interface_a.name, interface_b.device, interface_b.name
+            ))
+            continue
+        for connection in existing:
+            to_delete[connection.pk] = connection
+        to_create.append(InterfaceConnection(interface_a=interface_a, interface_b=interface_b))
+
+    for connection in connections:
+        if connection.connection_status != CONNECTION_STATUS_CONNECTED or connection.pk in to_delete:
+            continue
+        pair = frozenset([connection.interface_a_id, connection.interface_b_id])
+        if connection.interface_a.device in neighbors and connection.interface_b.device in neighbors and \
+                pair not in adjacencies and not pair & unmatched:
+            to_delete[connection.pk] = connection
+
+    return sorted(to_delete.values(), key=lambda c: c.pk), to_create, warnings
+
+
+def group_connection_changes(to_delete, to_create):
+    """
+    Group each new InterfaceConnection with the connections it replaces (those using one of its interfaces), merging
+    the groups of new connections which replace the same connection. Return a list of (connections to delete,
+    connections to create) tuples; connections deleted without replacement are grouped alone.
+    """
+    replaced = {}
+    for connection in to_delete:
+        replaced[connection.interface_a_id] = connection
+        replaced[connection.interface_b_id] = connection
+
+    # Union-find over the indexes of new connections
+    parents = range(len(to_create))
+
+    def find(i):
+        while parents[i] != i:
+            i = parents[i]
+        return i
+
+    owners = {}
+    for i, connection in enumerate(to_create):
+        for interface_id in (connection.interface_a_id, connection.interface_b_id):
+            old = replaced.get(interface_id)
+            if old is None:
+                continue
+            if old.pk in owners:
+                parents[find(i)] = find(owners[old.pk])
+            else:
+                owners[old.pk] = i
+
+    groups = OrderedDict()
+    for i, connection in enumerate(to_create):
+        groups.setdefault(find(i), ([], []))[1].append(connection)
+    for connection in to_delete:
+        if connection.pk in owners:
+            groups[find(owners[connection.pk])][0].append(connection)
+        else:
+            groups[('delete', connection.pk)] = ([connection], [])
+    return groups.values()
+
+
+def apply_connection_changes(to_delete, to_create):
+    """
+    Delete and create InterfaceConnections in transactions of about CONNECTION_CHANGES_CHUNK_SIZE changes. A new
+    connection is always applied in the same transaction as the deletion of the connections it replaces, so that a
+    failure never leaves its interfaces disconnected.
+    """
+    def apply(batch):
+        with transaction.atomic():
+            InterfaceConnection.objects.filter(pk__in=[c.pk for deleted, created in batch for c in deleted]).delete()
+            InterfaceConnection.objects.bulk_create([c for deleted, created in batch for c in created])
+
+    batch = []
+    size = 0
+    for deleted, created in group_connection_changes(to_delete, to_create):
+        batch.append((deleted, created))
+        size += len(deleted) + len(created)
+        if size >= CONNECTION_CHANGES_CHUNK_SIZE:
+            apply(batch)
+            batch = []
+            size = 0
+    if batch:
+        apply(batch)
+
+
+#
+# Rack elevations
+#
+
+def render_rack_elevation_svg(rack, face, devices):
+    """
+    Render one face of a rack as an SVG image. Devices are given as rows of RACK_ELEVATION_FIELDS values. Devices
+    mounted on the face are drawn in the color of their role and link to the device; full depth devices mounted on the
+    other face are drawn in gray.
+    """
+    height = rack.u_height * RACK_ELEVATION_UNIT_HEIGHT
+    x = RACK_ELEVATION_LEGEND_WIDTH
+    svg = [
+        '<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="{}" height="{}" '
+        'font-family="sans-serif" font-size="12">'.format(x + RACK_ELEVATION_WIDTH, height + 1),
+    ]
+
+    # Unit legend and empty units
+    for u in rack.units:
+        y = (rack.u_height - u) * RACK_ELEVATION_UNIT_HEIGHT
+        svg.append('<text x="{}" y="{}" text-anchor="end">{}</text>'.format(x - 4, y + 15, u))
+        svg.append('<rect x="{}" y="{}" width="{}" height="{}" fill="#f5f5f5" stroke="#d0d0d0"/>'.format(
+            x, y, RACK_ELEVATION_WIDTH, RACK_ELEVATION_UNIT_HEIGHT
+        ))
+
+    for row in devices:
+        pk, name, position, device_face, u_height, is_full_depth, manufacturer, model, role, color = row[1:]
+        if device_face != face and not is_full_depth:
+            continue
+        device_type = u'{} {}'.format(manufacturer, model)
+        if not name:
+            name = u'{} ({} U{})'.format(device_type, rack.name, position)
+        y = (rack.u_height - position - u_height + 1) * RACK_ELEVATION_UNIT_HEIGHT
+        if device_face == face:
+            fill, text_color = ROLE_COLORS.get(color, '#ffffff'), '#000000'
+        else:
+            fill, text_color = '#e0e0e0', '#7f8c8d'
+        device = u''.join([
+            '<rect x="{}" y="{}" width="{}" height="{}" fill="{}" stroke="#7f8c8d"/>'.format(
+                x, y, RACK_ELEVATION_WIDTH, u_height * RACK_ELEVATION_UNIT_HEIGHT, fill
+            ),
+            u'<text x="{}" y="{}" text-anchor="middle" fill="{}">{}</text>'.format(
+                x + RACK_ELEVATION_WIDTH / 2, y + u_height * RACK_ELEVATION_UNIT_HEIGHT / 2 + 4, text_color,
+                escape(name)
+            ),
+        ])
+        if device_face == face:
+            device = u'<a xlink:href="{}"><title>{}&#10;{} ({}U)</title>{}</a>'.format(
+                reverse('dcim:device', args=[pk]), escape(role), escape(device_type), u_height, device
+            )
+        svg.append(device)
+
+    svg.append('</svg>')
+    return u''.join(svg)
+
+
+def get_rack_elevation_svgs(racks, face):
+    """
+    Return a dictionary mapping the PKs of Racks to the SVG rendering of one face of each. Renderings are cached under
+    the version of each rack (see get_rack_versions()); the devices of the racks which are not cached are fetched with a
+    single query.
+    """
+    racks = {rack.pk: rack for rack in racks}
+    keys = {
+        pk: 'rack_elevation_{}_{}_{}'.format(pk, face, version)
+        for pk, version in get_rack_versions(racks.values()).items()
+    }
+    svgs = cache.get_many(keys.values())
+
+    missing = [pk for pk, key in keys.items() if key not in svgs]
+    devices = {pk: [] for pk in missing}
+    if missing:
+        for row in Device.objects.filter(rack__in=missing, position__gt=0).order_by('rack', 'pk')\
+                .values_list(*RACK_ELEVATION_FIELDS):
+            devices[row[0]].append(row)
+
+    rendered = {}
+    for pk in missing:
+        rendered[keys[pk]] = svgs[keys[pk]] = render_rack_elevation_svg(racks[pk], face, devices[pk])
+    if rendered:
+        cache.set_many(rendered, RACK_ELEVATION_CACHE_TIMEOUT)
+
+    return {pk: svgs[key] for pk, key in keys.items()}
@@ -11,6 +11,7 @@ from django.db.models import Count, Sum
 from django.db.models.functions import Coalesce
 from django.http import HttpResponseRedirect
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils import timezone
 from django.utils.http import urlencode
 from django.views.generic import View
 
@@ -26,8 +27,8 @@ from . import filters, forms, tables
 from .models import (
     CONNECTION_STATUS_CONNECTED, ConsolePort, ConsolePortTemplate, ConsoleServerPort, ConsoleServerPortTemplate, Device,
     DeviceBay, DeviceBayTemplate, DeviceRole, DeviceType, Interface, InterfaceConnection, InterfaceTemplate,
-    Manufacturer, Module, Platform, PowerOutlet, PowerOutletTemplate, PowerPort, PowerPortTemplate, Rack, RackGroup,
-    RackRole, Site,
+    Manufacturer, Module, Platform, PowerOutlet, PowerOutletTemplate, PowerPort, PowerPortTemplate, Rack,
+    RACK_FACE_FRONT, RACK_FACE_REAR, RackGroup, RackRole, Site, get_rack_elevations, touch_devices,
 )
 
 
@@ -208,14 +209,15 @@ def rack(request, pk):
         .select_related('device_type__manufacturer')
     next_rack = Rack.objects.filter(site=rack.site, name__gt=rack.name).order_by('name').first()
     prev_rack = Rack.objects.filter(site=rack.site, name__lt=rack.name).order_by('-name').first()
+    elevations = get_rack_elevations([rack], remove_redundant=True)[rack.pk]
 
     return render(request, 'dcim/rack.html', {
         'rack': rack,
         'nonracked_devices': nonracked_devices,
         'next_rack': next_rack,
         'prev_rack': prev_rack,
-        'front_elevation': rack.get_front_elevation(),
-        'rear_elevation': rack.get_rear_elevation(),
+        'front_elevation': elevations[RACK_FACE_FRONT],
+        'rear_elevation': elevations[RACK_FACE_REAR],
     })
 
 
@@ -379,7 +381,11 @@ class DeviceTypeBulkEditView(PermissionRequiredMixin, BulkEditView):
             if form.cleaned_data[field]:
                 fields_to_update[field] = form.cleaned_data[field]
 
-        return self.cls.objects.filter(pk__in=pk_list).update(**fields_to_update)
+        updated_count = self.cls.objects.filter(pk__in=pk_list).update(**fields_to_update)
+        # Refresh the rack elevations showing devices of these types
+        if updated_count:
+            touch_devices(Device.objects.filter(device_type__in=pk_list))
+        return updated_count
 
 
 class DeviceTypeBulkDeleteView(PermissionRequiredMixin, BulkDeleteView):
@@ -696,6 +702,9 @@ class DeviceBulkEditView(PermissionRequiredMixin, BulkEditView):
         for field in ['tenant', 'device_type', 'device_role', 'serial']:
             if form.cleaned_data[field]:
                 fields_to_update[field] = form.cleaned_data[field]
+        # update() does not set auto_now fields (rack elevations are versioned on last_updated)
+        if fields_to_update:
+            fields_to_update['last_updated'] = timezone.now()
 
         return self.cls.objects.filter(pk__in=pk_list).update(**fields_to_update)
 
@@ -1,11 +1,18 @@
+from calendar import timegm
+
 from rest_framework import generics
 from django.http import HttpResponse
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
 
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import ParseError
 from rest_framework.response import Response
 
 from ipam.models import IPAddress
-from dns.models import Zone, Record, export_bind_forward, export_bind_reverse
+from dns.models import (
+    Zone, Record, export_bind_forward, export_bind_reverse, get_bind_forward_version, get_bind_reverse_version,
+)
 from dns import filters
 
 from . import serializers
@@ -58,19 +65,64 @@ class RecordDetailView(generics.RetrieveAPIView):
 #
 
 
+def parse_serial_map(request):
+    """
+    Parse the optional "since" parameter of the BIND export endpoints: a comma-separated list of zone:serial pairs.
+    """
+    since = request.query_params.get('since')
+    if not since:
+        return None
+    try:
+        return dict(item.rsplit(':', 1) for item in since.split(','))
+    except ValueError:
+        raise ParseError(detail='Invalid "since" parameter, expected a comma-separated list of zone:serial pairs.')
+
+
+def bind_export_response(request, export, get_version):
+    """
+    Return the BIND export as a Response, with ETag and Last-Modified headers reflecting the state of the zones after
+    the export (which may have incremented some serials).
+    """
+    response = Response(export(parse_serial_map(request)))
+    etag, last_modified = get_version()
+    if etag:
+        response['ETag'] = quote_etag(etag)
+    if last_modified:
+        response['Last-Modified'] = http_date(timegm(last_modified.utctimetuple()))
+    return response
+
+
+def bind_condition(get_version):
+    """
+    Conditional GET support (If-None-Match/If-Modified-Since) for the BIND export endpoints, based on a version computed
+    once per request.
+    """
+    def version(request):
+        if not hasattr(request, '_bind_version'):
+            request._bind_version = get_version()
+        return request._bind_version
+
+    return condition(
+        etag_func=lambda request: version(request)[0],
+        last_modified_func=lambda request: version(request)[1],
+    )
+
+
+@bind_condition(get_bind_forward_version)
 @api_view(['GET'])
 def bind_forward(request):
     """
-    Full export of forward zones in BIND format
+    Full export of forward zones in BIND format. Pass since=<zone>:<serial>,... to only retrieve the zones whose serial
+    changed.
     """
-    zones_list = export_bind_forward()
-    return Response(zones_list)
+    return bind_export_response(request, export_bind_forward, get_bind_forward_version)
 
 
+@bind_condition(get_bind_reverse_version)
 @api_view(['GET'])
 def bind_reverse(request):
     """
-    Full export of reverse zones in BIND format
+    Full export of reverse zones in BIND format. Pass since=<zone>:<serial>,... to only retrieve the zones whose serial
+    changed.
     """
-    zones_list = export_bind_reverse()
-    return Response(zones_list)
+    return bind_export_response(request, export_bind_reverse, get_bind_reverse_version)
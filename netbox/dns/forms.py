@@ -3,7 +3,8 @@ from django.db.models import Count
 
 from ipam.models import IPAddress
 from utilities.forms import (
-    BootstrapMixin, ConfirmationForm, APISelect, Livesearch, CSVDataField, BulkImportForm, SmallTextarea
+    BootstrapMixin, ConfirmationForm, APISelect, Livesearch, CSVDataField, BulkImportForm, FlexibleModelChoiceField,
+    SmallTextarea
 )
 
 from .models import (
@@ -107,7 +108,7 @@ class RecordForm(forms.ModelForm, BootstrapMixin):
 
 class RecordFromCSVForm(forms.ModelForm):
 
-    zone = forms.ModelChoiceField(queryset=Zone.objects.all(), to_field_name='name', error_messages={'invalid_choice': 'Zone not found.'})
+    zone = FlexibleModelChoiceField(queryset=Zone.objects.all(), to_field_name='name', error_messages={'invalid_choice': 'Zone not found.'})
     address = AddressFormField(required=False)
 
     class Meta:
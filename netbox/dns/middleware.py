@@ -0,0 +1,14 @@
+from .models import begin_zone_changes, end_zone_changes
+
+
+class DeferZoneChangesMiddleware(object):
+    """
+    Flag the zones changed while handling a request once, at the end of the request, rather than each time one of their
+    records is saved or deleted. This keeps bulk imports and edits from repeatedly updating the same zones.
+    """
+    def process_request(self, request):
+        begin_zone_changes()
+
+    def process_response(self, request, response):
+        end_zone_changes()
+        return response
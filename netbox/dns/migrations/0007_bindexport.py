@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-18 06:23
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dns', '0006_zone_extra_conf'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BindExport',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('reverse', models.BooleanField(default=False)),
+                ('serial', models.CharField(blank=True, max_length=10)),
+                ('checksum', models.CharField(max_length=40)),
+                ('extra_conf', models.CharField(blank=True, max_length=500)),
+                ('content', models.TextField()),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['reverse', 'name'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='bindexport',
+            unique_together=set([('reverse', 'name')]),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-18 06:25
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dns', '0007_bindexport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bindexport',
+            name='zone',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='bind_export', to='dns.Zone'),
+        ),
+        migrations.AlterField(
+            model_name='bindexport',
+            name='checksum',
+            field=models.CharField(blank=True, max_length=40),
+        ),
+        migrations.AlterUniqueTogether(
+            name='bindexport',
+            unique_together=set([]),
+        ),
+    ]
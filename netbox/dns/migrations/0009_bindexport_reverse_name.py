@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dns', '0008_bindexport_zone'),
+    ]
+
+    operations = [
+        # Reverse exports are identified by their name. Forward exports are identified by their zone, and may briefly
+        # share a name while zones are renamed, so uniqueness only applies to reverse exports.
+        migrations.RunSQL(
+            sql=[
+                'DELETE FROM dns_bindexport a USING dns_bindexport b '
+                'WHERE a.reverse AND b.reverse AND a.name = b.name AND a.id < b.id',
+                'CREATE UNIQUE INDEX dns_bindexport_reverse_name ON dns_bindexport (name) WHERE reverse',
+            ],
+            reverse_sql='DROP INDEX dns_bindexport_reverse_name',
+        ),
+    ]
@@ -1,14 +1,22 @@
 
+from bisect import bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
+
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Cast
+from django.utils import timezone
 
 from utilities.models import CreatedUpdatedModel
 
+import hashlib
+import threading
 import time
 
-from django.db.models.signals import pre_delete
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
 import ipam.models
@@ -140,9 +148,15 @@ class Record(CreatedUpdatedModel):
             raise ValidationError("DNS records must have either an IP address or a text value")
 
     def save(self, *args, **kwargs):
-        self.zone.save()  # in order to update serial.
+        # Flag the zone(s) in order to update serial.
+        if self.pk:
+            for zone_id in Record.objects.filter(pk=self.pk).exclude(zone=self.zone_id).values_list('zone', flat=True):
+                mark_zone_changed(zone_id)
+        mark_zone_changed(self.zone_id)
         super(Record, self).save(*args, **kwargs)
 
+    csv_related = ['zone', 'address']
+
     def to_csv(self):
         return ','.join([
             self.zone.name,
@@ -170,7 +184,112 @@ class Record(CreatedUpdatedModel):
 
 @receiver(pre_delete, sender=Record)
 def on_record_delete(sender, **kwargs):
-    kwargs['instance'].zone.save()
+    mark_zone_changed(kwargs['instance'].zone_id)
+
+
+#
+# Zone changes
+#
+
+_zone_changes = threading.local()
+
+
+def flag_zones_changed(pk_list):
+    """
+    Flag the given zones as changed, so that their serial is incremented on the next export, with a single UPDATE.
+    """
+    if pk_list:
+        Zone.objects.filter(pk__in=pk_list).update(bind_changed=True, last_updated=timezone.now())
+
+
+def mark_zone_changed(pk):
+    """
+    Flag a zone as changed following a change of one of its records. Within defer_zone_changes(), the zone is only
+    collected and flagged once when the block exits.
+    """
+    pending = getattr(_zone_changes, 'pending', None)
+    if pending is not None:
+        pending.add(pk)
+    else:
+        flag_zones_changed([pk])
+
+
+def begin_zone_changes():
+    _zone_changes.pending = set()
+
+
+def end_zone_changes():
+    pending = getattr(_zone_changes, 'pending', None)
+    _zone_changes.pending = None
+    if pending:
+        flag_zones_changed(pending)
+
+
+@contextmanager
+def defer_zone_changes():
+    """
+    Collect the zones changed within the block and flag them all with a single UPDATE when it exits, instead of updating
+    a zone each time one of its records is saved or deleted. Nested blocks are merged into the outermost one.
+    """
+    if getattr(_zone_changes, 'pending', None) is not None:
+        yield
+        return
+    begin_zone_changes()
+    try:
+        yield
+    finally:
+        end_zone_changes()
+
+
+#
+# Zone lookup
+#
+
+
+class ZoneIndex(object):
+    """
+    Maps zone names to zones in order to find the most specific zone of a domain name with one dictionary lookup per
+    label. The index is kept per process: it is dropped whenever a zone is saved or deleted in this process, and rebuilt
+    when the number of zones, their highest ID or their latest update shows that zones were changed by another process.
+    Zones are loaded with their name only.
+    """
+
+    def __init__(self):
+        self.signature = None
+        self.zones = {}
+
+    def invalidate(self):
+        self.signature = None
+
+    def lookup(self, fqdn):
+        """
+        Return a (zone, relative name) tuple for the longest zone name which is a suffix of the given domain name, or
+        None.
+        """
+        signature = Zone.objects.aggregate(count=models.Count('pk'), last=models.Max('pk'),
+                                           last_updated=models.Max('last_updated'))
+        if signature != self.signature:
+            zones = {}
+            for zone in Zone.objects.order_by('pk').only('pk', 'name'):
+                zones.setdefault(zone.name.lower().rstrip('.'), zone)
+            self.zones = zones
+            self.signature = signature
+
+        labels = fqdn.rstrip('.').split('.')
+        for i in range(len(labels)):
+            zone = self.zones.get('.'.join(labels[i:]).lower())
+            if zone is not None:
+                return zone, '.'.join(labels[:i]) or '@'
+        return None
+
+
+zone_index = ZoneIndex()
+
+
+@receiver(post_save, sender=Zone)
+@receiver(post_delete, sender=Zone)
+def on_zone_change(sender, **kwargs):
+    zone_index.invalidate()
 
 
 #
@@ -178,41 +297,301 @@ def on_record_delete(sender, **kwargs):
 #
 
 
-def export_bind_forward():
-    zones = Zone.objects.all()
+# Number of zones whose content is loaded or rendered at once by the export generators
+BIND_EXPORT_CHUNK_SIZE = 100
+
 
-    zones_list = []
-    for z in zones:
-        records = Record.objects.filter(zone=z)
-        zones_list.append({
-            'num': len(zones_list),
-            'id': z.name,
-            'extra_conf': z.extra_conf,
-            'content': z.to_bind(records)
-        })
+def chunked(iterable, size=BIND_EXPORT_CHUNK_SIZE):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
-    return zones_list
+
+def iter_bind_forward(since=None):
+    """
+    Generate the export of all forward zones, one zone at a time. Only the zones flagged with bind_changed (or never
+    exported) are rendered; the others are served from their BindExport without touching their records. Zone content
+    is loaded by chunks, so that the whole export is never held in memory.
+
+    :param since: Optional dictionary mapping zone names to serials; zones still at the given serial are skipped.
+    """
+    zones = Zone.objects.select_related('bind_export').defer('bind_export__content')
+    since = since or {}
+
+    num = 0
+    for chunk in chunked(zones):
+        changed = set(z.pk for z in chunk if z.bind_changed or not hasattr(z, 'bind_export') or
+                      z.bind_export.serial != z.soa_serial)
+        chunk = [z for z in chunk if z.pk in changed or since.get(z.name) != z.soa_serial]
+        records = {}
+        for r in Record.objects.filter(zone__in=changed).select_related('address'):
+            records.setdefault(r.zone_id, []).append(r)
+        cache = dict(BindExport.objects.filter(zone__in=[z.pk for z in chunk if z.pk not in changed])
+                     .values_list('zone', 'content'))
+
+        for z in chunk:
+            if z.pk in changed:
+                content = z.to_bind(records.get(z.pk, []))
+                e = getattr(z, 'bind_export', None) or BindExport(zone=z)
+                e.name = z.name
+                e.serial = z.soa_serial
+                e.extra_conf = z.extra_conf
+                e.content = content
+                e.save()
+            else:
+                content = cache[z.pk]
+            yield {
+                'num': num,
+                'id': z.name,
+                'serial': z.soa_serial,
+                'extra_conf': z.extra_conf,
+                'content': content,
+            }
+            num += 1
 
 
-def export_bind_reverse():
-    zones = {}
+def export_bind_forward(since=None):
+    return list(iter_bind_forward(since))
 
-    prefixes = ipam.models.Prefix.objects.all()
 
-    for p in prefixes:
-        child_ip = ipam.models.IPAddress.objects.filter(address__net_contained_or_equal=str(p.prefix))
-        z = p.to_bind(child_ip)
-        for zz in z:
-            if not zz['id'] in zones:
-                zones[zz['id']] = (zz['content'], p.extra_conf)
+class BindExport(models.Model):
+    """
+    A BindExport holds the last rendered BIND export of a zone, along with the serial and a checksum of the data it was
+    rendered from. Zones whose data has not changed since the last export are served from here instead of being
+    rendered again.
+
+    Forward exports are linked to their Zone, reverse exports are identified by their name (e.g. 1.168.192.in-addr.arpa.)
+    as they are computed from prefixes and IP addresses. The names of reverse exports are unique (enforced by a partial
+    index, see migration 0009).
+    """
+    name = models.CharField(max_length=255)
+    reverse = models.BooleanField(default=False)
+    zone = models.OneToOneField('Zone', related_name='bind_export', on_delete=models.CASCADE, blank=True, null=True)
+    serial = models.CharField(max_length=10, blank=True)
+    checksum = models.CharField(max_length=40, blank=True)
+    extra_conf = models.CharField(max_length=500, blank=True)
+    content = models.TextField()
+    last_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['reverse', 'name']
+
+    def __unicode__(self):
+        return self.name
 
-    zones_list = []
-    for zid, zc in zones.items():
-        zones_list.append({
-            'num': len(zones_list),
-            'id': zid,
-            'content': zc[0],
-            'extra_conf': zc[1],
-        })
 
-    return zones_list
+class ReversePrefixIndex(object):
+    """
+    Sorted interval index over the prefixes of one address family, used to find the prefix a reverse zone is generated
+    from. Each prefix is widened to the smallest block a reverse zone can be delegated for (a /24 for IPv4, a nibble
+    boundary for IPv6), and only the outermost blocks are kept. As those are disjoint, looking up an address is a
+    single bisection.
+
+    Blocks must be added in the order prefixes are exported (family, then prefix): when several prefixes widen to the
+    same block, the first one added owns it.
+    """
+
+    def __init__(self, family):
+        self.family = family
+        self.blocks = []
+        self.starts = []
+        self.ends = []
+        self.owners = []
+
+    def add(self, prefix, owner):
+        if self.family == 4:
+            length = min(prefix.prefixlen, 24)
+            hostmask = (1 << (32 - length)) - 1
+        else:
+            length = prefix.prefixlen - prefix.prefixlen % 4
+            hostmask = (1 << (128 - length)) - 1
+        first = prefix.first & ~hostmask
+        self.blocks.append((first, -(first | hostmask), len(self.blocks), length, owner))
+
+    def build(self):
+        for first, last, order, length, owner in sorted(self.blocks):
+            if self.ends and first <= self.ends[-1]:
+                # Contained within the previous outermost block
+                continue
+            self.starts.append(first)
+            self.ends.append(-last)
+            self.owners.append((length, owner))
+        self.blocks = []
+
+    def lookup(self, address):
+        """
+        Return a (block length, owner) tuple for the outermost block containing the given address, or None.
+        """
+        i = bisect_right(self.starts, address.value) - 1
+        if i >= 0 and address.value <= self.ends[i]:
+            return self.owners[i]
+        return None
+
+
+def reverse_zone_name(address, length):
+    """
+    Return the reverse zone ID and the relative PTR name of an address, given the length of the block containing it.
+    IPv4 reverse zones are /16 for blocks of /16 or larger and /24 otherwise; IPv6 reverse zones match the block.
+    """
+    if address.version == 4:
+        ibytes = str(address.ip).split('.')
+        if length <= 16:
+            return ibytes[1] + '.' + ibytes[0] + '.in-addr.arpa.', ibytes[3] + '.' + ibytes[2], 7
+        return ibytes[2] + '.' + ibytes[1] + '.' + ibytes[0] + '.in-addr.arpa.', ibytes[3], 3
+    idigits = '{:032x}'.format(address.value)
+    return (
+        '.'.join(idigits[:length / 4][::-1]) + '.ip6.arpa.',
+        '.'.join(idigits[length / 4:][::-1]),
+        30,
+    )
+
+
+def iter_bind_reverse(since=None):
+    """
+    Generate the export of all reverse zones, one zone at a time. Every PTR-bearing IP address is fetched once and
+    assigned to a reverse zone using a ReversePrefixIndex; only the zones whose records or prefix changed since the last
+    export are rendered again, the others are served from their BindExport.
+
+    :param since: Optional dictionary mapping zone IDs to serials; zones still at the given serial are skipped.
+    """
+    indexes = {
+        4: ReversePrefixIndex(4),
+        6: ReversePrefixIndex(6),
+    }
+    for pk, prefix in ipam.models.Prefix.objects.order_by('family', 'prefix').values_list('pk', 'prefix'):
+        indexes[prefix.version].add(prefix, pk)
+    for index in indexes.values():
+        index.build()
+
+    # Assign each IP address to a zone
+    zones = OrderedDict()
+    ipaddresses = ipam.models.IPAddress.objects.exclude(ptr='').values_list('address', 'ptr', 'description')
+    for address, ptr, description in ipaddresses:
+        found = indexes[address.version].lookup(address)
+        if found is None:
+            continue
+        length, owner = found
+        zone_id, name, width = reverse_zone_name(address, length)
+        if zone_id not in zones:
+            zones[zone_id] = {
+                'owner': owner,
+                'records': [],
+                'checksum': hashlib.sha1(str(owner)),
+            }
+        zones[zone_id]['records'].append((name, width, ptr, description))
+        zones[zone_id]['checksum'].update('\0'.join([name, ptr, description]).encode('utf-8') + '\n')
+
+    with transaction.atomic():
+        prefixes = ipam.models.Prefix.objects.in_bulk(set(z['owner'] for z in zones.values()))
+        cache = {e.name: e for e in BindExport.objects.filter(reverse=True).defer('content')}
+
+        # A prefix is dirty if any of its zones changed; all of its zones are then rendered with a new serial
+        dirty = set(pk for pk, p in prefixes.items() if p.bind_changed)
+        for zone_id, z in zones.items():
+            z['checksum'] = z['checksum'].hexdigest()
+            e = cache.get(zone_id)
+            if e is None or e.checksum != z['checksum'] or e.serial != prefixes[z['owner']].soa_serial:
+                dirty.add(z['owner'])
+        for pk in dirty:
+            prefixes[pk].update_serial()
+        # Changes to prefixes which no zone is generated from do not affect the export
+        ipam.models.Prefix.objects.filter(bind_changed=True).exclude(pk__in=prefixes.keys()).update(bind_changed=False)
+
+        # Discard zones which no longer exist
+        stale = set(cache.keys()) - set(zones.keys())
+        if stale:
+            BindExport.objects.filter(reverse=True, name__in=stale).delete()
+
+    since = since or {}
+    zones = [(zone_id, z) for zone_id, z in zones.items() if since.get(zone_id) != prefixes[z['owner']].soa_serial]
+
+    num = 0
+    for chunk in chunked(zones):
+        contents = dict(BindExport.objects.filter(reverse=True, name__in=[
+            zone_id for zone_id, z in chunk if zone_id in cache and z['owner'] not in dirty
+        ]).values_list('name', 'content'))
+
+        for zone_id, z in chunk:
+            p = prefixes[z['owner']]
+            if zone_id in contents:
+                content = contents[zone_id]
+            else:
+                gen_time = time.strftime('%A %B %d %Y %H:%M:%S', time.localtime())
+                content = p.get_bind_header(zone_id)
+                for name, width, ptr, description in z['records']:
+                    content += name.ljust(width) + '        IN PTR        ' + ptr.ljust(40) + '    ; ' + \
+                        description.ljust(20) + ' ; gen by netbox ( ' + gen_time + ' ) \n'
+                content += '\n\n; end '
+                fields = {
+                    'serial': p.soa_serial,
+                    'checksum': z['checksum'],
+                    'extra_conf': p.extra_conf,
+                    'content': content,
+                }
+                # A concurrent export may have created the zone since (reverse export names are unique)
+                if zone_id in cache:
+                    e, created = cache[zone_id], False
+                else:
+                    e, created = BindExport.objects.get_or_create(name=zone_id, reverse=True, defaults=fields)
+                if not created:
+                    for name, value in fields.items():
+                        setattr(e, name, value)
+                    e.save()
+            yield {
+                'num': num,
+                'id': zone_id,
+                'serial': p.soa_serial,
+                'content': content,
+                'extra_conf': p.extra_conf,
+            }
+            num += 1
+
+
+def export_bind_reverse(since=None):
+    return list(iter_bind_reverse(since))
+
+
+def get_bind_version(*querysets):
+    """
+    Return an (etag, last_modified) tuple summarizing the state of the objects a BIND export is computed from, using a
+    single aggregate query per queryset. Both are None while a zone is flagged with bind_changed, as its next export
+    will increment its serial. Serials only ever grow, so their sum is folded into the etag as well; this catches
+    updates made with QuerySet.update(), which bypass save() and may leave last_updated untouched.
+    """
+    etag = hashlib.sha1()
+    last_modified = None
+    for queryset in querysets:
+        aggregates = {
+            'count': models.Count('pk'),
+            'last_updated': models.Max('last_updated'),
+        }
+        if hasattr(queryset.model, 'bind_changed'):
+            aggregates['changed'] = models.Count(models.Case(models.When(bind_changed=True, then=1)))
+        if hasattr(queryset.model, 'soa_serial'):
+            aggregates['serials'] = models.Sum(models.Case(
+                models.When(soa_serial='', then=models.Value(0)),
+                default=Cast('soa_serial', models.BigIntegerField()),
+                output_field=models.BigIntegerField(),
+            ))
+        version = queryset.aggregate(**aggregates)
+        if version.get('changed'):
+            return None, None
+        etag.update('{}:{}:{}:{};'.format(
+            queryset.model._meta.label, version['count'], version['last_updated'], version.get('serials'),
+        ))
+        if version['last_updated'] and (last_modified is None or version['last_updated'] > last_modified):
+            last_modified = version['last_updated']
+    return etag.hexdigest(), last_modified
+
+
+def get_bind_forward_version():
+    return get_bind_version(Zone.objects.all())
+
+
+def get_bind_reverse_version():
+    return get_bind_version(ipam.models.Prefix.objects.all(), ipam.models.IPAddress.objects.all())
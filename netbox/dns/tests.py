@@ -1,3 +1,241 @@
+from netaddr import IPNetwork
+from StringIO import StringIO
+import zipfile
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.db import IntegrityError, transaction
 from django.test import TestCase
+from django.utils import timezone
+
+from dns.models import (
+    BindExport, Record, Zone, defer_zone_changes, export_bind_forward, export_bind_reverse, get_bind_forward_version,
+    get_bind_reverse_version, iter_bind_reverse, zone_index,
+)
+from ipam.models import IPAddress, Prefix
+
+
+class ExportBindReverseTestCase(TestCase):
+
+    def setUp(self):
+
+        self.prefix8 = Prefix.objects.create(prefix=IPNetwork('10.0.0.0/8'), soa_name='ns1.example.com.')
+        Prefix.objects.create(prefix=IPNetwork('10.1.2.0/24'))
+        Prefix.objects.create(prefix=IPNetwork('192.168.1.0/26'))
+        Prefix.objects.create(prefix=IPNetwork('2001:db8::/48'))
+
+        self.ip = IPAddress.objects.create(address=IPNetwork('10.1.2.3/24'), ptr='host1.example.com.')
+        IPAddress.objects.create(address=IPNetwork('10.1.2.4/24'))
+        IPAddress.objects.create(address=IPNetwork('192.168.1.200/24'), ptr='host2.example.com.')
+        IPAddress.objects.create(address=IPNetwork('172.16.0.1/24'), ptr='orphan.example.com.')
+        IPAddress.objects.create(address=IPNetwork('2001:db8::1/64'), ptr='host3.example.com.')
+
+    def test_zone_assignment(self):
+
+        zones = {z['id']: z['content'] for z in export_bind_reverse()}
+
+        self.assertEqual(sorted(zones.keys()), [
+            '0.0.0.0.8.b.d.0.1.0.0.2.ip6.arpa.',
+            '1.10.in-addr.arpa.',
+            '1.168.192.in-addr.arpa.',
+        ])
+        # Zones covered by a /16 or larger prefix are generated from the outermost one
+        self.assertIn('gen from prefix 10.0.0.0/8', zones['1.10.in-addr.arpa.'])
+        self.assertIn('3.2     ', zones['1.10.in-addr.arpa.'])
+        self.assertNotIn('4.2     ', zones['1.10.in-addr.arpa.'])
+        self.assertIn('200', zones['1.168.192.in-addr.arpa.'])
+        self.assertIn('1.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0', zones['0.0.0.0.8.b.d.0.1.0.0.2.ip6.arpa.'])
+
+    def test_unchanged_zones_are_not_regenerated(self):
+
+        export_bind_reverse()
+        serial = Prefix.objects.get(pk=self.prefix8.pk).soa_serial
+        cached = BindExport.objects.get(reverse=True, name='1.10.in-addr.arpa.')
+
+        export_bind_reverse()
+        self.assertEqual(Prefix.objects.get(pk=self.prefix8.pk).soa_serial, serial)
+        self.assertEqual(BindExport.objects.get(pk=cached.pk).last_updated, cached.last_updated)
+
+        self.ip.ptr = 'renamed.example.com.'
+        self.ip.save()
+        zones = {z['id']: z['content'] for z in export_bind_reverse()}
+        self.assertNotEqual(Prefix.objects.get(pk=self.prefix8.pk).soa_serial, serial)
+        self.assertIn('renamed.example.com.', zones['1.10.in-addr.arpa.'])
+
+    def test_stale_zones_are_discarded(self):
+
+        export_bind_reverse()
+        IPAddress.objects.filter(ptr='host2.example.com.').delete()
+        export_bind_reverse()
+
+        self.assertFalse(BindExport.objects.filter(reverse=True, name='1.168.192.in-addr.arpa.').exists())
+
+    def test_reverse_zone_names_are_unique(self):
+
+        export_bind_reverse()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            BindExport.objects.create(name='1.10.in-addr.arpa.', reverse=True, content='')
+        BindExport.objects.create(name='1.10.in-addr.arpa.', content='')
+
+        # A zone created by a concurrent export is updated rather than duplicated
+        BindExport.objects.filter(reverse=True).delete()
+        exports = iter_bind_reverse()
+        next(exports)
+        BindExport.objects.create(name='1.168.192.in-addr.arpa.', reverse=True, content='stale')
+        zones = {z['id']: z['content'] for z in exports}
+        self.assertEqual(BindExport.objects.filter(reverse=True).count(), 3)
+        self.assertEqual(BindExport.objects.get(reverse=True, name='1.168.192.in-addr.arpa.').content,
+                         zones['1.168.192.in-addr.arpa.'])
+
+    def test_version_tracks_bulk_edits(self):
+
+        export_bind_reverse()
+        etag, last_modified = get_bind_reverse_version()
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+        self.client.post(reverse('ipam:ipaddress_bulk_edit'), {
+            'pk': [self.ip.pk], 'ptr': 'renamed.example.com.', '_apply': True,
+        })
+        self.assertEqual(IPAddress.objects.get(pk=self.ip.pk).ptr, 'renamed.example.com.')
+        self.assertNotEqual(get_bind_reverse_version(), (etag, last_modified))
+
+
+class ExportBindForwardTestCase(TestCase):
+
+    def setUp(self):
+
+        zone_params = {
+            'ttl': 3600,
+            'soa_name': 'ns1.example.com.',
+            'soa_contact': 'hostmaster.example.com.',
+            'soa_refresh': 3600,
+            'soa_retry': 600,
+            'soa_expire': 86400,
+            'soa_minimum': 300,
+        }
+        self.zone1 = Zone.objects.create(name='example.com', **zone_params)
+        self.zone2 = Zone.objects.create(name='example.net', **zone_params)
+        Record.objects.create(name='www', record_type='CNAME', zone=self.zone1, value='web1')
+        Record.objects.create(name='www', record_type='CNAME', zone=self.zone2, value='web2')
+
+    def test_unchanged_zones_are_served_from_cache(self):
+
+        export_bind_forward()
+        serials = dict(Zone.objects.values_list('pk', 'soa_serial'))
+        cached = BindExport.objects.get(zone=self.zone2)
+
+        Record.objects.create(name='mail', record_type='CNAME', zone=Zone.objects.get(pk=self.zone1.pk), value='mx1')
+        zones = {z['id']: z['content'] for z in export_bind_forward()}
+
+        self.assertIn('mx1', zones['example.com'])
+        self.assertNotEqual(Zone.objects.get(pk=self.zone1.pk).soa_serial, serials[self.zone1.pk])
+        self.assertEqual(Zone.objects.get(pk=self.zone2.pk).soa_serial, serials[self.zone2.pk])
+        self.assertEqual(BindExport.objects.get(pk=cached.pk).last_updated, cached.last_updated)
+        self.assertEqual(zones['example.net'], cached.content)
+
+    def test_zip_download_is_streamed(self):
+
+        response = self.client.get('{}?download=all'.format(reverse('dns:full_forward')))
+
+        self.assertTrue(response.streaming)
+        archive = zipfile.ZipFile(StringIO(''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ['example.com', 'example.net', 'extra_confs.txt'])
+        self.assertIn('web2', archive.read('example.net'))
+
+    def test_api_conditional_get(self):
+
+        url = reverse('dns-api:bind_forward')
+        response = self.client.get(url)
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Record.objects.create(name='mail', record_type='CNAME', zone=Zone.objects.get(pk=self.zone1.pk), value='mx1')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_version_tracks_queryset_updates(self):
+
+        export_bind_forward()
+        etag, last_modified = get_bind_forward_version()
+
+        # QuerySet.update() leaves last_updated untouched
+        Zone.objects.filter(pk=self.zone1.pk).update(soa_serial='2099010101')
+        self.assertNotEqual(get_bind_forward_version()[0], etag)
+
+    def test_api_since(self):
+
+        url = reverse('dns-api:bind_forward')
+        serials = {z['id']: z['serial'] for z in self.client.get(url, format='json').data}
+
+        Record.objects.create(name='mail', record_type='CNAME', zone=Zone.objects.get(pk=self.zone1.pk), value='mx1')
+        since = ','.join('{}:{}'.format(name, serial) for name, serial in serials.items())
+        response = self.client.get(url, {'since': since})
+        self.assertEqual([z['id'] for z in response.data], ['example.com'])
+
+        response = self.client.get(url, {'since': 'example.com'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_deferred_zone_changes(self):
+
+        export_bind_forward()
+        with defer_zone_changes():
+            for i in range(10):
+                Record.objects.create(name='host{}'.format(i), record_type='A', zone=self.zone1, value='192.0.2.1')
+            self.assertFalse(Zone.objects.get(pk=self.zone1.pk).bind_changed)
+        self.assertTrue(Zone.objects.get(pk=self.zone1.pk).bind_changed)
+        self.assertFalse(Zone.objects.get(pk=self.zone2.pk).bind_changed)
+
+
+class ZoneIndexTestCase(TestCase):
+
+    def setUp(self):
+
+        zone_params = {
+            'ttl': 3600,
+            'soa_name': 'ns1.example.com.',
+            'soa_contact': 'hostmaster.example.com.',
+            'soa_refresh': 3600,
+            'soa_retry': 600,
+            'soa_expire': 86400,
+            'soa_minimum': 300,
+        }
+        self.zones = {
+            name: Zone.objects.create(name=name, **zone_params)
+            for name in ['example.com', 'sub.example.com', 'ample.com']
+        }
+
+    def test_longest_matching_zone(self):
+
+        ip = IPAddress.objects.create(address=IPNetwork('192.0.2.1/24'), ptr='host.sub.example.com.')
+        record = Record.objects.get(address=ip)
+        self.assertEqual(record.zone, self.zones['sub.example.com'])
+        self.assertEqual(record.name, 'host')
+        self.assertEqual(record.record_type, 'A')
+
+    def test_zone_labels_must_match(self):
+
+        ip = IPAddress.objects.create(address=IPNetwork('192.0.2.2/24'), ptr='www.myexample.com')
+        self.assertFalse(Record.objects.filter(address=ip).exists())
+
+    def test_index_follows_zone_changes(self):
+
+        IPAddress.objects.create(address=IPNetwork('192.0.2.3/24'), ptr='host.sub.example.com')
+        self.zones['sub.example.com'].delete()
+
+        ip = IPAddress.objects.create(address=IPNetwork('192.0.2.4/24'), ptr='host.sub.example.com')
+        record = Record.objects.get(address=ip)
+        self.assertEqual(record.zone, self.zones['example.com'])
+        self.assertEqual(record.name, 'host.sub')
+
+    def test_index_follows_renames_by_other_processes(self):
+
+        self.assertEqual(zone_index.lookup('host.lab.example.com')[0], self.zones['example.com'])
+        with self.assertNumQueries(1):
+            zone_index.lookup('host.lab.example.com')
 
-# Create your tests here.
+        # Renaming a zone with QuerySet.update() does not send post_save in this process
+        Zone.objects.filter(pk=self.zones['ample.com'].pk).update(name='lab.example.com', last_updated=timezone.now())
+        self.assertEqual(zone_index.lookup('host.lab.example.com'), (self.zones['ample.com'], 'host'))
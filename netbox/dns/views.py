@@ -3,7 +3,8 @@ from django_tables2 import RequestConfig
 from django.contrib.auth.mixins import PermissionRequiredMixin
 from django.db.models import Count
 from django.shortcuts import get_object_or_404, render
-from django.http import HttpResponse
+from django.utils import timezone
+from django.http import HttpResponse, StreamingHttpResponse
 
 from ipam.models import IPAddress, Prefix
 from utilities.paginator import EnhancedPaginator
@@ -12,10 +13,9 @@ from utilities.views import (
 )
 
 from . import filters, forms, tables
-from .models import Zone, Record, export_bind_forward, export_bind_reverse
+from .models import Zone, Record, flag_zones_changed, iter_bind_forward, iter_bind_reverse
 from .tables import RecordZoneTable
 
-import StringIO
 import zipfile
 import time
 
@@ -85,10 +85,8 @@ class ZoneBulkEditView(PermissionRequiredMixin, BulkEditView):
             if form.cleaned_data[field]:
                 fields_to_update[field] = form.cleaned_data[field]
 
-        zlist = self.cls.objects.filter(pk__in=pk_list)
-        for z in zlist:
-            z.set_bind_changed(True)
-        return zlist.update(**fields_to_update)
+        fields_to_update.update(bind_changed=True, last_updated=timezone.now())
+        return self.cls.objects.filter(pk__in=pk_list).update(**fields_to_update)
 
 
 class ZoneBulkDeleteView(PermissionRequiredMixin, BulkDeleteView):
@@ -159,8 +157,11 @@ class RecordBulkEditView(PermissionRequiredMixin, BulkEditView):
                 fields_to_update[field] = form.cleaned_data[field]
 
         rlist = self.cls.objects.filter(pk__in=pk_list)
-        if rlist:
-            rlist[0].save()
+        # Flag the zones the records are moved from as well as the one they are moved to
+        zones = set(rlist.order_by().values_list('zone', flat=True).distinct())
+        if 'zone' in fields_to_update:
+            zones.add(fields_to_update['zone'].pk)
+        flag_zones_changed(zones)
         return rlist.update(**fields_to_update)
 
 
@@ -176,34 +177,64 @@ class RecordBulkDeleteView(PermissionRequiredMixin, BulkDeleteView):
 #
 
 
-def bind_export(request, zones_list, context):
+class ZipStream(object):
+    """
+    Minimal write-only file object for zipfile.ZipFile: it keeps track of the position and hands out the data written
+    since the last call to pop(), so that an archive can be streamed while it is being written.
+    """
+
+    def __init__(self):
+        self.buf = []
+        self.pos = 0
+
+    def write(self, data):
+        self.buf.append(data)
+        self.pos += len(data)
+
+    def tell(self):
+        return self.pos
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = ''.join(self.buf)
+        self.buf = []
+        return data
+
+
+def stream_bind_zip(zones):
+    """
+    Generate a ZIP archive of the given zones, one zone at a time, followed by a file listing their extra
+    configuration.
+    """
+    zbuf = ZipStream()
+    zfile = zipfile.ZipFile(zbuf, mode='w')
+    cf = []
+    for z in zones:
+        zfile.writestr(z['id'], z['content'].encode('utf-8'))
+        cf.append(u'{}:\n\t{}\n'.format(z['id'], z['extra_conf'] if z['extra_conf'] else ''))
+        yield zbuf.pop()
+    zfile.writestr('extra_confs.txt', u''.join(cf).encode('utf-8'))
+    zfile.close()
+    yield zbuf.pop()
+
+
+def bind_export(request, export, context):
     download = request.GET.get('download')
+    if download == 'all':
+        response = StreamingHttpResponse(stream_bind_zip(export()), content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="netbox_dns_{}_{}.zip"'.format(context, str(int(time.time())))
+        return response
+
+    zones_list = list(export())
     if download:
-        if download == 'all':
-            zbuf = StringIO.StringIO()
-            zfile = zipfile.ZipFile(zbuf, mode='w')
-            temp = []
-            cf = ''
-            for z in zones_list:
-                temp.append(StringIO.StringIO())
-                temp[len(temp) - 1].write(z['content'])
-                zfile.writestr(z['id'], str(temp[len(temp) - 1].getvalue()))
-                cf += '{}:\n\t{}\n'.format(z['id'], z['extra_conf'] if z['extra_conf'] else '')
-            zfile.writestr('extra_confs.txt', cf)
-            zfile.close()
-            response = HttpResponse(
-                zbuf.getvalue(),
-                content_type='application/zip'
-            )
-            response['Content-Disposition'] = 'attachment; filename="netbox_dns_{}_{}.zip"'.format(context, str(int(time.time())))
-            return response
-        else:
-            response = HttpResponse(
-                zones_list[int(download)]['content'],
-                content_type='text/plain'
-            )
-            response['Content-Disposition'] = 'attachment; filename="{}"'.format(zones_list[int(download)]['id'])
-            return response
+        response = HttpResponse(
+            zones_list[int(download)]['content'],
+            content_type='text/plain'
+        )
+        response['Content-Disposition'] = 'attachment; filename="{}"'.format(zones_list[int(download)]['id'])
+        return response
 
     else:
         return render(request, 'dns/bind_export.html', {
@@ -214,8 +245,8 @@ def bind_export(request, zones_list, context):
 
 
 def full_forward(request):
-    return bind_export(request, export_bind_forward(), 'forward')
+    return bind_export(request, iter_bind_forward, 'forward')
 
 
 def full_reverse(request):
-    return bind_export(request, export_bind_reverse(), 'reverse')
+    return bind_export(request, iter_bind_reverse, 'reverse')
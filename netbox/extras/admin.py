@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Graph, ExportTemplate, TopologyMap, UserAction
+from .models import Graph, ExportTemplate, ImportJob, TopologyMap, UserAction
 
 
 @admin.register(Graph)
@@ -10,7 +10,7 @@ class GraphAdmin(admin.ModelAdmin):
 
 @admin.register(ExportTemplate)
 class ExportTemplateAdmin(admin.ModelAdmin):
-    list_display = ['content_type', 'name', 'mime_type', 'file_extension']
+    list_display = ['content_type', 'name', 'per_object', 'mime_type', 'file_extension']
 
 
 @admin.register(TopologyMap)
@@ -25,3 +25,9 @@ class TopologyMapAdmin(admin.ModelAdmin):
 class UserActionAdmin(admin.ModelAdmin):
     actions = None
     list_display = ['user', 'action', 'content_type', 'object_id', 'message']
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ['created', 'user', 'content_type', 'status', 'total_count', 'created_count']
+    exclude = ['data']
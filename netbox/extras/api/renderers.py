@@ -62,7 +62,8 @@ class FlatJSONRenderer(renderers.BaseRenderer):
 
 class FreeRADIUSClientsRenderer(renderers.BaseRenderer):
     """
-    Generate a FreeRADIUS clients.conf file from a list of Secrets.
+    Generate a FreeRADIUS clients.conf file from a list of Secrets. Secrets which cannot be rendered are reported as
+    comments.
     """
     media_type = 'text/plain'
     format = 'freeradius'
@@ -70,19 +71,34 @@ class FreeRADIUSClientsRenderer(renderers.BaseRenderer):
     CLIENT_TEMPLATE = """client {name} {{
     ipaddr = {ip}
     secret = {secret}
-}}"""
+}}
+"""
 
     def render(self, data, media_type=None, renderer_context=None):
-        clients = []
-        try:
-            for secret in data:
-                if secret['device']['primary_ip'] and secret['plaintext']:
-                    client = self.CLIENT_TEMPLATE.format(
-                        name=secret['device']['name'],
-                        ip=secret['device']['primary_ip']['address'].split('/')[0],
-                        secret=secret['plaintext']
-                    )
-                    clients.append(client)
-        except:
-            pass
-        return '\n'.join(clients)
+        if isinstance(data, dict):
+            # An error response (e.g. {'error': ...} or {'detail': ...})
+            if 'device' not in data:
+                return ''.join("# {}: {}\n".format(key, value) for key, value in data.items())
+            # A single Secret
+            data = [data]
+        return ''.join(self.render_clients(data))
+
+    def render_clients(self, secrets):
+        """
+        Generate the client block of each serialized Secret. Secrets may carry an `error` raised while decrypting them.
+        """
+        for secret in secrets:
+            if secret.get('error'):
+                error = secret['error']
+            elif not secret['device']['primary_ip']:
+                error = "No primary IP set"
+            elif secret['plaintext'] is None:
+                error = "Not decrypted"
+            else:
+                yield self.CLIENT_TEMPLATE.format(
+                    name=secret['device']['name'],
+                    ip=secret['device']['primary_ip']['address'].split('/')[0],
+                    secret=secret['plaintext']
+                )
+                continue
+            yield "# Skipped secret {} ({}): {}\n".format(secret['id'], secret['device']['name'], error)
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from extras.models import Graph
+from extras.models import Graph, ImportJob
 
 
 class GraphSerializer(serializers.ModelSerializer):
@@ -16,3 +16,14 @@ class GraphSerializer(serializers.ModelSerializer):
 
     def get_embed_link(self, obj):
         return obj.embed_link(self.context['graphed_object'])
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    content_type = serializers.SlugRelatedField(slug_field='model', read_only=True)
+    status = serializers.CharField(source='get_status_display')
+    errors = serializers.ListField(source='get_errors')
+
+    class Meta:
+        model = ImportJob
+        fields = ['id', 'content_type', 'status', 'created', 'started', 'completed', 'total_count', 'processed_count',
+                  'created_count', 'errors']
@@ -0,0 +1,12 @@
+from django.conf.urls import url
+
+from .views import ImportJobDetailView, ImportJobListView
+
+
+urlpatterns = [
+
+    # Import jobs
+    url(r'^import-jobs/$', ImportJobListView.as_view(), name='importjob_list'),
+    url(r'^import-jobs/(?P<pk>\d+)/$', ImportJobDetailView.as_view(), name='importjob_detail'),
+
+]
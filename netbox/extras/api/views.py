@@ -1,5 +1,6 @@
 import graphviz
 from rest_framework import generics
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 import tempfile
 from wsgiref.util import FileWrapper
@@ -10,9 +11,9 @@ from django.shortcuts import get_object_or_404
 
 from circuits.models import Provider
 from dcim.models import Site, Device, Interface, InterfaceConnection
-from extras.models import Graph, TopologyMap, GRAPH_TYPE_INTERFACE, GRAPH_TYPE_PROVIDER, GRAPH_TYPE_SITE
+from extras.models import Graph, ImportJob, TopologyMap, GRAPH_TYPE_INTERFACE, GRAPH_TYPE_PROVIDER, GRAPH_TYPE_SITE
 
-from .serializers import GraphSerializer
+from .serializers import GraphSerializer, ImportJobSerializer
 
 
 class GraphListView(generics.ListAPIView):
@@ -96,3 +97,25 @@ class TopologyMapView(APIView):
         response = HttpResponse(topo_data, content_type='image/png')
 
         return response
+
+
+class ImportJobListView(generics.ListAPIView):
+    """
+    List the import jobs of the current user
+    """
+    serializer_class = ImportJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return ImportJob.objects.filter(user=self.request.user).select_related('content_type')
+
+
+class ImportJobDetailView(generics.RetrieveAPIView):
+    """
+    Retrieve the status of an import job of the current user
+    """
+    serializer_class = ImportJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return ImportJob.objects.filter(user=self.request.user).select_related('content_type')
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from extras.models import ImportJob
+
+
+class Command(BaseCommand):
+    help = "Process pending bulk import jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', default=False,
+                            help="Exit once all pending jobs have been processed")
+        parser.add_argument('--interval', dest='interval', type=int, default=5,
+                            help="Seconds to wait between checks for new jobs (default: 5)")
+
+    def handle(self, *args, **options):
+
+        while True:
+            job = ImportJob.objects.claim_next()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+                continue
+
+            self.stdout.write("Processing {} for {}...".format(job, job.user))
+            try:
+                job.run()
+            except Exception as e:
+                self.stderr.write("Job {} failed: {}".format(job.pk, e))
+                continue
+            self.stdout.write("{}: {}".format(job, job.get_status_display()))
@@ -1,12 +1,20 @@
 from getpass import getpass
-from ncclient.transport.errors import AuthenticationError
-from paramiko import AuthenticationException
+import time
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 
 from dcim.models import Device, Module, Site
+from extras.rpc import QUERY_TIMEOUT, query_devices, session_pool
+
+
+def create_modules(device, modules, parent=None):
+    for module in modules:
+        m = Module(device=device, parent=parent, name=module['name'], part_id=module['part_id'],
+                   serial=module['serial'], discovered=True)
+        m.save()
+        create_modules(device, module.get('modules', []), parent=m)
 
 
 class Command(BaseCommand):
@@ -22,16 +30,13 @@ class Command(BaseCommand):
         parser.add_argument('-n', '--name', dest='name', help="Filter devices by name (regular expression)")
         parser.add_argument('--full', action='store_true', default=False, help="For inventory update for all devices")
         parser.add_argument('--fake', action='store_true', default=False, help="Do not actually update database")
+        parser.add_argument('-w', '--workers', dest='workers', type=int, default=1,
+                            help="Number of devices to inventory concurrently (default: 1)")
+        parser.add_argument('-t', '--timeout', dest='timeout', type=int, default=QUERY_TIMEOUT,
+                            help="Seconds allowed to inventory each device (default: {})".format(QUERY_TIMEOUT))
 
     def handle(self, *args, **options):
 
-        def create_modules(modules, parent=None):
-            for module in modules:
-                m = Module(device=device, parent=parent, name=module['name'], part_id=module['part_id'],
-                           serial=module['serial'], discovered=True)
-                m.save()
-                create_modules(module.get('modules', []), parent=m)
-
         # Credentials
         if options['username']:
             self.username = options['username']
@@ -39,7 +44,7 @@ class Command(BaseCommand):
             self.password = getpass("Password: ")
 
         # Attempt to inventory only active devices
-        device_list = Device.objects.filter(status=True)
+        device_list = Device.objects.filter(status=True).select_related('platform', 'primary_ip4', 'primary_ip6')
 
         # --site: Include only devices belonging to specified site(s)
         if options['site']:
@@ -63,63 +68,88 @@ class Command(BaseCommand):
         if options['fake']:
             self.stdout.write("WARNING: Inventory data will not be saved! (--fake)")
 
-        device_count = device_list.count()
-        self.stdout.write("** Found {} devices...".format(device_count))
+        if options['workers'] < 1:
+            raise CommandError("The number of workers must be at least 1.")
 
-        for i, device in enumerate(device_list, start=1):
+        self.device_count = device_list.count()
+        self.stdout.write("** Found {} devices...".format(self.device_count))
+        self.reported_count = 0
+        self.timings = []
+        start = time.time()
+        skipped_count = 0
+        failed_count = 0
 
-            self.stdout.write("[{}/{}] {}: ".format(i, device_count, device.name), ending='')
-
-            # Skip inactive devices
-            if not device.status:
-                self.stdout.write("Skipped (inactive)")
-                continue
+        pending = []
+        for device in device_list:
 
             # Skip devices without primary_ip set
             if not device.primary_ip:
-                self.stdout.write("Skipped (no primary IP set)")
+                self.report(device, "Skipped (no primary IP set)")
+                skipped_count += 1
                 continue
 
             # Skip devices which have already been inventoried if not doing a full update
             if device.serial and not options['full']:
-                self.stdout.write("Skipped (Serial: {})".format(device.serial))
+                self.report(device, "Skipped (Serial: {})".format(device.serial))
+                skipped_count += 1
                 continue
 
             RPC = device.get_rpc_client()
             if not RPC:
-                self.stdout.write("Skipped (no RPC client available for platform {})".format(device.platform))
+                self.report(device, "Skipped (no RPC client available for platform {})".format(device.platform))
+                skipped_count += 1
                 continue
 
-            # Connect to device and retrieve inventory info
-            try:
-                with RPC(device, self.username, self.password) as rpc_client:
-                    inventory = rpc_client.get_inventory()
-            except KeyboardInterrupt:
-                raise
-            except (AuthenticationError, AuthenticationException):
-                self.stdout.write("Authentication error!")
-                continue
-            except Exception as e:
-                self.stdout.write("Error: {}".format(e))
-                continue
-
-            if options['verbosity'] > 1:
-                self.stdout.write("")
-                self.stdout.write("\tSerial: {}".format(inventory['chassis']['serial']))
-                self.stdout.write("\tDescription: {}".format(inventory['chassis']['description']))
-                for module in inventory['modules']:
-                    self.stdout.write("\tModule: {} / {} ({})".format(module['name'], module['part_id'],
-                                                                      module['serial']))
-            else:
-                self.stdout.write("{} ({})".format(inventory['chassis']['description'], inventory['chassis']['serial']))
-
-            if not options['fake']:
-                with transaction.atomic():
-                    # Update device serial
-                    if device.serial != inventory['chassis']['serial']:
-                        device.serial = inventory['chassis']['serial']
-                        device.save()
-                    Module.objects.filter(device=device, discovered=True).delete()
-                    create_modules(inventory.get('modules', []))
-
-        self.stdout.write("Finished!")
+            pending.append((device, RPC))
+
+        # Connect to up to `workers` devices at once. Results are saved from this thread as they come in.
+        try:
+            results = query_devices(pending, lambda rpc_client: rpc_client.get_inventory(), self.username,
+                                    self.password, options['workers'], options['timeout'])
+            for device, inventory, error, elapsed in results:
+
+                if error:
+                    self.report(device, error, elapsed)
+                    failed_count += 1
+                    continue
+
+                chassis = inventory['chassis']
+                self.report(device, "{} ({})".format(chassis['description'], chassis['serial']), elapsed)
+                if options['verbosity'] > 1:
+                    self.stdout.write("\tSerial: {}".format(inventory['chassis']['serial']))
+                    self.stdout.write("\tDescription: {}".format(inventory['chassis']['description']))
+                    for module in inventory['modules']:
+                        self.stdout.write("\tModule: {} / {} ({})".format(module['name'], module['part_id'],
+                                                                          module['serial']))
+
+                if not options['fake']:
+                    with transaction.atomic():
+                        # Update device serial
+                        if device.serial != inventory['chassis']['serial']:
+                            device.serial = inventory['chassis']['serial']
+                            device.save()
+                        Module.objects.filter(device=device, discovered=True).delete()
+                        create_modules(device, inventory.get('modules', []))
+        finally:
+            session_pool.close()
+        self.stdout.write("Finished in {:.1f}s: {} inventoried, {} failed, {} skipped".format(
+            time.time() - start, len(self.timings) - failed_count, failed_count, skipped_count
+        ))
+
+        # Per-device timings (only the slowest devices unless verbose)
+        timings = sorted(self.timings, key=lambda t: t[1], reverse=True)
+        if options['verbosity'] < 2:
+            timings = timings[:10]
+        if timings:
+            self.stdout.write("Time per device (slowest first):")
+            for name, elapsed in timings:
+                self.stdout.write("\t{:6.1f}s  {}".format(elapsed, name))
+
+    def report(self, device, message, elapsed=None):
+        self.reported_count += 1
+        if elapsed is None:
+            self.stdout.write("[{}/{}] {}: {}".format(self.reported_count, self.device_count, device.name, message))
+        else:
+            self.timings.append((device.name, elapsed))
+            self.stdout.write("[{}/{}] {}: {} [{:.1f}s]".format(self.reported_count, self.device_count, device.name,
+                                                                message, elapsed))
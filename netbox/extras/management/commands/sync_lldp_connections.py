@@ -0,0 +1,82 @@
+from getpass import getpass
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from dcim.models import Device, Site
+from dcim.utils import apply_connection_changes, collect_lldp_neighbors, get_connection_changes
+from extras.rpc import QUERY_TIMEOUT, session_pool
+
+
+class Command(BaseCommand):
+    help = "Update interface connections from the LLDP neighbors of devices"
+    username = settings.NETBOX_USERNAME
+    password = settings.NETBOX_PASSWORD
+
+    def add_arguments(self, parser):
+        parser.add_argument('-u', '--username', dest='username', help="Specify the username to use")
+        parser.add_argument('-p', '--password', action='store_true', default=False, help="Prompt for password to use")
+        parser.add_argument('-s', '--site', dest='site', action='append',
+                            help="Filter devices by site (include argument once per site)")
+        parser.add_argument('-n', '--name', dest='name', help="Filter devices by name (regular expression)")
+        parser.add_argument('-w', '--workers', dest='workers', type=int, default=1,
+                            help="Number of devices to query concurrently (default: 1)")
+        parser.add_argument('-t', '--timeout', dest='timeout', type=int, default=QUERY_TIMEOUT,
+                            help="Seconds allowed to query each device (default: {})".format(QUERY_TIMEOUT))
+        parser.add_argument('--dry-run', action='store_true', default=False,
+                            help="Report the changes without applying them")
+
+    def handle(self, *args, **options):
+
+        # Credentials
+        if options['username']:
+            self.username = options['username']
+        if options['password']:
+            self.password = getpass("Password: ")
+
+        if options['workers'] < 1:
+            raise CommandError("The number of workers must be at least 1.")
+
+        # Query only active devices
+        device_list = Device.objects.filter(status=True).select_related('platform', 'primary_ip4', 'primary_ip6')
+
+        # --site: Include only devices belonging to specified site(s)
+        if options['site']:
+            sites = Site.objects.filter(slug__in=options['site'])
+            if not sites:
+                raise CommandError("One or more sites specified but none found.")
+            device_list = device_list.filter(rack__site__in=sites)
+
+        # --name: Filter devices by name matching a regex
+        if options['name']:
+            device_list = device_list.filter(name__iregex=options['name'])
+
+        self.stdout.write("** Querying LLDP neighbors of {} devices...".format(device_list.count()))
+        try:
+            neighbors, errors = collect_lldp_neighbors(device_list, self.username, self.password, options['workers'],
+                                                       timeout=options['timeout'])
+        finally:
+            session_pool.close()
+        for device, error in sorted(errors.items(), key=lambda e: e[0].name):
+            self.stdout.write("{}: {}".format(device, error))
+
+        to_delete, to_create, warnings = get_connection_changes(neighbors)
+        if options['verbosity'] > 1:
+            for warning in warnings:
+                self.stdout.write("WARNING: {}".format(warning))
+        for connection in to_delete:
+            self.stdout.write("- {} {} -- {} {}".format(connection.interface_a.device, connection.interface_a,
+                                                        connection.interface_b.device, connection.interface_b))
+        for connection in to_create:
+            self.stdout.write("+ {} {} -- {} {}".format(connection.interface_a.device, connection.interface_a,
+                                                        connection.interface_b.device, connection.interface_b))
+
+        self.stdout.write("{} devices queried, {} failed, {} warnings: {} connections to delete, {} to create".format(
+            len(neighbors), len(errors), len(warnings), len(to_delete), len(to_create)
+        ))
+        if options['dry_run']:
+            self.stdout.write("Dry run: no changes were applied.")
+            return
+
+        apply_connection_changes(to_delete, to_create)
+        self.stdout.write("Finished!")
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-18 06:46
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('extras', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exporttemplate',
+            name='per_object',
+            field=models.BooleanField(default=False, help_text=b'Render the template once for each object (available as "obj") and stream the output', verbose_name=b'Per object'),
+        ),
+        migrations.AddField(
+            model_name='exporttemplate',
+            name='template_footer',
+            field=models.TextField(blank=True, help_text=b'Rendered after the objects (per object templates only)'),
+        ),
+        migrations.AddField(
+            model_name='exporttemplate',
+            name='template_header',
+            field=models.TextField(blank=True, help_text=b'Rendered before the objects (per object templates only)'),
+        ),
+    ]
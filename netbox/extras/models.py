@@ -1,11 +1,15 @@
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
+from django.core.urlresolvers import reverse
 from django.db import models
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.template import Template, Context
+from django.utils import timezone
+from django.utils.module_loading import import_string
 from django.utils.safestring import mark_safe
 
 from dcim.models import Site
+from utilities.utils import iter_queryset
 
 
 GRAPH_TYPE_INTERFACE = 100
@@ -39,6 +43,17 @@ ACTION_CHOICES = (
     (ACTION_BULK_DELETE, 'bulk deleted')
 )
 
+IMPORTJOB_STATUS_PENDING = 1
+IMPORTJOB_STATUS_RUNNING = 2
+IMPORTJOB_STATUS_COMPLETED = 3
+IMPORTJOB_STATUS_FAILED = 4
+IMPORTJOB_STATUS_CHOICES = (
+    (IMPORTJOB_STATUS_PENDING, 'Pending'),
+    (IMPORTJOB_STATUS_RUNNING, 'Running'),
+    (IMPORTJOB_STATUS_COMPLETED, 'Completed'),
+    (IMPORTJOB_STATUS_FAILED, 'Failed'),
+)
+
 
 class Graph(models.Model):
     type = models.PositiveSmallIntegerField(choices=GRAPH_TYPE_CHOICES)
@@ -68,6 +83,11 @@ class ExportTemplate(models.Model):
     content_type = models.ForeignKey(ContentType, limit_choices_to={'model__in': EXPORTTEMPLATE_MODELS})
     name = models.CharField(max_length=200)
     template_code = models.TextField()
+    per_object = models.BooleanField(default=False, verbose_name='Per object',
+                                     help_text="Render the template once for each object (available as \"obj\") and "
+                                               "stream the output")
+    template_header = models.TextField(blank=True, help_text="Rendered before the objects (per object templates only)")
+    template_footer = models.TextField(blank=True, help_text="Rendered after the objects (per object templates only)")
     mime_type = models.CharField(max_length=15, blank=True)
     file_extension = models.CharField(max_length=15, blank=True)
 
@@ -80,16 +100,44 @@ class ExportTemplate(models.Model):
     def __unicode__(self):
         return u'{}: {}'.format(self.content_type, self.name)
 
+    def render_per_object(self, queryset, context_dict):
+        """
+        Generate the output of a per object template: the header, the template rendered for each object of the queryset
+        (fetched by chunks) and the footer. Templates are compiled before the first chunk is generated.
+        """
+        header, template, footer = [Template(code) for code in
+                                    (self.template_header, self.template_code, self.template_footer)]
+        context = Context(context_dict)
+        csv_related = getattr(queryset.model, 'csv_related', None)
+        if csv_related:
+            queryset = queryset.select_related(*csv_related)
+
+        def render():
+            yield header.render(context)
+            for obj in iter_queryset(queryset):
+                with context.push(obj=obj):
+                    yield template.render(context)
+            yield footer.render(context)
+
+        return render()
+
     def to_response(self, context_dict, filename):
         """
-        Render the template to an HTTP response, delivered as a named file attachment
+        Render the template to an HTTP response, delivered as a named file attachment. Per object templates are
+        streamed.
         """
-        template = Template(self.template_code)
         mime_type = 'text/plain' if not self.mime_type else self.mime_type
-        response = HttpResponse(
-            template.render(Context(context_dict)),
-            content_type=mime_type
-        )
+        if self.per_object:
+            response = StreamingHttpResponse(
+                self.render_per_object(context_dict['queryset'], context_dict),
+                content_type=mime_type
+            )
+        else:
+            template = Template(self.template_code)
+            response = HttpResponse(
+                template.render(Context(context_dict)),
+                content_type=mime_type
+            )
         if self.file_extension:
             filename += '.{}'.format(self.file_extension)
         response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
@@ -189,3 +237,86 @@ class UserAction(models.Model):
             return mark_safe('<i class="glyphicon glyphicon-remove text-danger"></i>')
         else:
             return ''
+
+
+class ImportJobManager(models.Manager):
+
+    def claim_next(self):
+        """
+        Mark the oldest pending job as running and return it, or return None if no job is pending. A job can only be
+        claimed by one worker.
+        """
+        for pk in self.filter(status=IMPORTJOB_STATUS_PENDING).order_by('created').values_list('pk', flat=True):
+            if self.filter(pk=pk, status=IMPORTJOB_STATUS_PENDING)\
+                    .update(status=IMPORTJOB_STATUS_RUNNING, started=timezone.now()):
+                return self.get(pk=pk)
+        return None
+
+
+class ImportJob(models.Model):
+    """
+    A bulk import of CSV data which is validated and saved by a background worker (see the run_import_jobs management
+    command) rather than within the request.
+    """
+    created = models.DateTimeField(auto_now_add=True, editable=False)
+    started = models.DateTimeField(blank=True, null=True)
+    completed = models.DateTimeField(blank=True, null=True)
+    user = models.ForeignKey(User, related_name='import_jobs', on_delete=models.CASCADE)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    import_view = models.CharField(max_length=200, help_text="Path of the BulkImportView which processes the data")
+    data = models.TextField()
+    status = models.PositiveSmallIntegerField(choices=IMPORTJOB_STATUS_CHOICES, default=IMPORTJOB_STATUS_PENDING)
+    total_count = models.PositiveIntegerField(default=0)
+    processed_count = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    errors = models.TextField(blank=True)
+
+    objects = ImportJobManager()
+
+    class Meta:
+        ordering = ['-created']
+
+    def __unicode__(self):
+        return u'Import of {} #{}'.format(self.content_type.model_class()._meta.verbose_name_plural, self.pk)
+
+    def get_absolute_url(self):
+        return reverse('users:import_job', args=[self.pk])
+
+    @property
+    def is_completed(self):
+        return self.status == IMPORTJOB_STATUS_COMPLETED
+
+    @property
+    def is_finished(self):
+        return self.status in (IMPORTJOB_STATUS_COMPLETED, IMPORTJOB_STATUS_FAILED)
+
+    @property
+    def progress(self):
+        if self.status == IMPORTJOB_STATUS_COMPLETED:
+            return 100
+        if not self.total_count:
+            return 0
+        return self.processed_count * 100 / self.total_count
+
+    def get_errors(self):
+        return self.errors.splitlines()
+
+    def update(self, **kwargs):
+        """
+        Set and save the given fields without saving the others (notably the CSV data).
+        """
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+        ImportJob.objects.filter(pk=self.pk).update(**kwargs)
+
+    def run(self):
+        """
+        Process the job with its BulkImportView.
+        """
+        view = import_string(self.import_view)()
+        try:
+            view.run_import_job(self)
+        except Exception as e:
+            self.update(status=IMPORTJOB_STATUS_FAILED, completed=timezone.now(),
+                        errors=u'Unexpected error: {}'.format(e))
+            raise
@@ -1,11 +1,24 @@
+from collections import defaultdict, deque
+from contextlib import contextmanager
 from ncclient import manager
+from ncclient.transport.errors import AuthenticationError
 import paramiko
+import Queue
 import re
+import socket
+import threading
 import xmltodict
 import time
 
 
 CONNECT_TIMEOUT = 5  # seconds
+READ_TIMEOUT = 60  # seconds allowed for the output of a command
+IDLE_TIMEOUT = 5  # seconds of silence after which output is considered complete when no prompt has been seen
+POOL_IDLE_TIMEOUT = 60  # seconds after which an unused pooled session is closed
+POOL_MAX_IDLE = 100  # maximum number of unused sessions kept open by a pool
+POOL_MAX_SESSIONS_PER_HOST = 2
+POOL_WAIT_TIMEOUT = 30  # seconds to wait for a session to a host when it has reached POOL_MAX_SESSIONS_PER_HOST
+QUERY_TIMEOUT = 300  # seconds allowed to query a device with query_devices()
 
 
 class RPCClient(object):
@@ -18,6 +31,31 @@ class RPCClient(object):
         except AttributeError:
             raise Exception("Specified device ({}) does not have a primary IP defined.".format(device))
 
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def connect(self):
+        """
+        Open a session with the device.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Close the session with the device.
+        """
+        raise NotImplementedError
+
+    def is_alive(self):
+        """
+        Return True if the session with the device is still open and usable.
+        """
+        return False
+
     def get_lldp_neighbors(self):
         """
         Returns a list of dictionaries, each representing an LLDP neighbor adjacency.
@@ -54,7 +92,10 @@ class RPCClient(object):
 
 
 class SSHClient(RPCClient):
-    def __enter__(self):
+    # Matches the end of a typical CLI prompt (e.g. "router1#", "switch>" or "root@og:~# ")
+    prompt = r'[>#$%]\s*$'
+
+    def connect(self):
 
         self.ssh = paramiko.SSHClient()
         self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
@@ -86,21 +127,58 @@ class SSHClient(RPCClient):
                 raise paramiko.AuthenticationException
 
         self.session = self.ssh.invoke_shell()
-        self.session.recv(1000)
-        return self
+        self._wait_for_prompt()
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
+    def close(self):
         self.ssh.close()
 
-    def _send(self, cmd, pause=1):
-        self.session.send('{}\n'.format(cmd))
-        data = ''
-        time.sleep(pause)
-        while self.session.recv_ready():
-            data += self.session.recv(4096).decode()
-            if not data:
+    def is_alive(self):
+        transport = self.ssh.get_transport()
+        return transport is not None and transport.is_active() and not self.session.closed
+
+    def _wait_for_prompt(self):
+        """
+        Read the login banner up to the first prompt. The exact prompt is then expected at the end of the output of
+        each command.
+        """
+        self.prompt_re = re.compile(self.prompt)
+        banner = self._read_until(self.prompt_re).splitlines()
+        if banner and self.prompt_re.search(banner[-1]):
+            self.prompt_re = re.compile(re.escape(banner[-1].strip()) + r'\s*$')
+
+    def _read_until(self, pattern, timeout=READ_TIMEOUT, idle_timeout=IDLE_TIMEOUT):
+        """
+        Read from the shell until the last line received matches `pattern` (usually the device prompt). Reading also
+        stops if output has been received but nothing more arrives for `idle_timeout` seconds. Raise socket.timeout
+        if neither happens within `timeout` seconds.
+        """
+        data = b''
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise socket.timeout("Timed out waiting for output from {}".format(self.host))
+            self.session.settimeout(min(remaining, idle_timeout) if data else remaining)
+            try:
+                chunk = self.session.recv(4096)
+            except socket.timeout:
+                if data and time.time() < deadline:
+                    break
+                continue
+            if not chunk:
+                # Channel closed
+                break
+            data += chunk
+            if pattern.search(data.rsplit(b'\n', 1)[-1]):
                 break
-        return data
+        return data.decode('utf-8', 'replace')
+
+    def _send(self, cmd, timeout=READ_TIMEOUT, idle_timeout=IDLE_TIMEOUT):
+        """
+        Send a command and return its output, as soon as the device prompt is displayed again.
+        """
+        self.session.send('{}\n'.format(cmd))
+        return self._read_until(self.prompt_re, timeout, idle_timeout)
 
 
 class JunosNC(RPCClient):
@@ -108,19 +186,20 @@ class JunosNC(RPCClient):
     NETCONF client for Juniper Junos devices
     """
 
-    def __enter__(self):
+    def connect(self):
 
         # Initiate a connection to the device
         self.manager = manager.connect(host=self.host, username=self.username, password=self.password,
                                        hostkey_verify=False, timeout=CONNECT_TIMEOUT)
 
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
+    def close(self):
 
         # Close the connection to the device
         self.manager.close_session()
 
+    def is_alive(self):
+        return self.manager.connected
+
     def get_lldp_neighbors(self):
 
         rpc_reply = self.manager.dispatch('get-lldp-neighbors-information')
@@ -261,6 +340,217 @@ class OpengearSSH(SSHClient):
         }
 
 
+class RPCSessionPool(object):
+    """
+    A thread-safe pool of open RPC client sessions, which are reused by later queries instead of connecting to the
+    device again. Sessions are keyed by host, client class and credentials, and checked before being reused. At most
+    `max_sessions_per_host` sessions (in use or not) are open to a host. Unused sessions are closed after
+    `idle_timeout` seconds (by a background timer, so that sessions do not stay open once queries stop), or when more
+    than `max_idle` are open.
+
+        with session_pool.session(RPC, device, username, password) as rpc_client:
+            inventory = rpc_client.get_inventory()
+    """
+
+    def __init__(self, max_sessions_per_host=POOL_MAX_SESSIONS_PER_HOST, idle_timeout=POOL_IDLE_TIMEOUT,
+                 max_idle=POOL_MAX_IDLE, wait_timeout=POOL_WAIT_TIMEOUT):
+        self.max_sessions_per_host = max_sessions_per_host
+        self.idle_timeout = idle_timeout
+        self.max_idle = max_idle
+        self.wait_timeout = wait_timeout
+        self.condition = threading.Condition()
+        self.idle = []  # (last used, client) tuples, least recently used first
+        self.host_sessions = defaultdict(int)  # Number of sessions per host, in use or idle
+        self.reaper = None  # Timer closing expired sessions, running while sessions are idle
+
+    @staticmethod
+    def get_key(client):
+        return client.host, type(client), client.username, client.password
+
+    @contextmanager
+    def session(self, RPC, device, username='', password=''):
+        client = self.acquire(RPC, device, username, password)
+        try:
+            yield client
+        except BaseException:
+            # The session may be left in an unknown state
+            self.discard(client)
+            raise
+        self.release(client)
+
+    def acquire(self, RPC, device, username='', password=''):
+        """
+        Return a connected client for the device, reusing an open session if possible.
+        """
+        client = RPC(device, username, password)
+        key = self.get_key(client)
+        deadline = time.time() + self.wait_timeout
+        stale = []
+
+        try:
+            with self.condition:
+                while True:
+                    stale += self.remove_expired()
+
+                    # Reuse the most recently used session with the same key, if it is still alive
+                    for entry in reversed(self.idle[:]):
+                        if self.get_key(entry[1]) == key:
+                            idle_client = self.remove_idle(entry)
+                            if idle_client.is_alive():
+                                self.host_sessions[client.host] += 1
+                                return idle_client
+                            stale.append(idle_client)
+
+                    # Make room for a new session by closing an unused one to the same host
+                    if self.host_sessions[client.host] >= self.max_sessions_per_host:
+                        for entry in self.idle:
+                            if entry[1].host == client.host:
+                                stale.append(self.remove_idle(entry))
+                                break
+
+                    if self.host_sessions[client.host] < self.max_sessions_per_host:
+                        self.host_sessions[client.host] += 1
+                        break
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise RuntimeError("Timed out waiting for a session to {}.".format(client.host))
+                    self.condition.wait(remaining)
+        finally:
+            self.close_sessions(stale)
+
+        try:
+            client.connect()
+        except BaseException:
+            with self.condition:
+                self.host_sessions[client.host] -= 1
+                self.condition.notify_all()
+            raise
+        return client
+
+    def release(self, client):
+        """
+        Return a client to the pool once done with it.
+        """
+        with self.condition:
+            self.idle.append((time.time(), client))
+            stale = self.remove_expired()
+            while len(self.idle) > self.max_idle:
+                stale.append(self.remove_idle(self.idle[0]))
+            self.start_reaper()
+            self.condition.notify_all()
+        self.close_sessions(stale)
+
+    def start_reaper(self):
+        # Must be called with the lock held
+        if self.reaper is None and self.idle:
+            self.reaper = threading.Timer(self.idle_timeout, self.reap)
+            self.reaper.daemon = True
+            self.reaper.start()
+
+    def reap(self):
+        """
+        Close the sessions which have expired, and check again later while sessions remain idle.
+        """
+        with self.condition:
+            self.reaper = None
+            stale = self.remove_expired()
+            self.start_reaper()
+        self.close_sessions(stale)
+
+    def discard(self, client):
+        """
+        Close a client acquired from the pool instead of returning it.
+        """
+        with self.condition:
+            self.host_sessions[client.host] -= 1
+            self.condition.notify_all()
+        self.close_sessions([client])
+
+    def close(self):
+        """
+        Close all unused sessions.
+        """
+        with self.condition:
+            stale = [self.remove_idle(entry) for entry in self.idle[:]]
+            if self.reaper is not None:
+                self.reaper.cancel()
+                self.reaper = None
+        self.close_sessions(stale)
+
+    def remove_idle(self, entry):
+        # Must be called with the lock held
+        self.idle.remove(entry)
+        self.host_sessions[entry[1].host] -= 1
+        return entry[1]
+
+    def remove_expired(self):
+        # Must be called with the lock held
+        expired = [entry for entry in self.idle if time.time() - entry[0] > self.idle_timeout]
+        return [self.remove_idle(entry) for entry in expired]
+
+    def close_sessions(self, clients):
+        # Sessions are closed without holding the lock, as this may wait for the devices
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+
+# Pool of sessions shared by the live queries of a process
+session_pool = RPCSessionPool()
+
+
+def query_device(device, RPC, query, username, password, results):
+    start = time.time()
+    try:
+        with session_pool.session(RPC, device, username, password) as rpc_client:
+            result = query(rpc_client)
+    except (AuthenticationError, paramiko.AuthenticationException):
+        results.put((device, None, "Authentication error!", time.time() - start))
+    except Exception as e:
+        results.put((device, None, "Error: {}".format(e), time.time() - start))
+    else:
+        results.put((device, result, None, time.time() - start))
+
+
+def query_devices(devices, query, username='', password='', workers=1, timeout=QUERY_TIMEOUT):
+    """
+    Call `query` with a client connected to each of a list of (device, RPC client class) tuples, from up to `workers`
+    threads at once. Yield (device, result, error, elapsed time) tuples as queries complete, where `error` is None on
+    success. A device taking longer than `timeout` seconds is yielded with an error and its thread is abandoned.
+
+    Worker threads only talk to the devices, so the platform and primary IP of the devices must have been fetched
+    beforehand. Results are yielded to the calling thread, which may save them to the database.
+    """
+    pending = deque(devices)
+    results = Queue.Queue()
+    running = {}
+    while pending or running:
+
+        while pending and len(running) < workers:
+            device, RPC = pending.popleft()
+            worker = threading.Thread(target=query_device, args=(device, RPC, query, username, password, results))
+            worker.daemon = True
+            worker.start()
+            running[device.pk] = (device, time.time())
+
+        deadline = min(started for device, started in running.values()) + timeout
+        try:
+            device, result, error, elapsed = results.get(timeout=max(deadline - time.time(), 0))
+        except Queue.Empty:
+            now = time.time()
+            for pk, (device, started) in running.items():
+                if now - started >= timeout:
+                    del running[pk]
+                    yield device, None, "Timed out", now - started
+            continue
+
+        # Ignore the late result of a device which has timed out
+        if running.pop(device.pk, None) is not None:
+            yield device, result, error, elapsed
+
+
 # For mapping platform -> NC client
 RPC_CLIENTS = {
     'juniper-junos': JunosNC,
@@ -0,0 +1,110 @@
+from netaddr import IPNetwork
+from StringIO import StringIO
+import threading
+import time
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from dcim.models import Device, DeviceRole, DeviceType, Module, Platform, Rack
+from extras.rpc import RPC_CLIENTS
+from ipam.models import IPAddress
+
+
+class FakeRPCClient(object):
+    """
+    Stand-in for an RPC client which answers after a delay set per device name, keeping track of the number of
+    devices being inventoried concurrently.
+    """
+    delays = {}
+    lock = threading.Lock()
+    active = 0
+    max_active = 0
+
+    def __init__(self, device, username='', password=''):
+        self.name = device.name
+        self.host = str(device.primary_ip.address.ip)
+        self.username = username
+        self.password = password
+
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+    def is_alive(self):
+        return True
+
+    def get_inventory(self):
+        with self.lock:
+            FakeRPCClient.active += 1
+            FakeRPCClient.max_active = max(FakeRPCClient.max_active, FakeRPCClient.active)
+        time.sleep(self.delays.get(self.name, 0.2))
+        with self.lock:
+            FakeRPCClient.active -= 1
+        if self.name.startswith('broken'):
+            raise RuntimeError("Connection refused")
+        return {
+            'chassis': {
+                'serial': 'SN-{}'.format(self.name),
+                'description': 'Fake chassis',
+            },
+            'modules': [
+                {
+                    'name': 'FPC 0',
+                    'part_id': 'FPC-1',
+                    'serial': 'FPC-{}'.format(self.name),
+                    'modules': [{'name': 'PIC 0', 'part_id': 'PIC-1', 'serial': 'PIC-{}'.format(self.name)}],
+                },
+            ],
+        }
+
+
+class RunInventoryTestCase(TestCase):
+
+    fixtures = ['dcim', 'ipam']
+
+    def setUp(self):
+
+        RPC_CLIENTS['fake'] = FakeRPCClient
+        FakeRPCClient.delays = {}
+        FakeRPCClient.max_active = 0
+        platform = Platform.objects.create(name='Fake', slug='fake', rpc_client='fake')
+
+        Device.objects.update(status=False)
+        for i, name in enumerate(['router1', 'router2', 'router3', 'router4', 'router5', 'broken1'], start=1):
+            ip = IPAddress.objects.create(address=IPNetwork('192.0.2.{}/24'.format(i)))
+            Device.objects.create(name=name, device_type=DeviceType.objects.get(pk=4), platform=platform,
+                                  device_role=DeviceRole.objects.get(pk=4), rack=Rack.objects.get(pk=1),
+                                  primary_ip4=ip)
+
+    def tearDown(self):
+        del RPC_CLIENTS['fake']
+
+    def run_inventory(self, **options):
+        stdout = StringIO()
+        call_command('run_inventory', stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_concurrent_inventory(self):
+
+        output = self.run_inventory(workers=3)
+
+        self.assertEqual(FakeRPCClient.max_active, 3)
+        self.assertEqual(Device.objects.get(name='router4').serial, 'SN-router4')
+        module = Module.objects.get(device__name='router2', name='FPC 0')
+        self.assertEqual(module.submodules.get().serial, 'PIC-router2')
+        self.assertIn('broken1: Error: Connection refused', output)
+        self.assertIn('5 inventoried, 1 failed, 0 skipped', output)
+        self.assertIn('Time per device', output)
+
+    def test_timeout(self):
+
+        FakeRPCClient.delays['router1'] = 1.5
+        output = self.run_inventory(workers=2, timeout=1)
+
+        self.assertIn('router1: Timed out', output)
+        self.assertEqual(Device.objects.get(name='router1').serial, '')
+        self.assertEqual(Device.objects.get(name='router5').serial, 'SN-router5')
+        self.assertIn('4 inventoried, 2 failed, 0 skipped', output)
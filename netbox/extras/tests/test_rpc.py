@@ -0,0 +1,188 @@
+from collections import deque
+from netaddr import IPNetwork
+import socket
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from dcim.models import Device
+from extras.rpc import RPCClient, RPCSessionPool, SSHClient
+from ipam.models import IPAddress
+
+
+class FakeChannel(object):
+    """
+    Stand-in for an interactive SSH shell, returning canned output for each command as chunks sent after a delay.
+    """
+
+    def __init__(self, responses, banner='Last login: Mon Oct 3 10:00:00\r\nrouter1#'):
+        self.responses = responses
+        self.pending = deque([(0, banner)])
+        self.timeout = None
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def send(self, data):
+        self.pending.extend(self.responses[data.strip()])
+
+    def recv(self, nbytes):
+        delay, chunk = self.pending[0] if self.pending else (float('inf'), None)
+        if delay > self.timeout:
+            time.sleep(self.timeout)
+            if self.pending:
+                self.pending[0] = (delay - self.timeout, chunk)
+            raise socket.timeout()
+        time.sleep(delay)
+        self.pending.popleft()
+        return chunk
+
+
+class SSHClientTestCase(SimpleTestCase):
+
+    def get_client(self, responses, **kwargs):
+        device = Device(name='router1', primary_ip4=IPAddress(address=IPNetwork('192.0.2.1/24')))
+        client = SSHClient(device)
+        client.session = FakeChannel(responses, **kwargs)
+        client._wait_for_prompt()
+        return client
+
+    def test_read_until_prompt(self):
+
+        client = self.get_client({
+            'show version': [
+                (0.1, 'show version\r\nCisco IOS Software\r\n'),
+                (1.2, 'Processor board ID FOC1234\r\nrouter1#'),
+            ],
+        })
+
+        start = time.time()
+        output = client._send('show version')
+        self.assertLess(time.time() - start, 2)
+        self.assertIn('Processor board ID FOC1234', output)
+        self.assertTrue(output.endswith('router1#'))
+
+    def test_prompt_like_output(self):
+
+        client = self.get_client({
+            'show run': [(0.1, 'show run\r\n! comment #\r\nrouter2#'), (0.2, '\r\nend\r\nrouter1#')],
+        })
+        self.assertTrue(client._send('show run').endswith('end\r\nrouter1#'))
+
+    def test_idle_timeout(self):
+
+        client = self.get_client({'show clock': [(0.1, '10:00:00.000 UTC Mon Oct 3 2016\r\n')]})
+
+        start = time.time()
+        output = client._send('show clock', idle_timeout=0.3)
+        self.assertLess(time.time() - start, 1)
+        self.assertIn('10:00:00.000', output)
+
+    def test_timeout(self):
+
+        client = self.get_client({'reload': []})
+        with self.assertRaises(socket.timeout):
+            client._send('reload', timeout=0.5)
+
+
+class FakeSessionClient(RPCClient):
+    """
+    Stand-in for an RPC client, recording the sessions it opens and closes.
+    """
+    connects = 0
+    closes = 0
+
+    def connect(self):
+        FakeSessionClient.connects += 1
+        self.alive = True
+
+    def close(self):
+        FakeSessionClient.closes += 1
+        self.alive = False
+
+    def is_alive(self):
+        return self.alive
+
+
+class RPCSessionPoolTestCase(SimpleTestCase):
+
+    def setUp(self):
+        FakeSessionClient.connects = 0
+        FakeSessionClient.closes = 0
+        self.pool = RPCSessionPool(max_sessions_per_host=1, wait_timeout=0.2)
+        self.device = Device(name='router1', primary_ip4=IPAddress(address=IPNetwork('192.0.2.1/24')))
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_sessions_are_reused(self):
+
+        with self.pool.session(FakeSessionClient, self.device, 'admin', 'secret') as client:
+            pass
+        with self.pool.session(FakeSessionClient, self.device, 'admin', 'secret') as reused_client:
+            self.assertIs(reused_client, client)
+        self.assertEqual(FakeSessionClient.connects, 1)
+
+        # Sessions with other credentials are not shared
+        with self.pool.session(FakeSessionClient, self.device, 'operator', 'secret') as other_client:
+            self.assertIsNot(other_client, client)
+        self.assertEqual(FakeSessionClient.connects, 2)
+        self.assertEqual(FakeSessionClient.closes, 1)
+
+    def test_dead_sessions_are_replaced(self):
+
+        with self.pool.session(FakeSessionClient, self.device) as client:
+            client.alive = False
+        with self.pool.session(FakeSessionClient, self.device) as new_client:
+            self.assertIsNot(new_client, client)
+        self.assertEqual(FakeSessionClient.connects, 2)
+
+    def test_idle_sessions_are_closed(self):
+
+        self.pool.idle_timeout = 0.1
+        with self.pool.session(FakeSessionClient, self.device) as client:
+            pass
+        time.sleep(0.2)
+        with self.pool.session(FakeSessionClient, self.device) as new_client:
+            self.assertIsNot(new_client, client)
+        self.assertFalse(client.alive)
+
+    def test_idle_sessions_are_reaped(self):
+
+        self.pool.idle_timeout = 0.1
+        with self.pool.session(FakeSessionClient, self.device) as client:
+            pass
+        self.assertIsNotNone(self.pool.reaper)
+
+        # Expired sessions are closed even if the pool is not used again
+        time.sleep(0.4)
+        self.assertFalse(client.alive)
+        self.assertEqual(self.pool.idle, [])
+        self.assertIsNone(self.pool.reaper)
+
+        # Closing the pool stops the reaper
+        with self.pool.session(FakeSessionClient, self.device):
+            pass
+        self.pool.close()
+        self.assertIsNone(self.pool.reaper)
+
+    def test_failed_sessions_are_discarded(self):
+
+        with self.assertRaises(ValueError):
+            with self.pool.session(FakeSessionClient, self.device) as client:
+                raise ValueError()
+        self.assertFalse(client.alive)
+        self.assertEqual(self.pool.idle, [])
+
+    def test_max_sessions_per_host(self):
+
+        client = self.pool.acquire(FakeSessionClient, self.device)
+        with self.assertRaises(RuntimeError):
+            self.pool.acquire(FakeSessionClient, self.device)
+
+        # A waiting request gets the session once it is released
+        timer = threading.Timer(0.1, self.pool.release, args=(client,))
+        timer.start()
+        self.assertIs(self.pool.acquire(FakeSessionClient, self.device), client)
+        timer.join()
@@ -24,6 +24,9 @@ urlpatterns = [
     # Prefixes
     url(r'^prefixes/$', PrefixListView.as_view(), name='prefix_list'),
     url(r'^prefixes/(?P<pk>\d+)/$', PrefixDetailView.as_view(), name='prefix_detail'),
+    url(r'^prefixes/(?P<pk>\d+)/available-prefixes/$', AvailablePrefixesView.as_view(),
+        name='prefix_available_prefixes'),
+    url(r'^prefixes/(?P<pk>\d+)/available-ips/$', AvailableIPAddressesView.as_view(), name='prefix_available_ips'),
 
     # IP addresses
     url(r'^ip-addresses/$', IPAddressListView.as_view(), name='ipaddress_list'),
@@ -1,6 +1,16 @@
-from rest_framework import generics
+from itertools import islice
 
-from ipam.models import VRF, Role, RIR, Aggregate, Prefix, IPAddress, VLAN, VLANGroup
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+
+from rest_framework import generics, status
+from rest_framework.exceptions import ParseError
+from rest_framework.permissions import DjangoModelPermissionsOrAnonReadOnly
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ipam.models import VRF, Role, RIR, Aggregate, Prefix, IPAddress, VLAN, VLANGroup, PREFIX_STATUS_CHOICES
+from ipam.utils import get_available_ipaddresses, get_available_prefixes
 from ipam import filters
 
 from . import serializers
@@ -109,6 +119,92 @@ class PrefixDetailView(generics.RetrieveAPIView):
     serializer_class = serializers.PrefixSerializer
 
 
+AVAILABLE_COUNT_MAX = 1000
+
+
+def get_int_parameter(data, name, default=None, min_value=None, max_value=None):
+    value = data.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ParseError("Invalid {}: {}".format(name, value))
+    if (min_value is not None and value < min_value) or (max_value is not None and value > max_value):
+        raise ParseError("Invalid {}: must be between {} and {}".format(name, min_value, max_value))
+    return value
+
+
+class AvailableView(APIView):
+    """
+    Base view for the allocation of available space within a prefix. GET returns the first `count` available objects;
+    POST creates them. The parent prefix is locked while allocating so that concurrent requests get distinct objects.
+    """
+    permission_classes = [DjangoModelPermissionsOrAnonReadOnly]
+
+    def get_available(self, prefix, data):
+        raise NotImplementedError
+
+    def create(self, prefix, value, data):
+        raise NotImplementedError
+
+    def get(self, request, pk):
+        prefix = get_object_or_404(Prefix, pk=pk)
+        count = get_int_parameter(request.GET, 'count', 1, 1, AVAILABLE_COUNT_MAX)
+        available = list(islice(self.get_available(prefix, request.GET), count))
+        return Response([{'family': prefix.family, self.field: unicode(value)} for value in available])
+
+    def post(self, request, pk):
+        count = get_int_parameter(request.data, 'count', 1, 1, AVAILABLE_COUNT_MAX)
+        with transaction.atomic():
+            prefix = get_object_or_404(Prefix.objects.select_for_update(), pk=pk)
+            available = list(islice(self.get_available(prefix, request.data), count))
+            if len(available) < count:
+                return Response(
+                    {'error': "Only {} of the requested {} are available.".format(len(available), count)},
+                    status=status.HTTP_409_CONFLICT
+                )
+            created = [self.create(prefix, value, request.data) for value in available]
+        serializer = self.serializer_class(created, many=True)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class AvailablePrefixesView(AvailableView):
+    """
+    List (GET) or allocate (POST) the first available child prefixes of a given length within a prefix. Parameters:
+    `prefix_length` and `count` (default 1). Allocated prefixes are Reserved unless another `status` is given.
+    """
+    queryset = Prefix.objects.all()
+    serializer_class = serializers.PrefixSerializer
+    field = 'prefix'
+
+    def get_available(self, prefix, data):
+        max_length = 31 if prefix.family == 4 else 127
+        prefix_length = get_int_parameter(data, 'prefix_length', None, prefix.prefix.prefixlen + 1, max_length)
+        return get_available_prefixes(prefix.prefix, prefix.get_child_prefixes(), prefix_length)
+
+    def create(self, prefix, value, data):
+        prefix_status = get_int_parameter(data, 'status', 2)
+        if prefix_status not in dict(PREFIX_STATUS_CHOICES):
+            raise ParseError("Invalid status: {}".format(prefix_status))
+        return Prefix.objects.create(prefix=value, vrf=prefix.vrf, site=prefix.site, tenant=prefix.tenant,
+                                     status=prefix_status, description=data.get('description', ''))
+
+
+class AvailableIPAddressesView(AvailableView):
+    """
+    List (GET) or allocate (POST) the first available IP addresses within a prefix. Parameters: `count` (default 1).
+    """
+    queryset = IPAddress.objects.all()
+    serializer_class = serializers.IPAddressSerializer
+    field = 'address'
+
+    def get_available(self, prefix, data):
+        return get_available_ipaddresses(prefix.prefix, prefix.get_child_ipaddresses())
+
+    def create(self, prefix, value, data):
+        return IPAddress.objects.create(address=value, vrf=prefix.vrf, tenant=prefix.tenant,
+                                        description=data.get('description', ''))
+
+
 #
 # IP addresses
 #
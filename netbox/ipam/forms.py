@@ -6,7 +6,10 @@ from django.db.models import Count
 from dcim.models import Site, Device, Interface
 from tenancy.forms import bulkedit_tenant_choices
 from tenancy.models import Tenant
-from utilities.forms import BootstrapMixin, APISelect, Livesearch, CSVDataField, BulkImportForm, SlugField, SmallTextarea
+from utilities.forms import (
+    BootstrapMixin, APISelect, Livesearch, CSVDataField, BulkImportForm, FlexibleModelChoiceField, get_cached_object,
+    SlugField, SmallTextarea,
+)
 
 from .models import (
     Aggregate, IPAddress, Prefix, PREFIX_STATUS_CHOICES, RIR, Role, VLAN, VLANGroup, VLAN_STATUS_CHOICES, VRF,
@@ -47,8 +50,8 @@ class VRFForm(forms.ModelForm, BootstrapMixin):
 
 
 class VRFFromCSVForm(forms.ModelForm):
-    tenant = forms.ModelChoiceField(Tenant.objects.all(), to_field_name='name', required=False,
-                                    error_messages={'invalid_choice': 'Tenant not found.'})
+    tenant = FlexibleModelChoiceField(Tenant.objects.all(), to_field_name='name', required=False,
+                                      error_messages={'invalid_choice': 'Tenant not found.'})
 
     class Meta:
         model = VRF
@@ -104,8 +107,8 @@ class AggregateForm(forms.ModelForm, BootstrapMixin):
 
 
 class AggregateFromCSVForm(forms.ModelForm):
-    rir = forms.ModelChoiceField(queryset=RIR.objects.all(), to_field_name='name',
-                                 error_messages={'invalid_choice': 'RIR not found.'})
+    rir = FlexibleModelChoiceField(queryset=RIR.objects.all(), to_field_name='name',
+                                   error_messages={'invalid_choice': 'RIR not found.'})
 
     class Meta:
         model = Aggregate
@@ -214,17 +217,17 @@ class PrefixForm(forms.ModelForm, BootstrapMixin):
 
 
 class PrefixFromCSVForm(forms.ModelForm):
-    vrf = forms.ModelChoiceField(queryset=VRF.objects.all(), required=False, to_field_name='rd',
-                                 error_messages={'invalid_choice': 'VRF not found.'})
-    tenant = forms.ModelChoiceField(Tenant.objects.all(), to_field_name='name', required=False,
-                                    error_messages={'invalid_choice': 'Tenant not found.'})
-    site = forms.ModelChoiceField(queryset=Site.objects.all(), required=False, to_field_name='name',
-                                  error_messages={'invalid_choice': 'Site not found.'})
+    vrf = FlexibleModelChoiceField(queryset=VRF.objects.all(), required=False, to_field_name='rd',
+                                   error_messages={'invalid_choice': 'VRF not found.'})
+    tenant = FlexibleModelChoiceField(Tenant.objects.all(), to_field_name='name', required=False,
+                                      error_messages={'invalid_choice': 'Tenant not found.'})
+    site = FlexibleModelChoiceField(queryset=Site.objects.all(), required=False, to_field_name='name',
+                                    error_messages={'invalid_choice': 'Site not found.'})
     vlan_group_name = forms.CharField(required=False)
     vlan_vid = forms.IntegerField(required=False)
     status_name = forms.ChoiceField(choices=[(s[1], s[0]) for s in PREFIX_STATUS_CHOICES])
-    role = forms.ModelChoiceField(queryset=Role.objects.all(), required=False, to_field_name='name',
-                                  error_messages={'invalid_choice': 'Invalid role.'})
+    role = FlexibleModelChoiceField(queryset=Role.objects.all(), required=False, to_field_name='name',
+                                    error_messages={'invalid_choice': 'Invalid role.'})
 
     class Meta:
         model = Prefix
@@ -243,7 +246,7 @@ class PrefixFromCSVForm(forms.ModelForm):
         vlan_group = None
         if vlan_group_name:
             try:
-                vlan_group = VLANGroup.objects.get(site=site, name=vlan_group_name)
+                vlan_group = get_cached_object(self, VLANGroup.objects.all(), site=site, name=vlan_group_name)
             except VLANGroup.DoesNotExist:
                 self.add_error('vlan_group_name', "Invalid VLAN group ({} - {}).".format(site, vlan_group_name))
         if vlan_vid and vlan_group:
@@ -402,12 +405,12 @@ class IPAddressForm(forms.ModelForm, BootstrapMixin):
 
 
 class IPAddressFromCSVForm(forms.ModelForm):
-    vrf = forms.ModelChoiceField(queryset=VRF.objects.all(), required=False, to_field_name='rd',
-                                 error_messages={'invalid_choice': 'VRF not found.'})
-    tenant = forms.ModelChoiceField(Tenant.objects.all(), to_field_name='name', required=False,
-                                    error_messages={'invalid_choice': 'Tenant not found.'})
-    device = forms.ModelChoiceField(queryset=Device.objects.all(), required=False, to_field_name='name',
-                                    error_messages={'invalid_choice': 'Device not found.'})
+    vrf = FlexibleModelChoiceField(queryset=VRF.objects.all(), required=False, to_field_name='rd',
+                                   error_messages={'invalid_choice': 'VRF not found.'})
+    tenant = FlexibleModelChoiceField(Tenant.objects.all(), to_field_name='name', required=False,
+                                      error_messages={'invalid_choice': 'Tenant not found.'})
+    device = FlexibleModelChoiceField(queryset=Device.objects.all(), required=False, to_field_name='name',
+                                      error_messages={'invalid_choice': 'Device not found.'})
     interface_name = forms.CharField(required=False)
     is_primary = forms.BooleanField(required=False)
 
@@ -544,15 +547,15 @@ class VLANForm(forms.ModelForm, BootstrapMixin):
 
 
 class VLANFromCSVForm(forms.ModelForm):
-    site = forms.ModelChoiceField(queryset=Site.objects.all(), to_field_name='name',
-                                  error_messages={'invalid_choice': 'Device not found.'})
-    group = forms.ModelChoiceField(queryset=VLANGroup.objects.all(), required=False, to_field_name='name',
-                                   error_messages={'invalid_choice': 'VLAN group not found.'})
-    tenant = forms.ModelChoiceField(Tenant.objects.all(), to_field_name='name', required=False,
-                                    error_messages={'invalid_choice': 'Tenant not found.'})
+    site = FlexibleModelChoiceField(queryset=Site.objects.all(), to_field_name='name',
+                                    error_messages={'invalid_choice': 'Device not found.'})
+    group = FlexibleModelChoiceField(queryset=VLANGroup.objects.all(), required=False, to_field_name='name',
+                                     error_messages={'invalid_choice': 'VLAN group not found.'})
+    tenant = FlexibleModelChoiceField(Tenant.objects.all(), to_field_name='name', required=False,
+                                      error_messages={'invalid_choice': 'Tenant not found.'})
     status_name = forms.ChoiceField(choices=[(s[1], s[0]) for s in VLAN_STATUS_CHOICES])
-    role = forms.ModelChoiceField(queryset=Role.objects.all(), required=False, to_field_name='name',
-                                  error_messages={'invalid_choice': 'Invalid role.'})
+    role = FlexibleModelChoiceField(queryset=Role.objects.all(), required=False, to_field_name='name',
+                                    error_messages={'invalid_choice': 'Invalid role.'})
 
     class Meta:
         model = VLAN
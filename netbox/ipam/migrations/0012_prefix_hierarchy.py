@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-18 06:37
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from collections import Counter
+
+
+# Number of prefixes updated per query
+BATCH_SIZE = 1000
+
+
+def get_prefix_hierarchy(prefixes):
+    """
+    Copy of ipam.models.get_prefix_hierarchy() as of this migration: return the (parent ID, depth) tuple of each of the
+    given (ID, prefix, VRF ID) tuples, indexed by ID.
+    """
+    items = sorted(prefixes, key=lambda i: (i[1].version, i[1].first, i[1].prefixlen))
+    hierarchy = {}
+    stack = []
+    for pk, prefix, vrf_id in items:
+        while stack and (stack[-1][0].version != prefix.version or prefix not in stack[-1][0]):
+            stack.pop()
+        parent, depth = None, 0
+        for p_prefix, p_vrf_id, p_pk, p_depth in reversed(stack):
+            if p_prefix.prefixlen < prefix.prefixlen and p_vrf_id in (None, vrf_id):
+                parent, depth = p_pk, p_depth + 1
+                break
+        hierarchy[pk] = (parent, depth)
+        stack.append((prefix, vrf_id, pk, depth))
+    return hierarchy
+
+
+def populate_prefix_hierarchy(apps, schema_editor):
+    Prefix = apps.get_model('ipam', 'Prefix')
+    hierarchy = get_prefix_hierarchy(Prefix.objects.values_list('pk', 'prefix', 'vrf'))
+    child_count = Counter(parent for parent, depth in hierarchy.values() if parent is not None)
+
+    # New fields default to a top-level prefix without children
+    rows = [
+        (pk, parent, depth, child_count[pk]) for pk, (parent, depth) in hierarchy.items() if parent or child_count[pk]
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        for i in range(0, len(rows), BATCH_SIZE):
+            batch = rows[i:i + BATCH_SIZE]
+            cursor.execute(
+                'UPDATE ipam_prefix SET parent_id = v.parent_id::integer, depth = v.depth, child_count = v.child_count '
+                'FROM (VALUES {}) AS v(id, parent_id, depth, child_count) WHERE ipam_prefix.id = v.id'.format(
+                    ', '.join(['(%s, %s, %s, %s)'] * len(batch))
+                ),
+                [value for row in batch for value in row]
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ipam', '0011_prefix_extra_conf'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prefix',
+            name='child_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='prefix',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='prefix',
+            name='parent',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='children', to='ipam.Prefix'),
+        ),
+        migrations.RunPython(populate_prefix_hierarchy, migrations.RunPython.noop),
+    ]
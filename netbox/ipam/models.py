@@ -1,3 +1,4 @@
+from collections import Counter
 from netaddr import IPNetwork, cidr_merge
 
 from django.conf import settings
@@ -5,7 +6,10 @@ from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import Count, Q
 from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 
 from dcim.models import Interface
 from tenancy.models import Tenant
@@ -15,8 +19,6 @@ import dns.models
 from .fields import IPNetworkField, IPAddressField
 
 import time
-import ipaddress
-import netaddr
 
 
 AF_CHOICES = (
@@ -69,6 +71,8 @@ class VRF(CreatedUpdatedModel):
     def get_absolute_url(self):
         return reverse('ipam:vrf', args=[self.pk])
 
+    csv_related = ['tenant']
+
     def to_csv(self):
         return ','.join([
             self.name,
@@ -99,6 +103,33 @@ class RIR(models.Model):
         return "{}?rir={}".format(reverse('ipam:aggregate_list'), self.slug)
 
 
+# Number of addresses in the prefixes contained by an aggregate, counting overlapping prefixes once: only the prefixes
+# which are not contained in another one within the aggregate are summed.
+AGGREGATE_CHILDREN_SIZE_SQL = """
+    SELECT COALESCE(SUM(POWER(2::numeric, CASE FAMILY(p.prefix) WHEN 4 THEN 32 ELSE 128 END - MASKLEN(p.prefix))), 0)
+    FROM (SELECT DISTINCT prefix FROM ipam_prefix WHERE prefix <<= ipam_aggregate.prefix) p
+    WHERE NOT EXISTS (
+        SELECT 1 FROM ipam_prefix q WHERE q.prefix >> p.prefix AND q.prefix <<= ipam_aggregate.prefix
+    )
+"""
+
+AGGREGATE_SIZE_SQL = """
+    POWER(2::numeric, CASE ipam_aggregate.family WHEN 4 THEN 32 ELSE 128 END - MASKLEN(ipam_aggregate.prefix))
+"""
+
+
+class AggregateQuerySet(models.QuerySet):
+
+    def annotate_utilization(self):
+        """
+        Annotate each Aggregate with its utilization rate (as a percentage), computed by the database within the same
+        query.
+        """
+        return self.extra(select={
+            'utilization': 'FLOOR(({}) * 100 / ({}))'.format(AGGREGATE_CHILDREN_SIZE_SQL, AGGREGATE_SIZE_SQL),
+        })
+
+
 class Aggregate(CreatedUpdatedModel):
     """
     An aggregate exists at the root level of the IP address space hierarchy in NetBox. Aggregates are used to organize
@@ -110,6 +141,8 @@ class Aggregate(CreatedUpdatedModel):
     date_added = models.DateField(blank=True, null=True)
     description = models.CharField(max_length=100, blank=True)
 
+    objects = AggregateQuerySet.as_manager()
+
     class Meta:
         ordering = ['family', 'prefix']
 
@@ -148,6 +181,8 @@ class Aggregate(CreatedUpdatedModel):
             self.family = self.prefix.version
         super(Aggregate, self).save(*args, **kwargs)
 
+    csv_related = ['rir']
+
     def to_csv(self):
         return ','.join([
             str(self.prefix),
@@ -158,15 +193,13 @@ class Aggregate(CreatedUpdatedModel):
 
     def get_utilization(self):
         """
-        Determine the utilization rate of the aggregate prefix and return it as a percentage.
+        Determine the utilization rate of the aggregate prefix and return it as a percentage. Use annotate_utilization()
+        on the QuerySet to compute it for many aggregates at once.
         """
-        child_prefixes = Prefix.objects.filter(prefix__net_contained_or_equal=str(self.prefix))
-        # Remove overlapping prefixes from list of children
-        networks = cidr_merge([c.prefix for c in child_prefixes])
-        children_size = float(0)
-        for p in networks:
-            children_size += p.size
-        return int(children_size / self.prefix.size * 100)
+        if not hasattr(self, 'utilization'):
+            self.utilization = Aggregate.objects.annotate_utilization().filter(pk=self.pk)\
+                .values_list('utilization', flat=True).first()
+        return int(self.utilization or 0)
 
 
 class Role(models.Model):
@@ -193,16 +226,35 @@ class Role(models.Model):
         return self.vlans.count()
 
 
+# Whether a prefix has no ancestor (a containing prefix in the same VRF or in the global table) among the prefixes
+# selected by a subquery
+PREFIX_TOP_LEVEL_SQL = """
+    NOT EXISTS (
+        SELECT 1 FROM ipam_prefix ancestor
+        WHERE ancestor.id IN ({}) AND ancestor.depth < ipam_prefix.depth AND ancestor.prefix >> ipam_prefix.prefix
+        AND (ancestor.vrf_id IS NULL OR ancestor.vrf_id = ipam_prefix.vrf_id)
+    )
+"""
+
+
 class PrefixQuerySet(models.QuerySet):
 
+    def top_level(self):
+        """
+        Return the prefixes of the QuerySet which are not contained in another prefix of the QuerySet, at any depth.
+        """
+        sql, params = self.order_by().values('pk').query.sql_with_params()
+        return self.extra(where=[PREFIX_TOP_LEVEL_SQL.format(sql)], params=params)
+
     def annotate_depth(self, limit=None):
         """
         Iterate through a QuerySet of Prefixes and annotate the hierarchical level of each. While it would be preferable
         to do this using .extra() on the QuerySet to count the unique parents of each prefix, that approach introduces
         performance issues at scale.
 
-        Because we're adding a non-field attribute to the model, annotation must be made *after* any QuerySet
-        modifications.
+        Because we're overriding the stored depth of each Prefix with one relative to the QuerySet, annotation must be
+        made *after* any QuerySet modifications. Where the absolute depth is suitable, use the stored hierarchy instead
+        (see rebuild_prefix_hierarchy()).
         """
         queryset = self
         stack = []
@@ -219,8 +271,6 @@ class PrefixQuerySet(models.QuerySet):
                     except IndexError:
                         prev_p = None
                         break
-            if prev_p is not None:
-                prev_p.has_children = True
             stack.append(p)
             p.depth = len(stack) - 1
         if limit is None:
@@ -245,6 +295,12 @@ class Prefix(CreatedUpdatedModel):
     status = models.PositiveSmallIntegerField('Status', choices=PREFIX_STATUS_CHOICES, default=1)
     role = models.ForeignKey('Role', related_name='prefixes', on_delete=models.SET_NULL, blank=True, null=True)
 
+    # Hierarchy, maintained by rebuild_prefix_hierarchy()
+    parent = models.ForeignKey('self', related_name='children', on_delete=models.SET_NULL, blank=True, null=True,
+                               editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    child_count = models.PositiveIntegerField(default=0, editable=False)
+
     objects = PrefixQuerySet.as_manager()
 
     # Reverse DNS
@@ -290,11 +346,27 @@ class Prefix(CreatedUpdatedModel):
             self.prefix = self.prefix.cidr
             # Infer address family from IPNetwork object
             self.family = self.prefix.version
+
+        # The hierarchy fields are only written by rebuild_prefix_hierarchy()
+        if kwargs.get('update_fields') is not None:
+            return super(Prefix, self).save(*args, **kwargs)
+        previous = None
+        if self.pk:
+            previous = Prefix.objects.filter(pk=self.pk).values_list('prefix', 'vrf').first()
+        if previous and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields
+                                       if not f.primary_key and f.name not in PREFIX_HIERARCHY_FIELDS]
+
         super(Prefix, self).save(*args, **kwargs)
 
+        if previous != (self.prefix, self.vrf_id):
+            rebuild_prefix_hierarchy([self.prefix] + ([previous[0]] if previous else []))
+            self.parent_id, self.depth, self.child_count = Prefix.objects.filter(pk=self.pk)\
+                .values_list(*PREFIX_HIERARCHY_FIELDS).first()
+
     def set_bind_changed(self, value):
         self.bind_changed = value
-        super(Prefix, self).save()
+        super(Prefix, self).save(update_fields=['bind_changed', 'soa_serial', 'last_updated'])
 
     def update_serial(self):
         """
@@ -318,6 +390,8 @@ class Prefix(CreatedUpdatedModel):
                     self.soa_serial = current_date + str(serial_num)
         self.set_bind_changed(False)
 
+    csv_related = ['vrf', 'site', 'role']
+
     def to_csv(self):
         return ','.join([
             str(self.prefix),
@@ -351,116 +425,125 @@ class Prefix(CreatedUpdatedModel):
     def get_status_class(self):
         return STATUS_CHOICE_CLASSES[self.status]
 
-    def to_bind(self, ipaddresses):
-        if self.bind_changed:
-            self.update_serial()
-
-        zones = {}
-
-        def header(zone_id):
-            return '\n'.join([
-                '; ' + zone_id,
-                '; gen from prefix ' + str(self.prefix) + ' (' + (self.description if self.description else '') + ') by netbox ( ' + time.strftime('%A %B %d %Y %H:%M:%S', time.localtime()) + ' ) ',
-                '',
-                '$TTL ' + str(self.ttl),
-                self.soa_name.ljust(30) + '    IN    ' + 'SOA                   ' + self.soa_contact + ' (',
-                '    ' + self.soa_serial.ljust(30) + ' ; serial',
-                '    ' + str(self.soa_refresh).ljust(30) + ' ; refresh',
-                '    ' + str(self.soa_retry).ljust(30) + ' ; retry',
-                '    ' + str(self.soa_expire).ljust(30) + ' ; expire',
-                '    ' + str(self.soa_minimum).ljust(29) + ') ; minimum',
-                '',
-                '',
-                '',
-                '$ORIGIN        ' + zone_id,
-                '',
-                '',
-            ])
-
-        if self.prefix.version == 4:
-            pbytes = str(self.prefix).split('/')[0].split('.')
-            pslash = int(str(self.prefix).split('/')[1])
-
-            if pslash > 16:
-                pbytes[3] = '0'
-                zslash = 24
-                largerPrefix = Prefix.objects.filter(family=4, prefix__net_contains_or_equals=pbytes[0] + '.' + pbytes[1] + '.0.0/16')
-                if largerPrefix:
-                    pbytes[2] = '0'
-                    zslash = 16
-            else:
-                pbytes[2] = '0'
-                zslash = 16
-
-            if pslash > zslash:
-                pslash = zslash
-
-            p = IPNetwork(unicode('.'.join(pbytes) + '/' + str(pslash)))
-
-            ipaddresses = IPAddress.objects.filter(family=4)
-            for ip in ipaddresses:
-                if ip.ptr:
-                    ibytes = str(ip.address).split('/')[0].split('.')
-                    islash = str(ip.address).split('/')[1]
-                    i = netaddr.IPAddress(unicode('.'.join(ibytes)))
-
-                    if i in p:
-                        if zslash == 24:
-                            zone_id = ibytes[2] + '.' + ibytes[1] + '.' + ibytes[0] + '.in-addr.arpa.'
-                            if zone_id not in zones:
-                                zones[zone_id] = header(zone_id)
-                            zones[zone_id] += ibytes[3].ljust(3) + '        IN PTR        ' + ip.ptr.ljust(40) + '    ; ' + ip.description.ljust(20) + ' ; gen by netbox ( ' + time.strftime('%A %B %d %Y %H:%M:%S', time.localtime()) + ' ) \n'
-                        else:
-                            zone_id = ibytes[1] + '.' + ibytes[0] + '.in-addr.arpa.'
-                            if zone_id not in zones:
-                                zones[zone_id] = header(zone_id)
-                            zones[zone_id] += (ibytes[3] + '.' + ibytes[2]).ljust(7) + '        IN PTR        ' + ip.ptr.ljust(40) + '    ; ' + ip.description.ljust(20) + ' ; gen by netbox ( ' + time.strftime('%A %B %d %Y %H:%M:%S', time.localtime()) + ' ) \n'
+    def get_child_prefixes(self):
+        """
+        Return the prefixes contained in this prefix: within the same VRF or, for a prefix in the global table, within
+        any VRF.
+        """
+        queryset = Prefix.objects.filter(prefix__net_contained=str(self.prefix))
+        if self.vrf:
+            return queryset.filter(vrf=self.vrf)
+        return queryset
 
-        else:
-            pfull = str(ipaddress.IPv6Address(unicode(str(self.prefix).split('/')[0])).exploded)
-            pnibbles = pfull.split(':')
-            pdigits = pfull.replace(':', '')
-            pslash = int(str(self.prefix).split('/')[1])
-
-            zslash = pslash if pslash % 16 == 0 else pslash / 16 + 16
-            pnibbles = pnibbles[:zslash / 16] + ['0000'] * (8 - zslash / 16)
-
-            largerPrefix = Prefix.objects.filter(family=6, prefix__net_contains_or_equals=':'.join(pnibbles) + '/' + str(zslash))
-            if largerPrefix:
-                minSlash = 128
-                for pp in largerPrefix:
-                    ppslash = int(str(pp.prefix).split('/')[1])
-                    if ppslash < minSlash:
-                        minSlash = ppslash
-                zslash = minSlash
-                pnibbles = pnibbles[:zslash / 16] + ['0000'] * (8 - zslash / 16)
-
-            for ip in ipaddresses:
-                if ip.ptr:
-                    ifull = str(ipaddress.IPv6Address(unicode(str(ip.address).split('/')[0])).exploded)
-                    inibbles = ifull.split(':')
-                    idigits = ifull.replace(':', '')[::-1]
-                    islash = int(str(ip.address).split('/')[1])
-
-                    pdigitszone = pdigits[:zslash / 4][::-1]
-                    zone_id = '.'.join(pdigitszone) + '.ip6.arpa.'
-                    if zone_id not in zones:
-                        zones[zone_id] = header(zone_id)
-
-                    zones[zone_id] += ('.'.join(idigits[:32 - zslash / 4])).ljust(30) + '        IN PTR        ' + ip.ptr.ljust(40) + '    ; ' + ip.description.ljust(20) + ' ; gen by netbox ( ' + time.strftime('%A %B %d %Y %H:%M:%S', time.localtime()) + ' ) \n'
-
-        for z in zones:
-            z += '\n\n; end '
-
-        ret = []
-        for zid, zc in zones.items():
-            ret.append({
-                'num': len(ret),
-                'id': zid,
-                'content': zc,
-            })
-
-        return ret
+    def get_child_ipaddresses(self):
+        """
+        Return the IP addresses contained in this prefix within the same VRF.
+        """
+        return IPAddress.objects.filter(vrf=self.vrf, address__net_contained_or_equal=str(self.prefix))
+
+    def get_bind_header(self, zone_id):
+        """
+        Return the SOA header of a reverse zone generated from this prefix. The PTR records themselves are assembled by
+        dns.models.export_bind_reverse(), which decides which prefix each reverse zone is generated from.
+        """
+        return '\n'.join([
+            '; ' + zone_id,
+            '; gen from prefix ' + str(self.prefix) + ' (' + (self.description if self.description else '') + ') by netbox ( ' + time.strftime('%A %B %d %Y %H:%M:%S', time.localtime()) + ' ) ',
+            '',
+            '$TTL ' + str(self.ttl),
+            self.soa_name.ljust(30) + '    IN    ' + 'SOA                   ' + self.soa_contact + ' (',
+            '    ' + self.soa_serial.ljust(30) + ' ; serial',
+            '    ' + str(self.soa_refresh).ljust(30) + ' ; refresh',
+            '    ' + str(self.soa_retry).ljust(30) + ' ; retry',
+            '    ' + str(self.soa_expire).ljust(30) + ' ; expire',
+            '    ' + str(self.soa_minimum).ljust(29) + ') ; minimum',
+            '',
+            '',
+            '',
+            '$ORIGIN        ' + zone_id,
+            '',
+            '',
+        ])
+
+
+PREFIX_HIERARCHY_FIELDS = ('parent', 'depth', 'child_count')
+
+
+def get_prefix_hierarchy(prefixes, ancestors=()):
+    """
+    Determine the parent and depth of each prefix and return them as a dictionary of (parent ID, depth) tuples indexed by
+    prefix ID. The parent of a prefix is the most specific prefix containing it within the same VRF or, for prefixes
+    in a VRF, in the global table. Duplicate prefixes are siblings.
+
+    :param prefixes: (ID, prefix, VRF ID) tuples of the prefixes to compute
+    :param ancestors: (ID, prefix, VRF ID, depth) tuples of the prefixes containing them, whose depth is known
+    """
+    items = [(prefix, vrf_id, pk, depth, True) for pk, prefix, vrf_id, depth in ancestors]
+    items += [(prefix, vrf_id, pk, None, False) for pk, prefix, vrf_id in prefixes]
+    items.sort(key=lambda i: (i[0].version, i[0].first, i[0].prefixlen))
+
+    hierarchy = {}
+    stack = []
+    for prefix, vrf_id, pk, depth, known in items:
+        while stack and (stack[-1][0].version != prefix.version or prefix not in stack[-1][0]):
+            stack.pop()
+        if not known:
+            parent, depth = None, 0
+            for p_prefix, p_vrf_id, p_pk, p_depth in reversed(stack):
+                if p_prefix.prefixlen < prefix.prefixlen and p_vrf_id in (None, vrf_id):
+                    parent, depth = p_pk, p_depth + 1
+                    break
+            hierarchy[pk] = (parent, depth)
+        stack.append((prefix, vrf_id, pk, depth))
+
+    return hierarchy
+
+
+def rebuild_prefix_hierarchy(networks=None):
+    """
+    Recompute the parent, depth and child count of all prefixes contained in the given networks (or of all prefixes) and
+    update the ones which changed. This must be called whenever prefixes are created, deleted, resized or moved to
+    another VRF.
+    """
+    region = Prefix.objects.all()
+    ancestors = Prefix.objects.none()
+    if networks is not None:
+        networks = cidr_merge(networks)
+        if not networks:
+            return
+        region_filter = Q()
+        ancestors_filter = Q()
+        for network in networks:
+            region_filter |= Q(prefix__net_contained_or_equal=str(network))
+            ancestors_filter |= Q(prefix__net_contains=str(network))
+        region = region.filter(region_filter)
+        ancestors = Prefix.objects.filter(ancestors_filter)
+
+    current = {pk: (parent, depth, child_count) for pk, parent, depth, child_count
+               in region.values_list('pk', *PREFIX_HIERARCHY_FIELDS)}
+    hierarchy = get_prefix_hierarchy(
+        region.values_list('pk', 'prefix', 'vrf'),
+        ancestors.values_list('pk', 'prefix', 'vrf', 'depth')
+    )
+
+    # The children of a prefix are within the region, except for the ancestors which gained or lost children
+    child_count = Counter(parent for parent, depth in hierarchy.values() if parent is not None)
+    outer_parents = set(parent for parent, depth, count in current.values() if parent is not None)
+    outer_parents |= set(child_count.keys())
+    outer_parents -= set(hierarchy.keys())
+
+    for pk, (parent, depth) in hierarchy.items():
+        values = (parent, depth, child_count[pk])
+        if current[pk] != values:
+            Prefix.objects.filter(pk=pk).update(**dict(zip(PREFIX_HIERARCHY_FIELDS, values)))
+    for pk, count in Prefix.objects.filter(pk__in=outer_parents).annotate(count=Count('children'))\
+            .values_list('pk', 'count'):
+        Prefix.objects.filter(pk=pk).exclude(child_count=count).update(child_count=count)
+
+
+@receiver(post_delete, sender=Prefix)
+def on_prefix_delete(sender, **kwargs):
+    rebuild_prefix_hierarchy([kwargs['instance'].prefix])
 
 
 class IPAddressManager(models.Manager):
@@ -534,34 +617,28 @@ class IPAddress(CreatedUpdatedModel):
             self.family = self.address.version
         super(IPAddress, self).save(*args, **kwargs)
         self.update_dns()
-        dns_records = dns.models.Record.objects.filter(address=self)
-        for r in dns_records:
-            r.save()
+        # Flag the zones of the DNS records pointing to this address
+        zones = dns.models.Record.objects.filter(address=self).order_by().values_list('zone', flat=True).distinct()
+        for zone_id in zones:
+            dns.models.mark_zone_changed(zone_id)
 
     def update_dns(self):
         """Auto-create a corresponding A/AAAA DNS record (if possible) whenever the PTR field is modified"""
         if self.ptr:
-            which_zone = None
-            zones = dns.models.Zone.objects.all()
-            for zone in zones:
-                if self.ptr.endswith(zone.name) or self.ptr.endswith(zone.name + '.'):
-                    which_zone = zone
-                    break
-
-            if which_zone:
-                zone_name = which_zone.name
-                record_name = self.ptr[:-len(zone_name)] if not self.ptr.endswith('.') else self.ptr[:-len(zone_name) - 1]
-                if record_name.endswith('.'):
-                    record_name = record_name[:-1]
+            found = dns.models.zone_index.lookup(self.ptr)
+            if found:
+                zone, record_name = found
                 record_type = 'A' if self.family == 4 else 'AAAA'
 
                 dns.models.Record.objects.get_or_create(
                     name=record_name,
                     record_type=record_type,
-                    zone=which_zone,
+                    zone=zone,
                     address=self
                 )
 
+    csv_related = ['vrf', 'interface__device', 'primary_ip4_for', 'primary_ip6_for']
+
     def to_csv(self):
 
         # Determine if this IP is primary for a Device
@@ -654,6 +731,8 @@ class VLAN(CreatedUpdatedModel):
         if self.group and self.group.site != self.site:
             raise ValidationError("VLAN group must belong to the assigned site ({}).".format(self.site))
 
+    csv_related = ['site', 'group', 'tenant', 'role']
+
     def to_csv(self):
         return ','.join([
             self.site.name,
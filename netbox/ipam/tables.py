@@ -24,7 +24,7 @@ ROLE_ACTIONS = """
 """
 
 PREFIX_LINK = """
-{% if record.has_children %}
+{% if record.child_count %}
     <span style="padding-left: {{ record.depth }}0px "><i class="fa fa-caret-right"></i></a>
 {% else %}
     <span style="padding-left: {{ record.depth }}9px">
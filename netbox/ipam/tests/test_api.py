@@ -0,0 +1,42 @@
+from netaddr import IPNetwork
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+
+from ipam.models import IPAddress
+
+
+class KeysetPaginationTestCase(TestCase):
+
+    def setUp(self):
+
+        for i in range(1, 6):
+            IPAddress.objects.create(address=IPNetwork('192.0.2.{}/24'.format(i)))
+        self.url = reverse('ipam-api:ipaddress_list')
+
+    def test_unpaginated(self):
+
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data), 5)
+
+    def test_pages(self):
+
+        addresses = []
+        response = self.client.get(self.url, {'limit': 2})
+        self.assertEqual(response.data['count'], 5)
+        while True:
+            addresses += [ip['address'] for ip in response.data['results']]
+            if response.data['next'] is None:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(addresses, ['192.0.2.{}/24'.format(i) for i in range(1, 6)])
+
+    @override_settings(MAX_PAGE_SIZE=3)
+    def test_limits(self):
+
+        response = self.client.get(self.url, {'limit': 10, 'count': 'false'})
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertNotIn('count', response.data)
+
+        response = self.client.get(self.url, {'cursor': 'abc'})
+        self.assertEqual(response.status_code, 400)
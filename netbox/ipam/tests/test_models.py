@@ -0,0 +1,97 @@
+from netaddr import IPNetwork
+
+from django.test import TestCase
+from django.core.urlresolvers import reverse
+
+from ipam.models import Aggregate, Prefix, RIR, Role, VRF
+
+
+class AggregateTestCase(TestCase):
+
+    def setUp(self):
+
+        rir = RIR.objects.create(name='RIR 1', slug='rir-1')
+        self.aggregate4 = Aggregate.objects.create(prefix=IPNetwork('10.0.0.0/8'), rir=rir)
+        self.aggregate6 = Aggregate.objects.create(prefix=IPNetwork('2001:db8::/32'), rir=rir)
+
+        # Overlapping prefixes must only be counted once
+        for prefix in ['10.0.0.0/9', '10.0.0.0/16', '10.128.0.0/10', '10.128.0.0/10', '2001:db8::/34']:
+            Prefix.objects.create(prefix=IPNetwork(prefix))
+
+    def test_get_utilization(self):
+
+        self.assertEqual(Aggregate.objects.get(pk=self.aggregate4.pk).get_utilization(), 75)
+        self.assertEqual(Aggregate.objects.get(pk=self.aggregate6.pk).get_utilization(), 25)
+
+    def test_annotate_utilization(self):
+
+        utilization = {a.pk: a.get_utilization() for a in Aggregate.objects.annotate_utilization()}
+        self.assertEqual(utilization, {self.aggregate4.pk: 75, self.aggregate6.pk: 25})
+
+    def test_list_totals(self):
+
+        response = self.client.get(reverse('ipam:aggregate_list'))
+        self.assertEqual(response.context['ipv4_total'], 2 ** 24)
+        self.assertEqual(response.context['ipv6_total'], 2 ** 32)
+
+
+class PrefixHierarchyTestCase(TestCase):
+
+    def setUp(self):
+
+        self.vrf = VRF.objects.create(name='VRF 1', rd='65000:1')
+        self.prefixes = {}
+        for prefix, vrf in [('10.0.0.0/8', None), ('10.1.0.0/16', None), ('10.1.2.0/24', None),
+                            ('10.1.2.0/24', self.vrf), ('10.2.0.0/16', self.vrf), ('10.2.3.0/24', None)]:
+            p = Prefix.objects.create(prefix=IPNetwork(prefix), vrf=vrf)
+            self.prefixes[(prefix, vrf)] = p.pk
+
+    def get_hierarchy(self):
+        return {
+            (str(p.prefix), p.vrf): (p.parent_id, p.depth, p.child_count) for p in Prefix.objects.all()
+        }
+
+    def assertHierarchy(self, expected):
+        expected = {k: (self.prefixes.get(v[0]), v[1], v[2]) for k, v in expected.items()}
+        self.assertEqual(self.get_hierarchy(), expected)
+
+    def test_hierarchy(self):
+
+        self.assertHierarchy({
+            ('10.0.0.0/8', None): (None, 0, 3),
+            ('10.1.0.0/16', None): (('10.0.0.0/8', None), 1, 2),
+            ('10.1.2.0/24', None): (('10.1.0.0/16', None), 2, 0),
+            ('10.1.2.0/24', self.vrf): (('10.1.0.0/16', None), 2, 0),
+            ('10.2.0.0/16', self.vrf): (('10.0.0.0/8', None), 1, 0),
+            # Prefixes in the global table do not belong to a VRF prefix
+            ('10.2.3.0/24', None): (('10.0.0.0/8', None), 1, 0),
+        })
+
+    def test_hierarchy_follows_changes(self):
+
+        prefix = Prefix.objects.get(pk=self.prefixes[('10.1.0.0/16', None)])
+        prefix.prefix = IPNetwork('10.2.0.0/15')
+        prefix.save()
+        self.assertEqual((prefix.depth, prefix.child_count), (1, 2))
+        self.prefixes[('10.2.0.0/15', None)] = self.prefixes.pop(('10.1.0.0/16', None))
+
+        Prefix.objects.get(pk=self.prefixes[('10.0.0.0/8', None)]).delete()
+
+        self.assertHierarchy({
+            ('10.2.0.0/15', None): (None, 0, 2),
+            ('10.1.2.0/24', None): (None, 0, 0),
+            ('10.1.2.0/24', self.vrf): (None, 0, 0),
+            ('10.2.0.0/16', self.vrf): (('10.2.0.0/15', None), 1, 0),
+            ('10.2.3.0/24', None): (('10.2.0.0/15', None), 1, 0),
+        })
+
+    def test_top_level_prefix_list(self):
+
+        response = self.client.get(reverse('ipam:prefix_list'))
+        self.assertEqual([str(p.prefix) for p in response.context['table'].data], ['10.0.0.0/8'])
+
+        # A prefix is nested under any listed ancestor, even if its parent is filtered out
+        role = Role.objects.create(name='Role 1', slug='role-1')
+        Prefix.objects.filter(prefix__in=['10.0.0.0/8', '10.1.2.0/24']).update(role=role)
+        response = self.client.get(reverse('ipam:prefix_list'), {'role': 'role-1'})
+        self.assertEqual([str(p.prefix) for p in response.context['table'].data], ['10.0.0.0/8'])
@@ -0,0 +1,139 @@
+from netaddr import IPNetwork
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from ipam.models import IPAddress, Prefix
+from ipam.utils import add_available_ipaddresses, add_available_prefixes, iter_available_ranges
+
+
+class AvailableSpaceTestCase(TestCase):
+
+    def test_iter_available_ranges(self):
+
+        children = [(2, 3, 'a'), (2, 3, 'b'), (2, 2, 'c'), (7, 7, 'd')]
+        self.assertEqual(list(iter_available_ranges(0, 9, children)), [
+            (0, 1, None), (2, 3, 'a'), (2, 3, 'b'), (2, 2, 'c'), (4, 6, None), (7, 7, 'd'), (8, 9, None),
+        ])
+        self.assertEqual(list(iter_available_ranges(0, 9, [])), [(0, 9, None)])
+
+    def test_add_available_prefixes(self):
+
+        for prefix in ['10.0.0.0/24', '10.0.0.0/25', '10.0.1.0/24', '10.0.1.0/24', '10.0.4.0/24']:
+            Prefix.objects.create(prefix=IPNetwork(prefix))
+
+        child_prefixes = add_available_prefixes(IPNetwork('10.0.0.0/21'), Prefix.objects.all())
+        self.assertEqual(len(child_prefixes), 7)
+        self.assertEqual([(str(p.prefix), p.pk is not None) for p in child_prefixes[:]], [
+            ('10.0.0.0/24', True),
+            ('10.0.1.0/24', True),
+            ('10.0.1.0/24', True),
+            ('10.0.2.0/23', False),
+            ('10.0.4.0/24', True),
+            ('10.0.5.0/24', False),
+            ('10.0.6.0/23', False),
+        ])
+
+        # Only the requested slice is fetched from the database
+        with self.assertNumQueries(1):
+            page = child_prefixes[1:3]
+        self.assertEqual([p.depth for p in page], [0, 0])
+
+        # Iterating over the whole list fetches the objects by chunks (the last one only holds available space)
+        child_prefixes.chunk_size = 3
+        with self.assertNumQueries(2):
+            self.assertEqual(len(list(child_prefixes)), 7)
+
+    def test_add_available_ipaddresses(self):
+
+        for address in ['192.0.2.10/24', '192.0.2.1/32', '192.0.2.11/24']:
+            IPAddress.objects.create(address=IPNetwork(address))
+
+        ipaddresses = add_available_ipaddresses(IPNetwork('192.0.2.0/24'), IPAddress.objects.all())
+        self.assertEqual([ip if isinstance(ip, tuple) else str(ip.address) for ip in ipaddresses[:]], [
+            '192.0.2.1/32',
+            (8, '192.0.2.2/24'),
+            '192.0.2.10/24',
+            '192.0.2.11/24',
+            (243, '192.0.2.12/24'),
+        ])
+
+    def test_prefix_ipaddresses_view(self):
+
+        prefix = Prefix.objects.create(prefix=IPNetwork('192.0.2.0/24'))
+        IPAddress.objects.create(address=IPNetwork('192.0.2.10/24'))
+
+        response = self.client.get(reverse('ipam:prefix_ipaddresses', kwargs={'pk': prefix.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['ip_table'].page.object_list), 3)
+
+    def test_child_lists_are_rendered_for_privileged_users(self):
+
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+        prefix = Prefix.objects.create(prefix=IPNetwork('10.0.0.0/16'))
+        for i in range(60):
+            Prefix.objects.create(prefix=IPNetwork('10.0.{}.0/24'.format(i)))
+            IPAddress.objects.create(address=IPNetwork('10.0.0.{}/16'.format(i + 1)))
+
+        # The hidden list of all primary keys (pk_all) does not fetch the child objects one by one
+        for url_name, query_count, pk_list in [
+            ('ipam:prefix', 10, Prefix.objects.filter(depth=1).values_list('pk', flat=True)),
+            ('ipam:prefix_ipaddresses', 5, IPAddress.objects.values_list('pk', flat=True)),
+        ]:
+            with self.assertNumQueries(query_count):
+                response = self.client.get(reverse(url_name, kwargs={'pk': prefix.pk}))
+            self.assertContains(response, 'name="pk_all" value="{}"'.format(','.join(str(pk) for pk in pk_list)))
+
+
+class AvailableAPITestCase(TestCase):
+
+    def setUp(self):
+
+        self.prefix = Prefix.objects.create(prefix=IPNetwork('192.0.2.0/24'))
+        Prefix.objects.create(prefix=IPNetwork('192.0.2.0/26'))
+        IPAddress.objects.create(address=IPNetwork('192.0.2.1/24'))
+
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+
+    def test_list_available_prefixes(self):
+
+        url = reverse('ipam-api:prefix_available_prefixes', kwargs={'pk': self.prefix.pk})
+        response = self.client.get(url, {'prefix_length': 27, 'count': 3})
+        self.assertEqual([p['prefix'] for p in response.data], ['192.0.2.64/27', '192.0.2.96/27', '192.0.2.128/27'])
+
+        response = self.client.get(url, {'prefix_length': 24})
+        self.assertEqual(response.status_code, 400)
+
+    def test_allocate_prefixes(self):
+
+        url = reverse('ipam-api:prefix_available_prefixes', kwargs={'pk': self.prefix.pk})
+        response = self.client.post(url, {'prefix_length': 26, 'count': 2})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([p['prefix'] for p in response.data], ['192.0.2.64/26', '192.0.2.128/26'])
+        self.assertEqual(Prefix.objects.get(prefix='192.0.2.64/26').status, 2)
+
+        # Allocated prefixes are no longer available
+        response = self.client.post(url, {'prefix_length': 26, 'count': 2})
+        self.assertEqual(response.status_code, 409)
+        response = self.client.post(url, {'prefix_length': 26})
+        self.assertEqual(response.data[0]['prefix'], '192.0.2.192/26')
+
+    def test_allocate_ipaddresses(self):
+
+        url = reverse('ipam-api:prefix_available_ips', kwargs={'pk': self.prefix.pk})
+        response = self.client.get(url, {'count': 2})
+        self.assertEqual([ip['address'] for ip in response.data], ['192.0.2.2/24', '192.0.2.3/24'])
+
+        response = self.client.post(url, {'count': 2, 'description': 'Provisioning'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([ip['address'] for ip in response.data], ['192.0.2.2/24', '192.0.2.3/24'])
+        self.assertEqual(IPAddress.objects.filter(description='Provisioning').count(), 2)
+
+    def test_allocation_requires_permission(self):
+
+        self.client.logout()
+        url = reverse('ipam-api:prefix_available_ips', kwargs={'pk': self.prefix.pk})
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.post(url).status_code, 403)
@@ -0,0 +1,133 @@
+from netaddr import IPNetwork
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from dns.models import Record, Zone
+from extras.models import ExportTemplate, ImportJob
+from ipam.models import IPAddress, VRF
+from utilities.utils import iter_queryset
+
+
+class CSVExportTestCase(TestCase):
+
+    def setUp(self):
+
+        vrf = VRF.objects.create(name='VRF 1', rd='65000:1')
+        for i in range(1, 11):
+            IPAddress.objects.create(address=IPNetwork('192.0.2.{}/24'.format(i)), vrf=vrf)
+        # Export templates are looked up by content type, which may have been cached by other tests
+        ContentType.objects.clear_cache()
+
+    def test_export_is_streamed(self):
+
+        # The number of queries does not depend on the number of objects
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('ipam:ipaddress_list'), {'export': ''})
+            content = ''.join(response.streaming_content)
+
+        lines = content.split('\n')
+        self.assertEqual(len(lines), 10)
+        self.assertEqual(lines[0], '192.0.2.1/24,65000:1,,,,,')
+
+    def test_objects_deleted_during_export_are_skipped(self):
+
+        queryset = IPAddress.objects.order_by('pk')
+        deleted_pk = queryset[5].pk
+        exported = []
+        for ip in iter_queryset(queryset, chunk_size=4):
+            if not exported:
+                IPAddress.objects.filter(pk=deleted_pk).delete()
+            exported.append(ip.pk)
+
+        self.assertEqual(len(exported), 9)
+        self.assertNotIn(deleted_pk, exported)
+
+    def test_per_object_export_template(self):
+
+        ExportTemplate.objects.create(
+            content_type=ContentType.objects.get_for_model(IPAddress),
+            name='Hosts',
+            per_object=True,
+            template_header='# {{ queryset.count }} addresses\n',
+            template_code='{{ obj.address.ip }} {{ obj.vrf.rd }}\n',
+            template_footer='# end\n',
+        )
+
+        response = self.client.get(reverse('ipam:ipaddress_list'), {'export': 'Hosts'})
+        lines = ''.join(response.streaming_content).splitlines()
+        self.assertEqual(lines[0], '# 10 addresses')
+        self.assertEqual(lines[1], '192.0.2.1 65000:1')
+        self.assertEqual(lines[-1], '# end')
+        self.assertEqual(len(lines), 12)
+
+
+@override_settings(IMPORT_JOB_THRESHOLD=2)
+class ImportJobTestCase(TestCase):
+
+    def setUp(self):
+
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.force_login(self.user)
+
+    def run_import(self, url_name, csv):
+
+        response = self.client.post(reverse(url_name), {'csv': csv})
+        job = ImportJob.objects.get(user=self.user)
+        self.assertRedirects(response, reverse('users:import_job', kwargs={'pk': job.pk}))
+
+        call_command('run_import_jobs', once=True, stdout=open('/dev/null', 'w'))
+        return ImportJob.objects.get(pk=job.pk)
+
+    def test_small_import_is_not_queued(self):
+
+        response = self.client.post(reverse('ipam:vrf_import'), {'csv': 'VRF 1,65000:1,,True,'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(ImportJob.objects.exists())
+        self.assertTrue(VRF.objects.filter(rd='65000:1').exists())
+
+    def test_import_job(self):
+
+        job = self.run_import('ipam:vrf_import', '\n'.join(
+            'VRF {0},65000:{0},,True,'.format(i) for i in range(1, 11)
+        ))
+        self.assertTrue(job.is_completed)
+        self.assertEqual((job.total_count, job.processed_count, job.created_count), (10, 10, 10))
+        self.assertEqual(VRF.objects.count(), 10)
+
+        response = self.client.get(reverse('extras-api:importjob_detail', kwargs={'pk': job.pk}))
+        self.assertEqual(response.data['status'], 'Completed')
+
+    def test_import_job_errors(self):
+
+        job = self.run_import('ipam:ipaddress_import', '\n'.join([
+            '192.0.2.1/24,,,,,,,',
+            '192.0.2.2/24,65000:999,,,,,,',
+            '192.0.2.3/24,,,,,,,',
+        ]))
+        self.assertEqual(job.get_status_display(), 'Failed')
+        self.assertEqual(job.get_errors(), ['Record 2 (vrf): VRF not found.'])
+        self.assertFalse(IPAddress.objects.exists())
+
+        response = self.client.get(reverse('users:import_job', kwargs={'pk': job.pk}))
+        self.assertContains(response, 'VRF not found.')
+
+    def test_import_job_defers_zone_changes(self):
+
+        zone = Zone.objects.create(name='example.com', ttl=3600, soa_name='ns1.example.com.',
+                                   soa_contact='hostmaster.example.com.', soa_refresh=3600, soa_retry=600,
+                                   soa_expire=86400, soa_minimum=300)
+        csv = '\n'.join('192.0.2.{0}/24,,,host{0}.example.com,,,,'.format(i) for i in range(1, 11))
+        with CaptureQueriesContext(connection) as queries:
+            job = self.run_import('ipam:ipaddress_import', csv)
+
+        self.assertTrue(job.is_completed)
+        self.assertEqual(Record.objects.filter(zone=zone).count(), 10)
+        # The zone is flagged as changed once for the whole job
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE "dns_zone"')]), 1)
+        self.assertTrue(Zone.objects.get(pk=zone.pk).bind_changed)
@@ -0,0 +1,176 @@
+import netaddr
+from collections import Sequence
+
+from .models import Prefix
+
+
+def iter_available_ranges(first, last, children):
+    """
+    Iterate over the children of the integer range [first, last] interleaved with the ranges of available space
+    between them. Children are (first, last, child) tuples sorted by their first integer; they may overlap or be nested
+    (e.g. duplicate prefixes). Yields the children as given and available ranges as (first, last, None) tuples.
+    """
+    cursor = first
+    for child in children:
+        if child[0] > cursor:
+            yield cursor, min(child[0] - 1, last), None
+        yield child
+        cursor = max(cursor, child[1] + 1)
+    if cursor <= last:
+        yield cursor, last, None
+
+
+def range_to_cidrs(first, last, version):
+    """
+    Return the list of IPNetworks exactly covering the integer range [first, last].
+    """
+    return netaddr.iprange_to_cidrs(netaddr.IPAddress(first, version), netaddr.IPAddress(last, version))
+
+
+class ChildList(Sequence):
+    """
+    A list of child objects interleaved with available space. Objects are only stored as primary keys and are fetched
+    from the queryset when a slice of the list is accessed, so that rendering a page of a table only materializes the
+    objects on that page. Any other row (available space) is passed through `factory`. Iterating over the whole list
+    fetches the objects by chunks of `chunk_size`.
+    """
+    chunk_size = 500
+
+    def __init__(self, queryset, rows, factory=None, annotations=None):
+        self.queryset = queryset
+        self.rows = rows
+        self.factory = factory or (lambda row: row)
+        self.annotations = annotations or {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.materialize(self.rows[key])
+        return self.materialize([self.rows[key]])[0]
+
+    def __iter__(self):
+        for i in range(0, len(self.rows), self.chunk_size):
+            for obj in self.materialize(self.rows[i:i + self.chunk_size]):
+                yield obj
+
+    def pk_list(self):
+        """
+        Return the primary key of each row (None for available space), without fetching the objects.
+        """
+        # Once sorted, rows hold the objects themselves
+        return [row if isinstance(row, (int, long)) else getattr(row, 'pk', None) for row in self.rows]
+
+    def materialize(self, rows):
+        objects = self.queryset.in_bulk([row for row in rows if isinstance(row, (int, long))])
+        output = []
+        for row in rows:
+            if isinstance(row, (int, long)):
+                obj = objects[row]
+                for name, value in self.annotations.items():
+                    setattr(obj, name, value)
+                output.append(obj)
+            else:
+                output.append(self.factory(row))
+        return output
+
+    def sort(self, key=None, reverse=False):
+        # Sorting on an arbitrary attribute requires all of the objects
+        self.rows = self.materialize(self.rows)
+        self.rows.sort(key=key, reverse=reverse)
+        self.factory = lambda row: row
+
+
+def get_top_level_prefixes(queryset):
+    """
+    Return the (first, last, pk) tuples of the prefixes of a queryset which are not contained in another prefix of the
+    queryset (duplicate prefixes are all returned), sorted by address.
+    """
+    top_level = []
+    top = None
+    for pk, prefix in queryset.order_by('prefix', 'pk').values_list('pk', 'prefix'):
+        if top is None or prefix.first > top.last or prefix == top:
+            top = prefix
+            top_level.append((prefix.first, prefix.last, pk))
+    return top_level
+
+
+def add_available_prefixes(parent, queryset):
+    """
+    Return the top-level prefixes of a queryset within a parent prefix, interleaved with fake Prefix objects for all
+    unallocated space.
+    """
+    rows = []
+    for first, last, pk in iter_available_ranges(parent.first, parent.last, get_top_level_prefixes(queryset)):
+        if pk is None:
+            rows.extend(range_to_cidrs(first, last, parent.version))
+        else:
+            rows.append(pk)
+
+    return ChildList(queryset, rows, factory=lambda p: Prefix(prefix=p), annotations={'depth': 0})
+
+
+def get_host_range(prefix):
+    """
+    Return the first and last integers of the IP addresses which may be assigned within a prefix.
+    """
+    # Ignore the "network address" and the broadcast address for IPv4 prefixes larger than /31
+    if prefix.version == 4 and prefix.prefixlen < 31:
+        return prefix.first + 1, prefix.last - 1
+    return prefix.first, prefix.last
+
+
+def get_ipaddress_ranges(queryset):
+    """
+    Return the (first, last, pk) tuples of the IP addresses of a queryset, sorted by address.
+    """
+    # IP addresses are ordered by network in the database, so the host addresses are sorted here
+    return sorted(
+        (address.value, address.value, pk) for pk, address in queryset.order_by().values_list('pk', 'address')
+    )
+
+
+def add_available_ipaddresses(prefix, queryset):
+    """
+    Return the IP addresses of a queryset within a given prefix, interleaved with (count, first address) tuples for
+    each range of available IP addresses.
+    """
+    first_ip, last_ip = get_host_range(prefix)
+    rows = []
+    for first, last, pk in iter_available_ranges(first_ip, last_ip, get_ipaddress_ranges(queryset)):
+        if pk is None:
+            rows.append((last - first + 1, '{}/{}'.format(netaddr.IPAddress(first, prefix.version), prefix.prefixlen)))
+        else:
+            rows.append(pk)
+
+    return ChildList(queryset, rows)
+
+
+def get_available_prefixes(parent, queryset, prefix_length):
+    """
+    Iterate over the available prefixes of the given length within a parent prefix, in order, considering the prefixes
+    of a queryset as allocated.
+    """
+    ranges = iter_available_ranges(parent.first, parent.last, get_top_level_prefixes(queryset))
+    for first, last, pk in ranges:
+        if pk is not None:
+            continue
+        for cidr in range_to_cidrs(first, last, parent.version):
+            if cidr.prefixlen <= prefix_length:
+                for subnet in cidr.subnet(prefix_length):
+                    yield subnet
+
+
+def get_available_ipaddresses(prefix, queryset):
+    """
+    Iterate over the available IP addresses (with the mask of the prefix) within a prefix, in order, considering the IP
+    addresses of a queryset as allocated.
+    """
+    first_ip, last_ip = get_host_range(prefix)
+    for first, last, pk in iter_available_ranges(first_ip, last_ip, get_ipaddress_ranges(queryset)):
+        if pk is not None:
+            continue
+        while first <= last:
+            yield netaddr.IPNetwork('{}/{}'.format(netaddr.IPAddress(first, prefix.version), prefix.prefixlen))
+            first += 1
@@ -1,9 +1,10 @@
-import netaddr
 from django_tables2 import RequestConfig
 
 from django.contrib.auth.mixins import PermissionRequiredMixin
-from django.db.models import Count, Q
+from django.db.models import Count, DecimalField, Q, Sum
+from django.db.models.expressions import RawSQL
 from django.shortcuts import get_object_or_404, render
+from django.utils import timezone
 
 from dcim.models import Device
 from dns.models import Zone, Record
@@ -14,74 +15,8 @@ from utilities.views import (
 )
 
 from . import filters, forms, tables
-from .models import Aggregate, IPAddress, Prefix, RIR, Role, VLAN, VLANGroup, VRF
-
-
-def add_available_prefixes(parent, prefix_list):
-    """
-    Create fake Prefix objects for all unallocated space within a prefix.
-    """
-
-    # Find all unallocated space
-    available_prefixes = netaddr.IPSet(parent) ^ netaddr.IPSet([p.prefix for p in prefix_list])
-    available_prefixes = [Prefix(prefix=p) for p in available_prefixes.iter_cidrs()]
-
-    # Concatenate and sort complete list of children
-    prefix_list = list(prefix_list) + available_prefixes
-    prefix_list.sort(key=lambda p: p.prefix)
-
-    return prefix_list
-
-
-def add_available_ipaddresses(prefix, ipaddress_list):
-    """
-    Annotate ranges of available IP addresses within a given prefix.
-    """
-
-    output = []
-    prev_ip = None
-
-    # Ignore the "network address" for IPv4 prefixes larger than /31
-    if prefix.version == 4 and prefix.prefixlen < 31:
-        first_ip_in_prefix = netaddr.IPAddress(prefix.first + 1)
-    else:
-        first_ip_in_prefix = netaddr.IPAddress(prefix.first)
-
-    # Ignore the broadcast address for IPv4 prefixes larger than /31
-    if prefix.version == 4 and prefix.prefixlen < 31:
-        last_ip_in_prefix = netaddr.IPAddress(prefix.last - 1)
-    else:
-        last_ip_in_prefix = netaddr.IPAddress(prefix.last)
-
-    if not ipaddress_list:
-        return [(
-            int(last_ip_in_prefix - first_ip_in_prefix + 1),
-            '{}/{}'.format(first_ip_in_prefix, prefix.prefixlen)
-        )]
-
-    # Account for any available IPs before the first real IP
-    if ipaddress_list[0].address.ip > first_ip_in_prefix:
-        skipped_count = int(ipaddress_list[0].address.ip - first_ip_in_prefix)
-        first_skipped = '{}/{}'.format(first_ip_in_prefix, prefix.prefixlen)
-        output.append((skipped_count, first_skipped))
-
-    # Iterate through existing IPs and annotate free ranges
-    for ip in ipaddress_list:
-        if prev_ip:
-            diff = int(ip.address.ip - prev_ip.address.ip)
-            if diff > 1:
-                first_skipped = '{}/{}'.format(prev_ip.address.ip + 1, prefix.prefixlen)
-                output.append((diff - 1, first_skipped))
-        output.append(ip)
-        prev_ip = ip
-
-    # Include any remaining available IPs
-    if prev_ip.address.ip < last_ip_in_prefix:
-        skipped_count = int(last_ip_in_prefix - prev_ip.address.ip)
-        first_skipped = '{}/{}'.format(prev_ip.address.ip + 1, prefix.prefixlen)
-        output.append((skipped_count, first_skipped))
-
-    return output
+from .models import Aggregate, IPAddress, Prefix, RIR, Role, VLAN, VLANGroup, VRF, rebuild_prefix_hierarchy
+from .utils import add_available_ipaddresses, add_available_prefixes
 
 
 #
@@ -189,7 +124,7 @@ class RIRBulkDeleteView(PermissionRequiredMixin, BulkDeleteView):
 class AggregateListView(ObjectListView):
     queryset = Aggregate.objects.select_related('rir').extra(select={
         'child_count': 'SELECT COUNT(*) FROM ipam_prefix WHERE ipam_prefix.prefix <<= ipam_aggregate.prefix',
-    })
+    }).annotate_utilization()
     filter = filters.AggregateFilter
     filter_form = forms.AggregateFilterForm
     table = tables.AggregateTable
@@ -197,18 +132,17 @@ class AggregateListView(ObjectListView):
     template_name = 'ipam/aggregate_list.html'
 
     def extra_context(self):
-        ipv4_total = 0
-        ipv6_total = 0
 
-        for a in self.queryset:
-            if a.prefix.version == 4:
-                ipv4_total += a.prefix.size
-            elif a.prefix.version == 6:
-                ipv6_total += a.prefix.size / 2 ** 64
+        # Total size of the aggregates, counted in /32s for IPv4 and /64s for IPv6
+        totals = dict(self.queryset.order_by().values_list('family').annotate(total=Sum(RawSQL(
+            'FLOOR(POWER(2::numeric, '
+            'CASE ipam_aggregate.family WHEN 4 THEN 32 ELSE 64 END - MASKLEN(ipam_aggregate.prefix)))',
+            []
+        ), output_field=DecimalField())))
 
         return {
-            'ipv4_total': ipv4_total,
-            'ipv6_total': ipv6_total,
+            'ipv4_total': int(totals.get(4) or 0),
+            'ipv6_total': int(totals.get(6) or 0),
         }
 
 
@@ -218,7 +152,7 @@ def aggregate(request, pk):
 
     # Find all child prefixes contained by this aggregate
     child_prefixes = Prefix.objects.filter(prefix__net_contained_or_equal=str(aggregate.prefix))\
-        .select_related('site', 'role').annotate_depth(limit=0)
+        .select_related('site', 'role')
     child_prefixes = add_available_prefixes(aggregate.prefix, child_prefixes)
 
     prefix_table = tables.PrefixTable(child_prefixes)
@@ -316,8 +250,9 @@ class PrefixListView(ObjectListView):
 
     def alter_queryset(self, request):
         # Show only top-level prefixes by default (unless searching)
-        limit = None if request.GET.get('expand') or request.GET.get('q') else 0
-        return self.queryset.annotate_depth(limit=limit)
+        if request.GET.get('expand') or request.GET.get('q'):
+            return self.queryset.all()
+        return self.queryset.top_level()
 
 
 def prefix(request, pk):
@@ -329,10 +264,8 @@ def prefix(request, pk):
     except Aggregate.DoesNotExist:
         aggregate = None
 
-    child_ip = IPAddress.objects.filter(vrf=prefix.vrf, address__net_contained_or_equal=str(prefix.prefix))
-
     # Count child IP addresses
-    ipaddress_count = child_ip.count()
+    ipaddress_count = prefix.get_child_ipaddresses().count()
 
     # Parent prefixes table
     parent_prefixes = Prefix.objects.filter(Q(vrf=prefix.vrf) | Q(vrf__isnull=True))\
@@ -346,15 +279,8 @@ def prefix(request, pk):
     duplicate_prefix_table = tables.PrefixBriefTable(duplicate_prefixes)
 
     # Child prefixes table
-    if prefix.vrf:
-        # If the prefix is in a VRF, show child prefixes only within that VRF.
-        child_prefixes = Prefix.objects.filter(vrf=prefix.vrf)
-    else:
-        # If the prefix is in the global table, show child prefixes from all VRFs.
-        child_prefixes = Prefix.objects.all()
-    child_prefixes = child_prefixes.filter(prefix__net_contained=str(prefix.prefix))\
-        .select_related('site', 'role').annotate_depth(limit=0)
-    if child_prefixes:
+    child_prefixes = prefix.get_child_prefixes().select_related('site', 'role')
+    if child_prefixes.exists():
         child_prefixes = add_available_prefixes(prefix.prefix, child_prefixes)
     child_prefix_table = tables.PrefixTable(child_prefixes)
     child_prefix_table.model = Prefix
@@ -413,10 +339,14 @@ class PrefixBulkEditView(PermissionRequiredMixin, BulkEditView):
             if form.cleaned_data[field]:
                 fields_to_update[field] = form.cleaned_data[field]
 
-        plist = self.cls.objects.filter(pk__in=pk_list)
-        for p in plist:
-            p.set_bind_changed(True)
-        return plist.update(**fields_to_update)
+        fields_to_update.update(bind_changed=True, last_updated=timezone.now())
+        updated_count = self.cls.objects.filter(pk__in=pk_list).update(**fields_to_update)
+
+        # Moving prefixes to another VRF changes their place in the hierarchy
+        if 'vrf' in fields_to_update:
+            rebuild_prefix_hierarchy(self.cls.objects.filter(pk__in=pk_list).values_list('prefix', flat=True))
+
+        return updated_count
 
 
 class PrefixBulkDeleteView(PermissionRequiredMixin, BulkDeleteView):
@@ -430,7 +360,7 @@ def prefix_ipaddresses(request, pk):
     prefix = get_object_or_404(Prefix.objects.all(), pk=pk)
 
     # Find all IPAddresses belonging to this Prefix
-    ipaddresses = IPAddress.objects.filter(vrf=prefix.vrf, address__net_contained_or_equal=str(prefix.prefix))\
+    ipaddresses = prefix.get_child_ipaddresses()\
         .select_related('vrf', 'interface__device', 'primary_ip4_for', 'primary_ip6_for')
     ipaddresses = add_available_ipaddresses(prefix.prefix, ipaddresses)
 
@@ -550,6 +480,7 @@ class IPAddressBulkEditView(PermissionRequiredMixin, BulkEditView):
         iplist = self.cls.objects.filter(pk__in=pk_list)
         for ip in iplist:
             ip.save()
+        fields_to_update['last_updated'] = timezone.now()
         return iplist.update(**fields_to_update)
 
 
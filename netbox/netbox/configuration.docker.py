@@ -48,6 +48,14 @@ EMAIL = {
     'FROM_EMAIL': os.environ.get('EMAIL_FROM', ''),
 }
 
+# CSV imports of more than this number of records are processed in the background by the run_import_jobs management
+# command. Set to 0 to always import within the request. (Default: 1000)
+IMPORT_JOB_THRESHOLD = int(os.environ.get('IMPORT_JOB_THRESHOLD', 1000))
+
+# Number of seconds for which the live LLDP neighbors of a device are served from cache. Set to 0 to query the device
+# on every request. (Default: 60)
+LLDP_CACHE_TIMEOUT = int(os.environ.get('LLDP_CACHE_TIMEOUT', 60))
+
 # Setting this to True will permit only authenticated users to access any part of NetBox. By default, anonymous users
 # are permitted to access most data in NetBox (excluding secrets) but not make any changes.
 LOGIN_REQUIRED = os.environ.get('LOGIN_REQUIRED', False)
@@ -55,6 +63,9 @@ LOGIN_REQUIRED = os.environ.get('LOGIN_REQUIRED', False)
 # Setting this to True will display a "maintenance mode" banner at the top of every page.
 MAINTENANCE_MODE = os.environ.get('MAINTENANCE_MODE', False)
 
+# Maximum number of objects which can be requested per page from the API. (Default: 1000)
+MAX_PAGE_SIZE = os.environ.get('MAX_PAGE_SIZE', 1000)
+
 # Credentials that NetBox will use to access live devices.
 NETBOX_USERNAME = os.environ.get('NETBOX_USERNAME', '')
 NETBOX_PASSWORD = os.environ.get('NETBOX_PASSWORD', '')
@@ -62,6 +73,10 @@ NETBOX_PASSWORD = os.environ.get('NETBOX_PASSWORD', '')
 # Determine how many objects to display per page within a list. (Default: 50)
 PAGINATE_COUNT = os.environ.get('PAGINATE_COUNT', 50)
 
+# Number of seconds for which a session key obtained from the secrets API unlocks the master key without the user's
+# private key. (Default: 900)
+SECRETS_SESSION_TIMEOUT = int(os.environ.get('SECRETS_SESSION_TIMEOUT', 900))
+
 # Time zone (default: UTC)
 TIME_ZONE = os.environ.get('TIME_ZONE', 'UTC')
 
@@ -26,8 +26,11 @@ for setting in ['ALLOWED_HOSTS', 'DATABASE', 'SECRET_KEY']:
 ADMINS = getattr(configuration, 'ADMINS', [])
 DEBUG = getattr(configuration, 'DEBUG', False)
 EMAIL = getattr(configuration, 'EMAIL', {})
+IMPORT_JOB_THRESHOLD = getattr(configuration, 'IMPORT_JOB_THRESHOLD', 1000)
+LLDP_CACHE_TIMEOUT = getattr(configuration, 'LLDP_CACHE_TIMEOUT', 60)
 LOGIN_REQUIRED = getattr(configuration, 'LOGIN_REQUIRED', False)
 MAINTENANCE_MODE = getattr(configuration, 'MAINTENANCE_MODE', False)
+MAX_PAGE_SIZE = getattr(configuration, 'MAX_PAGE_SIZE', 1000)
 PAGINATE_COUNT = getattr(configuration, 'PAGINATE_COUNT', 50)
 NETBOX_USERNAME = getattr(configuration, 'NETBOX_USERNAME', '')
 NETBOX_PASSWORD = getattr(configuration, 'NETBOX_PASSWORD', '')
@@ -41,6 +44,7 @@ SHORT_DATETIME_FORMAT = getattr(configuration, 'SHORT_DATETIME_FORMAT', 'Y-m-d H
 BANNER_TOP = getattr(configuration, 'BANNER_TOP', False)
 BANNER_BOTTOM = getattr(configuration, 'BANNER_BOTTOM', False)
 PREFER_IPV4 = getattr(configuration, 'PREFER_IPV4', False)
+SECRETS_SESSION_TIMEOUT = getattr(configuration, 'SECRETS_SESSION_TIMEOUT', 900)
 ENFORCE_GLOBAL_UNIQUE = getattr(configuration, 'ENFORCE_GLOBAL_UNIQUE', False)
 CSRF_TRUSTED_ORIGINS = ALLOWED_HOSTS
 
@@ -125,6 +129,7 @@ MIDDLEWARE_CLASSES = (
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'utilities.middleware.LoginRequiredMiddleware',
+    'dns.middleware.DeferZoneChangesMiddleware',
 )
 
 ROOT_URLCONF = 'netbox.urls'
@@ -182,7 +187,8 @@ SECRETS_MIN_PUBKEY_SIZE = 2048
 
 # Django REST framework
 REST_FRAMEWORK = {
-    'DEFAULT_FILTER_BACKENDS': ('rest_framework.filters.DjangoFilterBackend',)
+    'DEFAULT_FILTER_BACKENDS': ('rest_framework.filters.DjangoFilterBackend',),
+    'DEFAULT_PAGINATION_CLASS': 'utilities.api.KeysetPagination',
 }
 
 # Swagger settings (API docs)
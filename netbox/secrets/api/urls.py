@@ -13,6 +13,9 @@ urlpatterns = [
     url(r'^secret-roles/$', SecretRoleListView.as_view(), name='secretrole_list'),
     url(r'^secret-roles/(?P<pk>\d+)/$', SecretRoleDetailView.as_view(), name='secretrole_detail'),
 
+    # Session keys
+    url(r'^session-key/$', SessionKeyView.as_view(), name='session_key'),
+
     # Miscellaneous
     url(r'^generate-keys/$', RSAKeyGeneratorView.as_view(), name='generate_keys'),
 
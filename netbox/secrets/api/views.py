@@ -1,5 +1,6 @@
-from Crypto.PublicKey import RSA
+import base64
 
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
 from rest_framework import generics
@@ -12,7 +13,10 @@ from rest_framework.views import APIView
 
 from extras.api.renderers import FormlessBrowsableAPIRenderer, FreeRADIUSClientsRenderer
 from secrets.filters import SecretFilter
-from secrets.models import Secret, SecretRole, UserKey
+from secrets.models import (
+    RSA_KEY_SIZES, Secret, SecretRole, SessionKey, UserKey, generate_rsa_key_pair, hash_session_key, rsa_key_pool,
+)
+from utilities.utils import iter_queryset
 
 from . import serializers
 
@@ -20,6 +24,46 @@ from . import serializers
 ERR_USERKEY_MISSING = "No UserKey found for the current user."
 ERR_USERKEY_INACTIVE = "UserKey has not been activated for decryption."
 ERR_PRIVKEY_INVALID = "Invalid private key."
+ERR_SESSION_KEY_INVALID = "Invalid or expired session key."
+
+
+def get_session_key(request):
+    """
+    Return the session key passed (base64-encoded) in the X-Session-Key header or the `session_key` POST parameter of a
+    request, or None.
+    """
+    session_key = request.META.get('HTTP_X_SESSION_KEY') or request.POST.get('session_key')
+    if not session_key:
+        return None
+    try:
+        return base64.b64decode(session_key)
+    except TypeError:
+        return ''
+
+
+def unlock_master_key(uk, private_key=None, session_key=None):
+    """
+    Return the master key unlocked by either a private key or a session key, and an error message if it could not be
+    unlocked.
+    """
+    if private_key:
+        master_key = uk.get_master_key(private_key)
+        return master_key, ERR_PRIVKEY_INVALID if master_key is None else None
+    master_key = uk.get_session_master_key(session_key)
+    return master_key, ERR_SESSION_KEY_INVALID if master_key is None else None
+
+
+def get_userkey(request):
+    """
+    Return the active UserKey of the current user, and an error message if there is none.
+    """
+    try:
+        uk = UserKey.objects.get(user=request.user)
+    except UserKey.DoesNotExist:
+        return None, ERR_USERKEY_MISSING
+    if not uk.is_active():
+        return None, ERR_USERKEY_INACTIVE
+    return uk, None
 
 
 class SecretRoleListView(generics.ListAPIView):
@@ -42,7 +86,9 @@ class SecretRoleDetailView(generics.RetrieveAPIView):
 
 class SecretListView(generics.GenericAPIView):
     """
-    List secrets (filterable). If a private key is POSTed, attempt to decrypt each Secret.
+    List secrets (filterable). If a private key is POSTed, or a session key is passed in the X-Session-Key header,
+    attempt to decrypt each Secret. Pass `validate=false` to skip the validation of each plaintext against its hash.
+    The FreeRADIUS format is streamed, decrypting the Secrets by chunks.
     """
     queryset = Secret.objects.select_related('device__primary_ip4', 'device__primary_ip6', 'role')\
         .prefetch_related('role__users', 'role__groups')
@@ -53,42 +99,57 @@ class SecretListView(generics.GenericAPIView):
 
     def get(self, request, private_key=None):
         queryset = self.filter_queryset(self.get_queryset())
-
-        # Attempt to decrypt each Secret if a private key was provided.
-        if private_key:
-            try:
-                uk = UserKey.objects.get(user=request.user)
-            except UserKey.DoesNotExist:
-                return Response(
-                    {'error': ERR_USERKEY_MISSING},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            if not uk.is_active():
-                return Response(
-                    {'error': ERR_USERKEY_INACTIVE},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            master_key = uk.get_master_key(private_key)
-            if master_key is not None:
-                for s in queryset:
-                    if s.decryptable_by(request.user):
-                        s.decrypt(master_key)
-            else:
+        session_key = get_session_key(request)
+        master_key = None
+        validate = request.query_params.get('validate', '').lower() not in ('0', 'false')
+
+        # Attempt to decrypt each Secret if a private key or a session key was provided.
+        if private_key or session_key is not None:
+            uk, error = get_userkey(request)
+            if uk is not None:
+                master_key, error = unlock_master_key(uk, private_key, session_key)
+            if error:
                 return Response(
-                    {'error': ERR_PRIVKEY_INVALID},
+                    {'error': error},
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
+        if request.accepted_renderer.format == FreeRADIUSClientsRenderer.format:
+            return StreamingHttpResponse(
+                request.accepted_renderer.render_clients(self.iter_secrets(queryset, master_key, validate)),
+                content_type=FreeRADIUSClientsRenderer.media_type
+            )
+
+        if master_key is not None:
+            for s in queryset:
+                if s.decryptable_by(request.user):
+                    s.decrypt(master_key, validate=validate)
+
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    def iter_secrets(self, queryset, master_key=None, validate=True):
+        """
+        Serialize the Secrets of a queryset by chunks, decrypting those the user has permission to decrypt. Secrets which
+        fail to decrypt are serialized with an `error`.
+        """
+        for secret in iter_queryset(queryset):
+            error = None
+            if master_key is not None and secret.decryptable_by(self.request.user):
+                try:
+                    secret.decrypt(master_key, validate=validate)
+                except ValueError as e:
+                    error = str(e)
+            yield dict(self.get_serializer(secret).data, error=error)
+
     def post(self, request):
         return self.get(request, private_key=request.POST.get('private_key'))
 
 
 class SecretDetailView(generics.GenericAPIView):
     """
-    Retrieve a single Secret. If a private key is POSTed, attempt to decrypt the Secret.
+    Retrieve a single Secret. If a private key is POSTed, or a session key is passed in the X-Session-Key header,
+    attempt to decrypt the Secret.
     """
     queryset = Secret.objects.select_related('device__primary_ip4', 'device__primary_ip6', 'role')\
         .prefetch_related('role__users', 'role__groups')
@@ -98,27 +159,22 @@ class SecretDetailView(generics.GenericAPIView):
 
     def get(self, request, pk, private_key=None):
         secret = get_object_or_404(Secret, pk=pk)
+        session_key = get_session_key(request)
 
-        # Attempt to decrypt the Secret if a private key was provided.
-        if private_key:
-            try:
-                uk = UserKey.objects.get(user=request.user)
-            except UserKey.DoesNotExist:
-                return Response(
-                    {'error': ERR_USERKEY_MISSING},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            if not uk.is_active():
+        # Attempt to decrypt the Secret if a private key or a session key was provided.
+        if private_key or session_key is not None:
+            uk, error = get_userkey(request)
+            if error:
                 return Response(
-                    {'error': ERR_USERKEY_INACTIVE},
+                    {'error': error},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             if not secret.decryptable_by(request.user):
                 raise PermissionDenied(detail="You do not have permission to decrypt this secret.")
-            master_key = uk.get_master_key(private_key)
-            if master_key is None:
+            master_key, error = unlock_master_key(uk, private_key, session_key)
+            if error:
                 return Response(
-                    {'error': ERR_PRIVKEY_INVALID},
+                    {'error': error},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             secret.decrypt(master_key)
@@ -130,24 +186,61 @@ class SecretDetailView(generics.GenericAPIView):
         return self.get(request, pk, private_key=request.POST.get('private_key'))
 
 
+class SessionKeyView(APIView):
+    """
+    Exchange a POSTed private key for a session key (base64-encoded), which unlocks the master key until it expires
+    (see SECRETS_SESSION_TIMEOUT). DELETE revokes the session key passed in the X-Session-Key header.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        uk, error = get_userkey(request)
+        if uk is not None:
+            master_key, error = unlock_master_key(uk, private_key=request.POST.get('private_key'))
+        if error:
+            return Response(
+                {'error': error},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        session_key = uk.create_session_key(master_key)
+
+        return Response({
+            'session_key': base64.b64encode(session_key.key),
+            'expires': session_key.expires,
+        })
+
+    def delete(self, request):
+        session_key = get_session_key(request)
+        if session_key:
+            SessionKey.objects.filter(userkey__user=request.user, hash=hash_session_key(session_key)).delete()
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class RSAKeyGeneratorView(APIView):
     """
-    Generate a new RSA key pair for a user. Authenticated because it's a ripe avenue for DoS.
+    Generate a new RSA key pair for a user. Authenticated because it's a ripe avenue for DoS. Key pairs are taken from
+    the in-memory pool of the process when available.
     """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
 
         # Determine what size key to generate
-        key_size = request.GET.get('key_size', 2048)
-        if key_size not in range(2048, 4097, 256):
+        try:
+            key_size = int(request.GET.get('key_size', 2048))
+        except ValueError:
+            key_size = 2048
+        if key_size not in RSA_KEY_SIZES:
             key_size = 2048
 
-        # Export RSA private and public keys in PEM format
-        key = RSA.generate(key_size)
-        private_key = key.exportKey('PEM')
-        public_key = key.publickey().exportKey('PEM')
+        # Hand out a pre-generated key pair, falling back to generating one (slow) if the pool is empty
+        key_pair = rsa_key_pool.claim(key_size)
+        if key_pair is None:
+            key_pair = generate_rsa_key_pair(key_size)
+        private_key, public_key = key_pair
 
+        # RSA private and public keys are in PEM format
         return Response({
             'private_key': private_key,
             'public_key': public_key,
@@ -5,7 +5,7 @@ from django import forms
 from django.db.models import Count
 
 from dcim.models import Device
-from utilities.forms import BootstrapMixin, BulkImportForm, CSVDataField, SlugField
+from utilities.forms import BootstrapMixin, BulkImportForm, CSVDataField, FlexibleModelChoiceField, SlugField
 
 from .models import Secret, SecretRole, UserKey
 
@@ -68,10 +68,10 @@ class SecretForm(forms.ModelForm, BootstrapMixin):
 
 
 class SecretFromCSVForm(forms.ModelForm):
-    device = forms.ModelChoiceField(queryset=Device.objects.all(), required=False, to_field_name='name',
-                                    error_messages={'invalid_choice': 'Device not found.'})
-    role = forms.ModelChoiceField(queryset=SecretRole.objects.all(), to_field_name='name',
-                                  error_messages={'invalid_choice': 'Invalid secret role.'})
+    device = FlexibleModelChoiceField(queryset=Device.objects.all(), required=False, to_field_name='name',
+                                      error_messages={'invalid_choice': 'Device not found.'})
+    role = FlexibleModelChoiceField(queryset=SecretRole.objects.all(), to_field_name='name',
+                                    error_messages={'invalid_choice': 'Invalid secret role.'})
     plaintext = forms.CharField()
 
     class Meta:
@@ -1,6 +1,11 @@
+import hashlib
 import os
+import threading
 from Crypto.Cipher import AES, PKCS1_OAEP
 from Crypto.PublicKey import RSA
+from Crypto.Util.strxor import strxor
+from collections import defaultdict
+from datetime import timedelta
 
 from django.conf import settings
 from django.contrib.auth.hashers import make_password, check_password
@@ -8,6 +13,7 @@ from django.contrib.auth.models import Group, User
 from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
 from django.db import models
+from django.utils import timezone
 from django.utils.encoding import force_bytes
 
 from dcim.models import Device
@@ -16,6 +22,13 @@ from utilities.models import CreatedUpdatedModel
 from .hashers import SecretValidationHasher
 
 
+# Sizes of the RSA key pairs which can be generated for users
+RSA_KEY_SIZES = range(2048, 4097, 256)
+
+# Number of pre-generated RSA key pairs kept in memory by each process, per key size
+RSA_KEY_POOL_SIZE = 5
+
+
 def generate_master_key():
     """
     Generate a new 256-bit (32 bytes) AES key to be used for symmetric encryption of secrets.
@@ -41,6 +54,74 @@ def decrypt_master_key(master_key_cipher, private_key):
     return cipher.decrypt(master_key_cipher)
 
 
+def generate_rsa_key_pair(key_size):
+    """
+    Generate a new RSA key pair of the given size, returned as a (private key, public key) tuple in PEM format.
+    """
+    key = RSA.generate(key_size)
+    return key.exportKey('PEM'), key.publickey().exportKey('PEM')
+
+
+class RSAKeyPool(object):
+    """
+    A pool of pre-generated RSA key pairs, filled by a background thread and handed out once each. Key pairs are only
+    held in the memory of the process: a private key must never reach the database, where a dump of it could later be
+    combined with its user key to recover the master key. A key size is pooled once a key pair of that size has been
+    claimed.
+    """
+
+    def __init__(self, size=RSA_KEY_POOL_SIZE):
+        self.size = size
+        self.key_pairs = defaultdict(list)
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def claim(self, key_size):
+        """
+        Remove a key pair of the given size from the pool and return it, or return None if the pool is empty. The pool
+        is then refilled in the background.
+        """
+        with self.lock:
+            key_pairs = self.key_pairs[key_size]
+            key_pair = key_pairs.pop(0) if key_pairs else None
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.fill)
+                self.thread.daemon = True
+                self.thread.start()
+        return key_pair
+
+    def fill(self):
+        """
+        Generate key pairs until the pool of each claimed key size is full.
+        """
+        try:
+            while True:
+                with self.lock:
+                    missing = [k for k, key_pairs in sorted(self.key_pairs.items()) if len(key_pairs) < self.size]
+                    if not missing:
+                        self.thread = None
+                        return
+                key_pair = generate_rsa_key_pair(missing[0])
+                with self.lock:
+                    self.key_pairs[missing[0]].append(key_pair)
+        except Exception:
+            with self.lock:
+                self.thread = None
+            raise
+
+
+# Pool of key pairs handed out by the secrets API in this process
+rsa_key_pool = RSAKeyPool()
+
+
+def hash_session_key(session_key):
+    """
+    Return the SHA256 hash of a session key. Session keys are random 256-bit keys, so a single round of hashing is
+    enough to protect them (and allows looking up a SessionKey by hash).
+    """
+    return hashlib.sha256(session_key).hexdigest()
+
+
 class UserKeyQuerySet(models.QuerySet):
 
     def active(self):
@@ -104,9 +185,11 @@ class UserKey(CreatedUpdatedModel):
 
     def save(self, *args, **kwargs):
 
-        # Check whether public_key has been modified. If so, nullify the initial master_key_cipher.
+        # Check whether public_key has been modified. If so, nullify the initial master_key_cipher and revoke all
+        # session keys.
         if self.__initial_master_key_cipher and self.public_key != self.__initial_public_key:
             self.master_key_cipher = None
+            self.session_keys.all().delete()
 
         # If no other active UserKeys exist, generate a new master key and use it to activate this UserKey.
         if self.is_filled() and not self.is_active() and not UserKey.objects.active().count():
@@ -159,6 +242,76 @@ class UserKey(CreatedUpdatedModel):
         self.master_key_cipher = encrypt_master_key(master_key, self.public_key)
         self.save()
 
+    def create_session_key(self, master_key):
+        """
+        Store a copy of the master key encrypted with a new random session key, valid for SECRETS_SESSION_TIMEOUT
+        seconds, and return the new SessionKey (its `key` attribute holds the session key, which is not stored).
+        Expired session keys of the UserKey are deleted.
+        """
+        self.session_keys.expired().delete()
+        session_key = SessionKey(
+            userkey=self, expires=timezone.now() + timedelta(seconds=settings.SECRETS_SESSION_TIMEOUT)
+        )
+        session_key.set_master_key(master_key)
+        session_key.save()
+        return session_key
+
+    def get_session_master_key(self, key):
+        """
+        Given a session key created by create_session_key(), return the master key, or None if the session key is
+        invalid or expired.
+        """
+        session_key = self.session_keys.valid().filter(hash=hash_session_key(key)).first()
+        if session_key is None:
+            return None
+        return session_key.get_master_key(key)
+
+
+class SessionKeyQuerySet(models.QuerySet):
+
+    def valid(self):
+        return self.filter(expires__gt=timezone.now())
+
+    def expired(self):
+        return self.filter(expires__lte=timezone.now())
+
+
+class SessionKey(models.Model):
+    """
+    A SessionKey stores a copy of the master key encrypted with a random session key, which is handed to the user
+    instead of being stored (only its hash is). Until it expires, the session key unlocks the master key without the
+    expensive RSA decryption of the UserKey's master_key_cipher.
+    """
+    userkey = models.ForeignKey('UserKey', related_name='session_keys', on_delete=models.CASCADE, editable=False)
+    cipher = models.BinaryField(max_length=32, editable=False)
+    hash = models.CharField(max_length=64, unique=True, editable=False)
+    created = models.DateTimeField(auto_now_add=True)
+    expires = models.DateTimeField(editable=False)
+
+    key = None
+
+    objects = SessionKeyQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['userkey__user__username', 'created']
+
+    def __unicode__(self):
+        return u'{} ({})'.format(self.userkey, self.expires)
+
+    def set_master_key(self, master_key):
+        """
+        Encrypt the master key with a new random session key, stored in self.key.
+        """
+        self.key = generate_master_key()
+        self.cipher = strxor(self.key, master_key)
+        self.hash = hash_session_key(self.key)
+
+    def get_master_key(self, key):
+        """
+        Decrypt the master key with the given session key.
+        """
+        return strxor(key, force_bytes(self.cipher))
+
 
 class SecretRole(models.Model):
     """
@@ -278,11 +431,12 @@ class Secret(CreatedUpdatedModel):
 
         self.plaintext = None
 
-    def decrypt(self, secret_key):
+    def decrypt(self, secret_key, validate=True):
         """
         Consume the first 16 bytes of self.ciphertext as the AES initialization vector (IV). The remainder is decrypted
         using the IV and the provided secret key. Padding is then removed to reveal the plaintext. Finally, validate the
-        decrypted plaintext value against the stored hash.
+        decrypted plaintext value against the stored hash, unless `validate` is False (the PBKDF2 validation dominates
+        the cost of decrypting many Secrets with a master key already known to be valid).
         """
         if self.plaintext is not None:
             return
@@ -295,7 +449,7 @@ class Secret(CreatedUpdatedModel):
         plaintext = self._unpad(aes.decrypt(self.ciphertext[16:]))
 
         # Verify decrypted plaintext against hash
-        if not self.validate(plaintext):
+        if validate and not self.validate(plaintext):
             raise ValueError("Invalid key or ciphertext!")
 
         self.plaintext = plaintext
@@ -0,0 +1,152 @@
+import base64
+from Crypto.PublicKey import RSA
+from netaddr import IPNetwork
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from dcim.models import Device
+from ipam.models import IPAddress
+from secrets.api import views
+from secrets.models import RSAKeyPool, Secret, SecretRole, UserKey, generate_master_key, rsa_key_pool
+
+
+class SecretAPITestCase(TestCase):
+
+    fixtures = ['dcim', 'ipam']
+
+    def setUp(self):
+
+        key = RSA.generate(getattr(settings, 'SECRETS_MIN_PUBKEY_SIZE', 2048))
+        self.private_key = key.exportKey('PEM')
+        user = User.objects.create_superuser('alice', 'alice@example.com', 'alice')
+        master_key = generate_master_key()
+        UserKey(user=user, public_key=key.publickey().exportKey('PEM')).activate(master_key)
+
+        role = SecretRole.objects.create(name='Login', slug='login')
+        for i, device in enumerate(Device.objects.all()[:3]):
+            secret = Secret(device=device, role=role, plaintext='password{}'.format(i))
+            secret.encrypt(master_key)
+            secret.save()
+
+        self.client.login(username='alice', password='alice')
+
+    def get_session_key(self):
+        response = self.client.post(reverse('secrets-api:session_key'), {'private_key': self.private_key})
+        self.assertEqual(response.status_code, 200)
+        return response.data['session_key']
+
+
+class SessionKeyTestCase(SecretAPITestCase):
+
+    def test_decrypt_with_session_key(self):
+
+        session_key = self.get_session_key()
+        response = self.client.get(reverse('secrets-api:secret_list'), HTTP_X_SESSION_KEY=session_key)
+
+        self.assertEqual(sorted(s['plaintext'] for s in response.data), ['password0', 'password1', 'password2'])
+
+        secret = Secret.objects.first()
+        url = reverse('secrets-api:secret_detail', kwargs={'pk': secret.pk})
+        response = self.client.get(url, HTTP_X_SESSION_KEY=session_key)
+        self.assertIsNotNone(response.data['plaintext'])
+
+        response = self.client.get('{}?validate=false'.format(reverse('secrets-api:secret_list')),
+                                   HTTP_X_SESSION_KEY=session_key)
+        self.assertEqual(sorted(s['plaintext'] for s in response.data), ['password0', 'password1', 'password2'])
+
+    def test_invalid_session_key(self):
+
+        response = self.client.get(reverse('secrets-api:secret_list'),
+                                   HTTP_X_SESSION_KEY=base64.b64encode(generate_master_key()))
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(reverse('secrets-api:session_key'), {'private_key': 'invalid'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_revoke_session_key(self):
+
+        session_key = self.get_session_key()
+        response = self.client.delete(reverse('secrets-api:session_key'), HTTP_X_SESSION_KEY=session_key)
+        self.assertEqual(response.status_code, 204)
+
+        response = self.client.get(reverse('secrets-api:secret_list'), HTTP_X_SESSION_KEY=session_key)
+        self.assertEqual(response.status_code, 400)
+
+
+class FreeRADIUSClientsTestCase(SecretAPITestCase):
+
+    def test_clients_are_streamed(self):
+
+        secrets = list(Secret.objects.order_by('device__name').select_related('device'))
+        # Hash mismatches are reported for the failing Secret only
+        Secret.objects.filter(pk=secrets[1].pk).update(hash=Secret.objects.get(pk=secrets[0].pk).hash)
+        for secret in secrets[:2]:
+            secret.device.primary_ip4 = IPAddress.objects.create(address=IPNetwork('192.0.2.{}/24'.format(secret.pk)))
+            secret.device.save()
+        secrets[2].device.primary_ip4 = None
+        secrets[2].device.save()
+
+        response = self.client.get('{}?format=freeradius'.format(reverse('secrets-api:secret_list')),
+                                   HTTP_X_SESSION_KEY=self.get_session_key())
+        self.assertTrue(response.streaming)
+        content = ''.join(response.streaming_content)
+
+        self.assertIn('client {} {{\n    ipaddr = 192.0.2.{}\n'.format(secrets[0].device.name, secrets[0].pk), content)
+        self.assertIn('# Skipped secret {} ({}): Invalid key or ciphertext!'.format(secrets[1].pk,
+                                                                                    secrets[1].device.name), content)
+        self.assertIn('# Skipped secret {} ({}): No primary IP set'.format(secrets[2].pk, secrets[2].device.name),
+                      content)
+
+    def test_clients_without_key(self):
+
+        response = self.client.get('{}?format=freeradius'.format(reverse('secrets-api:secret_list')))
+        self.assertEqual(len([line for line in ''.join(response.streaming_content).splitlines()
+                              if line.startswith('# Skipped')]), 3)
+
+    def test_errors_are_rendered_as_comments(self):
+
+        url = '{}?format=freeradius'.format(reverse('secrets-api:secret_list'))
+        response = self.client.post(url, {'private_key': 'invalid'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.content, '# error: Invalid private key.\n')
+
+        secret = Secret.objects.first()
+        url = '{}?format=freeradius'.format(reverse('secrets-api:secret_detail', kwargs={'pk': secret.pk}))
+        response = self.client.get(url, HTTP_X_SESSION_KEY=base64.b64encode(generate_master_key()))
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.content.startswith('# error: '))
+
+
+class RSAKeyGeneratorTestCase(TestCase):
+
+    def setUp(self):
+
+        User.objects.create_user('alice', 'alice@example.com', 'alice')
+        self.client.login(username='alice', password='alice')
+        self.pool = views.rsa_key_pool = RSAKeyPool(size=1)
+
+    def tearDown(self):
+
+        views.rsa_key_pool = rsa_key_pool
+
+    def wait_for_pool(self):
+        thread = self.pool.thread
+        if thread is not None:
+            thread.join()
+
+    def test_key_pairs_are_claimed_from_pool(self):
+
+        # Key pairs are generated within the request until the pool is filled
+        url = '{}?key_size=2048'.format(reverse('secrets-api:generate_keys'))
+        response = self.client.get(url)
+        self.assertEqual(RSA.importKey(response.data['public_key']).size() + 1, 2048)
+
+        self.wait_for_pool()
+        private_key, public_key = self.pool.key_pairs[2048][0]
+        response = self.client.get(url)
+        self.assertEqual(response.data['private_key'], private_key)
+        self.assertNotIn((private_key, public_key), self.pool.key_pairs[2048])
+        self.wait_for_pool()
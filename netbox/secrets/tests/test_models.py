@@ -1,11 +1,13 @@
 from Crypto.PublicKey import RSA
 
 from django.conf import settings
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.test import TestCase
+from django.utils import timezone
 
-from secrets.models import UserKey, Secret, generate_master_key, encrypt_master_key, decrypt_master_key
+from secrets.models import SessionKey, UserKey, Secret, generate_master_key, encrypt_master_key, decrypt_master_key
 from secrets.hashers import SecretValidationHasher
 
 
@@ -80,6 +82,30 @@ class UserKeyTestCase(TestCase):
         except ValueError:
             pass
 
+    def test_06_session_key(self):
+        """
+        Test the retrieval of the master key using a session key, and the expiration and revocation of session keys.
+        """
+        master_key = generate_master_key()
+        alice_uk = UserKey(user=User.objects.get(username='alice'), public_key=self.TEST_KEYS['alice_public'])
+        alice_uk.activate(master_key)
+        session_key = alice_uk.create_session_key(master_key)
+        self.assertNotIn(session_key.key, bytes(SessionKey.objects.get(pk=session_key.pk).cipher))
+        self.assertEqual(alice_uk.get_session_master_key(session_key.key), master_key)
+        self.assertIsNone(alice_uk.get_session_master_key(generate_master_key()))
+
+        # Expired session keys are rejected
+        SessionKey.objects.filter(pk=session_key.pk).update(expires=timezone.now())
+        self.assertIsNone(alice_uk.get_session_master_key(session_key.key))
+
+        # Changing the public key revokes all session keys
+        session_key = alice_uk.create_session_key(master_key)
+        alice_uk = UserKey.objects.get(pk=alice_uk.pk)
+        alice_uk.public_key = self.TEST_KEYS['bob_public']
+        alice_uk.save()
+        self.assertIsNone(alice_uk.get_session_master_key(session_key.key))
+        self.assertFalse(SessionKey.objects.exists())
+
 
 class SecretTestCase(TestCase):
 
@@ -130,3 +156,15 @@ class SecretTestCase(TestCase):
         self.assertEqual(duplicate_ivs, [], "One or more duplicate IVs found!")
         duplicate_ciphertexts = [i for i, x in enumerate(ciphertexts) if ciphertexts.count(x) > 1]
         self.assertEqual(duplicate_ciphertexts, [], "One or more duplicate ciphertexts (first blocks) found!")
+
+    def test_03_decrypt_without_validation(self):
+        """
+        Ensure that decryption can skip the validation of the plaintext against its hash.
+        """
+        secret_key = generate_master_key()
+        s = Secret(plaintext="FooBar123")
+        s.encrypt(secret_key)
+        s.hash = make_password("Invalid plaintext", hasher=SecretValidationHasher())
+        self.assertRaises(ValueError, s.decrypt, secret_key)
+        s.decrypt(secret_key, validate=False)
+        self.assertEqual(s.plaintext, "FooBar123")
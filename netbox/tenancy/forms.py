@@ -2,7 +2,7 @@ from django import forms
 from django.db.models import Count
 
 from utilities.forms import (
-    BootstrapMixin, BulkImportForm, CommentField, CSVDataField, SlugField,
+    BootstrapMixin, BulkImportForm, CommentField, CSVDataField, FlexibleModelChoiceField, SlugField,
 )
 
 from .models import Tenant, TenantGroup
@@ -58,8 +58,8 @@ class TenantForm(forms.ModelForm, BootstrapMixin):
 
 
 class TenantFromCSVForm(forms.ModelForm):
-    group = forms.ModelChoiceField(TenantGroup.objects.all(), required=False, to_field_name='name',
-                                   error_messages={'invalid_choice': 'Group not found.'})
+    group = FlexibleModelChoiceField(TenantGroup.objects.all(), required=False, to_field_name='name',
+                                     error_messages={'invalid_choice': 'Group not found.'})
 
     class Meta:
         model = Tenant
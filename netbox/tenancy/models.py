@@ -41,6 +41,8 @@ class Tenant(CreatedUpdatedModel):
     def get_absolute_url(self):
         return reverse('tenancy:tenant', args=[self.slug])
 
+    csv_related = ['group']
+
     def to_csv(self):
         return ','.join([
             self.name,
@@ -11,5 +11,6 @@ urlpatterns = [
     url(r'^profile/user-key/$', views.userkey, name='userkey'),
     url(r'^profile/user-key/edit/$', views.userkey_edit, name='userkey_edit'),
     url(r'^profile/recent-activity/$', views.recent_activity, name='recent_activity'),
+    url(r'^profile/import-jobs/(?P<pk>\d+)/$', views.import_job, name='import_job'),
 
 ]
@@ -4,9 +4,10 @@ from django.contrib.auth import login as auth_login, logout as auth_logout, upda
 from django.contrib.auth.decorators import login_required
 from django.core.urlresolvers import reverse
 from django.http import HttpResponseRedirect
-from django.shortcuts import redirect, render, resolve_url
+from django.shortcuts import get_object_or_404, redirect, render, resolve_url
 from django.utils.http import is_safe_url
 
+from extras.models import ImportJob
 from secrets.forms import UserKeyForm
 from secrets.models import UserKey
 
@@ -124,3 +125,13 @@ def recent_activity(request):
     return render(request, 'users/recent_activity.html', {
         'recent_activity': request.user.actions.all()[:50]
     })
+
+
+@login_required()
+def import_job(request, pk):
+
+    job = get_object_or_404(ImportJob, pk=pk, user=request.user)
+
+    return render(request, 'users/import_job.html', {
+        'job': job,
+    })
@@ -1,6 +1,68 @@
-from rest_framework.exceptions import APIException
+from collections import OrderedDict
+
+from django.conf import settings
+
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class ServiceUnavailable(APIException):
     status_code = 503
     default_detail = "Service temporarily unavailable, please try again later."
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginate a list by primary key. A page holds up to `limit` objects having a primary key greater than `cursor` (the
+    last primary key of the previous page), so that deep pages are as cheap to fetch as the first one. Lists are only
+    paginated when either parameter is given. The total count of objects is included unless `count=false`.
+    """
+    limit_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def get_int_parameter(self, request, name, default=None):
+        value = request.query_params.get(name, default)
+        try:
+            value = int(value)
+            if value < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            raise ParseError("Invalid {}: {}".format(name, value))
+        return value
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.limit_query_param not in request.query_params and \
+                self.cursor_query_param not in request.query_params:
+            return None
+
+        self.request = request
+        self.limit = min(
+            self.get_int_parameter(request, self.limit_query_param, settings.PAGINATE_COUNT) or 1,
+            int(settings.MAX_PAGE_SIZE)
+        )
+        cursor = self.get_int_parameter(request, self.cursor_query_param, 0)
+        self.count = None
+        if request.query_params.get(self.count_query_param, 'true').lower() not in ('false', '0'):
+            self.count = queryset.count()
+
+        page = list(queryset.order_by('pk').filter(pk__gt=cursor)[:self.limit + 1])
+        self.next_cursor = page[self.limit - 1].pk if len(page) > self.limit else None
+        return page[:self.limit]
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['results'] = data
+        return Response(response)
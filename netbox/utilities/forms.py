@@ -1,7 +1,9 @@
 import csv
 import re
+from collections import defaultdict
 
 from django import forms
+from django.core.exceptions import FieldDoesNotExist, ValidationError
 from django.core.urlresolvers import reverse_lazy
 from django.utils.encoding import force_text
 from django.utils.html import format_html
@@ -194,19 +196,28 @@ class CommentField(forms.CharField):
 
 class FlexibleModelChoiceField(forms.ModelChoiceField):
     """
-    Allow a model to be reference by either '{ID}' or the field specified by `to_field_name`.
+    Allow a model to be reference by either '{ID}' or the field specified by `to_field_name`. Values found in
+    `lookup_cache` (a dictionary populated by LookupCache) are resolved without querying the database.
     """
+    lookup_cache = None
+
+    def get_lookup(self, value):
+        """
+        Return the model field name and the value by which to look up an object.
+        """
+        if not self.to_field_name:
+            return 'pk', value
+        elif re.match('^\{\d+\}$', value):
+            return 'pk', value.strip('{}')
+        return self.to_field_name, value
+
     def to_python(self, value):
         if value in self.empty_values:
             return None
+        if self.lookup_cache is not None and value in self.lookup_cache:
+            return self.lookup_cache[value]
         try:
-            if not self.to_field_name:
-                key = 'pk'
-            elif re.match('^\{\d+\}$', value):
-                key = 'pk'
-                value = value.strip('{}')
-            else:
-                key = self.to_field_name
+            key, value = self.get_lookup(value)
             value = self.queryset.get(**{key: value})
         except (ValueError, TypeError, self.queryset.model.DoesNotExist):
             raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
@@ -246,6 +257,87 @@ class ConfirmationForm(forms.Form, BootstrapMixin):
     confirm = forms.BooleanField(required=True)
 
 
+class LookupCache(object):
+    """
+    Resolve the objects referenced by a batch of CSV records. The values of each FlexibleModelChoiceField column are
+    fetched with a single query per column instead of one query per field per record, and other lookups made through
+    get() are memoized. A cache is bound to each CSV form instance validating a record of the batch.
+    """
+
+    def __init__(self, csv_form):
+        self.csv_form = csv_form
+        self.columns = {
+            name: {} for name, field in csv_form.base_fields.items() if isinstance(field, FlexibleModelChoiceField)
+        }
+        self.objects = {}
+
+    def prefetch(self, records):
+        for name, objects in self.columns.items():
+            field = self.csv_form.base_fields[name]
+            model = field.queryset.model
+
+            # Map the value of each lookup to the CSV values referring to it (e.g. both "5" and "{5}")
+            lookups = defaultdict(lambda: defaultdict(set))
+            for record in records:
+                raw_value = record.get(name)
+                if raw_value in field.empty_values or raw_value in objects:
+                    continue
+                try:
+                    key, value = field.get_lookup(raw_value)
+                    model_field = model._meta.pk if key == 'pk' else model._meta.get_field(key)
+                    value = model_field.to_python(value)
+                except (ValueError, TypeError, ValidationError, FieldDoesNotExist):
+                    continue
+                lookups[key][value].add(raw_value)
+
+            for key, values in lookups.items():
+                matches = defaultdict(list)
+                for obj in field.queryset.filter(**{'{}__in'.format(key): values.keys()}):
+                    matches[getattr(obj, key)].append(obj)
+                for value, objs in matches.items():
+                    # Ambiguous values are left for the field to report
+                    if len(objs) == 1 and value in values:
+                        for raw_value in values[value]:
+                            objects[raw_value] = objs[0]
+
+    def bind(self, form):
+        form.lookup_cache = self
+        for name, objects in self.columns.items():
+            form.fields[name].lookup_cache = objects
+
+    def get_or_compute(self, key, func):
+        """
+        Return func(), calling it only once per key for the whole batch.
+        """
+        if key not in self.objects:
+            self.objects[key] = func()
+        return self.objects[key]
+
+    def get(self, queryset, **kwargs):
+        """
+        Return queryset.get(**kwargs), caching the result (including DoesNotExist) by model and lookup arguments.
+        """
+        key = (queryset.model, frozenset(kwargs.items()))
+        if key not in self.objects:
+            try:
+                self.objects[key] = queryset.get(**kwargs)
+            except queryset.model.DoesNotExist:
+                self.objects[key] = None
+        if self.objects[key] is None:
+            raise queryset.model.DoesNotExist("{} matching query does not exist.".format(queryset.model.__name__))
+        return self.objects[key]
+
+
+def get_cached_object(form, queryset, **kwargs):
+    """
+    Return queryset.get(**kwargs) through the LookupCache bound to a CSV form, if any.
+    """
+    lookup_cache = getattr(form, 'lookup_cache', None)
+    if lookup_cache is None:
+        return queryset.get(**kwargs)
+    return lookup_cache.get(queryset, **kwargs)
+
+
 class BulkImportForm(forms.Form):
 
     def clean(self):
@@ -253,10 +345,27 @@ class BulkImportForm(forms.Form):
         if not records:
             return
 
+        obj_list, errors = self.clean_records(records)
+        for e in errors:
+            self.add_error('csv', e)
+
+        self.cleaned_data['csv'] = obj_list
+
+    def clean_records(self, records, start=1, lookup_cache=None):
+        """
+        Validate records with the CSV form. Return the list of unsaved objects and the list of errors. Records are
+        numbered from `start` in error messages. A LookupCache may be passed to share it across batches of records.
+        """
         obj_list = []
+        error_list = []
 
-        for i, record in enumerate(records, start=1):
+        if lookup_cache is None:
+            lookup_cache = LookupCache(self.fields['csv'].csv_form)
+        lookup_cache.prefetch(records)
+
+        for i, record in enumerate(records, start=start):
             obj_form = self.fields['csv'].csv_form(data=record)
+            lookup_cache.bind(obj_form)
             if obj_form.is_valid():
                 obj = obj_form.save(commit=False)
                 obj_list.append(obj)
@@ -264,8 +373,8 @@ class BulkImportForm(forms.Form):
                 for field, errors in obj_form.errors.items():
                     for e in errors:
                         if field == '__all__':
-                            self.add_error('csv', "Record {}: {}".format(i, e))
+                            error_list.append("Record {}: {}".format(i, e))
                         else:
-                            self.add_error('csv', "Record {} ({}): {}".format(i, field, e))
+                            error_list.append("Record {} ({}): {}".format(i, field, e))
 
-        self.cleaned_data['csv'] = obj_list
+        return obj_list, error_list
@@ -1,9 +1,26 @@
 import django_tables2 as tables
+from collections import Sequence
+from django_tables2.tables import TableData
 
 from django.utils.safestring import mark_safe
 
 
+class LazyTableData(TableData):
+    """
+    Unlike TableData, keep sequences which implement their own slicing and sorting (e.g. ipam.utils.ChildList) instead
+    of copying them into a list, so that paginating the table only evaluates the current page.
+    """
+
+    def __init__(self, data, table):
+        if isinstance(data, Sequence) and hasattr(data, 'sort') and not isinstance(data, list):
+            self.table = table
+            self.list = data
+            return
+        super(LazyTableData, self).__init__(data, table)
+
+
 class BaseTable(tables.Table):
+    TableDataClass = LazyTableData
 
     def __init__(self, *args, **kwargs):
         super(BaseTable, self).__init__(*args, **kwargs)
@@ -62,6 +62,19 @@ def user_can_delete(model, user):
     return user.has_perm(perm_name)
 
 
+@register.filter()
+def table_pk_list(table):
+    """
+    Return the comma-separated primary keys of all of the rows of a table (not only those of the current page)
+    """
+    data = table.data.data
+    if hasattr(data, 'pk_list'):
+        pk_list = data.pk_list()
+    else:
+        pk_list = [getattr(row.record, 'pk', None) for row in table.rows]
+    return ','.join(str(pk) for pk in pk_list if pk is not None)
+
+
 #
 # Tags
 #
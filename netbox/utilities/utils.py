@@ -0,0 +1,31 @@
+EXPORT_CHUNK_SIZE = 500
+
+
+def iter_queryset(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Iterate over a QuerySet in its own order while holding at most `chunk_size` model instances in memory. The primary
+    keys are fetched first, then the objects are fetched by chunks of primary keys. Objects deleted in the meantime are
+    skipped.
+    """
+    pk_list = list(queryset.values_list('pk', flat=True))
+    for i in range(0, len(pk_list), chunk_size):
+        chunk = pk_list[i:i + chunk_size]
+        objects = queryset.in_bulk(chunk)
+        for pk in chunk:
+            obj = objects.get(pk)
+            if obj is not None:
+                yield obj
+
+
+def iter_csv(queryset):
+    """
+    Generate the CSV export of a QuerySet line by line, following the select_related() hints declared by the model in
+    `csv_related`.
+    """
+    csv_related = getattr(queryset.model, 'csv_related', None)
+    if csv_related:
+        queryset = queryset.select_related(*csv_related)
+    separator = ''
+    for obj in iter_queryset(queryset):
+        yield separator + obj.to_csv()
+        separator = '\n'
@@ -1,25 +1,35 @@
 from django_tables2 import RequestConfig
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.contenttypes.models import ContentType
-from django.core.exceptions import ImproperlyConfigured
+from django.core.exceptions import ImproperlyConfigured, ValidationError
 from django.core.urlresolvers import reverse
 from django.db import transaction, IntegrityError
-from django.db.models import ProtectedError
+from django.db.models import Model, ProtectedError
+from django.db.models.signals import post_save, pre_save
 from django.forms import ModelMultipleChoiceField, MultipleHiddenInput
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template import TemplateSyntaxError
+from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.utils.http import is_safe_url
 from django.views.generic import View
 
-from extras.models import ExportTemplate, UserAction
+from dns.models import defer_zone_changes
+from extras.models import (
+    ExportTemplate, ImportJob, UserAction, IMPORTJOB_STATUS_COMPLETED, IMPORTJOB_STATUS_FAILED,
+)
 
 from .error_handlers import handle_protectederror
-from .forms import ConfirmationForm
+from .forms import BulkImportForm, ConfirmationForm, LookupCache
 from .paginator import EnhancedPaginator
+from .utils import iter_csv
+
+
+IMPORT_CHUNK_SIZE = 500
 
 
 class ObjectListView(View):
@@ -51,9 +61,8 @@ class ObjectListView(View):
                                .format(et.name))
         # Fall back to built-in CSV export
         elif 'export' in request.GET and hasattr(model, 'to_csv'):
-            output = '\n'.join([obj.to_csv() for obj in self.queryset.all()])
-            response = HttpResponse(
-                output,
+            response = StreamingHttpResponse(
+                iter_csv(self.queryset.all()),
                 content_type='text/csv'
             )
             response['Content-Disposition'] = 'attachment; filename="netbox_{}.csv"'\
@@ -225,6 +234,19 @@ class BulkImportView(View):
 
     def post(self, request, *args, **kwargs):
 
+        # Large imports are processed by a background worker
+        if settings.IMPORT_JOB_THRESHOLD and self.supports_import_job():
+            data = request.POST.get('csv', '')
+            if len([line for line in data.splitlines() if line]) > settings.IMPORT_JOB_THRESHOLD:
+                job = ImportJob.objects.create(
+                    user=request.user,
+                    content_type=ContentType.objects.get_for_model(self.form.base_fields['csv'].csv_form._meta.model),
+                    import_view='{}.{}'.format(self.__module__, self.__class__.__name__),
+                    data=data,
+                )
+                messages.info(request, "The import will be processed in the background.")
+                return redirect(job.get_absolute_url())
+
         form = self.form(request.POST)
         if form.is_valid():
             new_objs = []
@@ -255,6 +277,70 @@ class BulkImportView(View):
     def save_obj(self, obj):
         obj.save()
 
+    def supports_import_job(self):
+        # Forms with additional fields or custom validation need the full request
+        return list(self.form.base_fields) == ['csv'] and self.form.clean.__func__ is BulkImportForm.clean.__func__
+
+    def can_bulk_create(self, model):
+        # bulk_create() bypasses save() and the model signals
+        return self.save_obj.__func__ is BulkImportView.save_obj.__func__ and \
+            model.save.__func__ is Model.save.__func__ and \
+            not pre_save.has_listeners(model) and not post_save.has_listeners(model)
+
+    def save_objects(self, obj_list):
+        """
+        Save new objects, using bulk_create() by chunks if the view and the model allow it.
+        """
+        if not obj_list:
+            return
+        model = obj_list[0]._meta.model
+        if self.can_bulk_create(model):
+            for i in range(0, len(obj_list), IMPORT_CHUNK_SIZE):
+                model.objects.bulk_create(obj_list[i:i + IMPORT_CHUNK_SIZE])
+        else:
+            for obj in obj_list:
+                self.save_obj(obj)
+
+    def run_import_job(self, job):
+        """
+        Validate and save the data of an ImportJob by chunks, recording its progress. Nothing is saved if any record is
+        invalid. Progress is only reported while validating: the objects are saved within a single transaction, so
+        updates made while saving would not be visible before the job completes.
+        """
+        form = self.form()
+        try:
+            records = form.fields['csv'].clean(job.data)
+        except ValidationError as e:
+            job.update(status=IMPORTJOB_STATUS_FAILED, completed=timezone.now(), errors='\n'.join(e.messages))
+            return
+        job.update(total_count=len(records))
+
+        obj_list = []
+        error_list = []
+        lookup_cache = LookupCache(form.fields['csv'].csv_form)
+        for i in range(0, len(records), IMPORT_CHUNK_SIZE):
+            chunk = records[i:i + IMPORT_CHUNK_SIZE]
+            objs, errors = form.clean_records(chunk, start=i + 1, lookup_cache=lookup_cache)
+            obj_list += objs
+            error_list += errors
+            job.update(processed_count=i + len(chunk))
+        if error_list:
+            job.update(status=IMPORTJOB_STATUS_FAILED, completed=timezone.now(), errors='\n'.join(error_list))
+            return
+
+        try:
+            # Jobs run outside of a request, so DeferZoneChangesMiddleware does not apply
+            with transaction.atomic(), defer_zone_changes():
+                self.save_objects(obj_list)
+        except IntegrityError as e:
+            job.update(status=IMPORTJOB_STATUS_FAILED, completed=timezone.now(), errors=str(e.__cause__))
+            return
+
+        if obj_list:
+            msg = u'Imported {} {}'.format(len(obj_list), obj_list[0]._meta.verbose_name_plural)
+            UserAction.objects.log_import(job.user, job.content_type, msg)
+        job.update(status=IMPORTJOB_STATUS_COMPLETED, completed=timezone.now(), created_count=len(obj_list))
+
 
 class BulkEditView(View):
     cls = None